@@ -1,1145 +1,1836 @@
-from flask import Flask, render_template, Response, jsonify, request
-from flask_cors import CORS
-import cv2
-import numpy as np
-from ultralytics import YOLO
-import cvzone
-import math
-from sort import *
-import threading
-import queue
-import time
-import os
-import tempfile
-import requests
-from werkzeug.utils import secure_filename
-from intelligent_traffic_optimizer import IntelligentTrafficOptimizer, VehicleData, LaneMetrics, SignalPhase
-import subprocess
-import urllib.parse
-
-# Load environment variables from .env file (for local development)
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass  # python-dotenv not installed, using system env vars
-
-# Import Supabase routes
-try:
-    from supabase_routes import register_supabase_routes
-    SUPABASE_ROUTES_AVAILABLE = True
-except ImportError:
-    SUPABASE_ROUTES_AVAILABLE = False
-    print("Warning: Supabase routes not available")
-
-
-app = Flask(__name__)
-CORS(app, resources={
-    r"/video_feed/*": {"origins": "*", "methods": ["GET", "HEAD", "OPTIONS"]},
-    r"/get_data/*": {"origins": "*"},
-    r"/api/*": {"origins": "*"},
-    r"/*": {"origins": "*"}
-})  # Enable CORS with specific headers for video streaming
-
-# Register Supabase API routes
-if SUPABASE_ROUTES_AVAILABLE:
-    register_supabase_routes(app)
-
-# Upload folder configuration
-UPLOAD_FOLDER = 'uploaded_videos'
-ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'}
-
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
-
-# Video quality settings
-VIDEO_QUALITY = {
-    'resolution': (480, 360),  # Width x Height - 480p for bandwidth efficiency
-    'jpeg_quality': 70,  # 0-100, lower = smaller file
-    'fps_limit': 15  # Limit FPS to reduce bandwidth
-}
-
-# Initialize queues for frame and data storage (4 feeds)
-frame_queues = [queue.Queue(maxsize=2) for _ in range(4)]
-data_queues = [queue.Queue(maxsize=5) for _ in range(4)]
-
-# Global optimizer instance (shared across all detectors for phase management)
-global_optimizer = None
-
-class VehicleDetector:
-    def __init__(self):
-        try:
-            print("Loading YOLO model...")
-            self.model = YOLO("yolov8n.pt")  # Use smaller model for faster processing
-            self.tracker = Sort(max_age=10, min_hits=1, iou_threshold=0.1)
-            self.total_count = []
-            
-            # Initialize intelligent optimizer (will be overridden by global optimizer)
-            self.optimizer = IntelligentTrafficOptimizer()
-            print("VehicleDetector initialized successfully")
-        except Exception as e:
-            print(f"Error initializing VehicleDetector: {e}")
-            # Create minimal fallback
-            self.model = None
-            self.tracker = None
-            self.total_count = []
-            self.optimizer = None
-        
-        self.vehicles_data = []  # Store enhanced vehicle data
-        self.bottleneck_strategies = {}
-        self.lane_id = 0  # Will be set per detector instance
-        
-        # Traffic engineering standards
-        self.MAX_SIGNAL_TIME = 120
-        self.MIN_SIGNAL_TIME = 7
-        self.YELLOW_TIME = 3
-        self.ALL_RED_TIME = 2
-        
-        # Real-world vehicle classification
-        self.class_names = ["person", "bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck"]
-        self.target_classes = ["car", "truck", "bus", "motorbike", "bicycle"]
-        
-        # Vehicle type mapping for optimization
-        self.vehicle_type_map = {
-            "car": "car",
-            "truck": "truck", 
-            "bus": "bus",
-            "motorbike": "bike",
-            "bicycle": "bike"
-        }
-
-        # Detection lines (will be initialized with frame dimensions)
-        self.limit_lines = None
-        self.vehicle_counts_history = []
-        self.frame_analyzed = False
-        self.frame_height = None
-        self.frame_width = None
-        
-        # Signal timing tracking
-        self.cycle_start_time = time.time()
-        self.frame_count = 0
-        self.fps = 15  # Expected FPS for timing calculations
-        self.observation_start_time = None  # Track observation phase start
-        self.observation_elapsed = 0  # Track observation time per lane
-        
-        # Performance tracking
-        self.last_optimization_time = time.time()
-        self.optimization_interval = 5  # Optimize every 5 seconds
-
-    def analyze_video_frame(self, frame):
-        """Analyze video frame dimensions and initialize detection lines"""
-        if self.frame_analyzed:
-            return  # Already analyzed
-        
-        self.frame_height, self.frame_width = frame.shape[:2]
-        print(f"[Lane {self.lane_id}] Video analyzed - Resolution: {self.frame_width}x{self.frame_height}")
-        
-        # Initialize detection lines based on actual frame dimensions
-        # Position lines at 60% height with proper margins
-        y1 = int(self.frame_height * 0.60)  # Main detection line at 60% height
-        y2 = int(self.frame_height * 0.65)  # Secondary line at 65% height
-        
-        # Horizontal span: 20% from left to 80% from left (60% of frame width centered)
-        x_start = int(self.frame_width * 0.20)
-        x_end = int(self.frame_width * 0.80)
-        
-        # Create detection lines with calculated positions
-        self.limit_lines = [
-            [x_start, y1, x_end, y1],  # Main horizontal line
-            [x_start, y2, x_end, y2]   # Secondary horizontal line
-        ]
-        
-        self.frame_analyzed = True
-        print(f"[Lane {self.lane_id}] Detection lines marked:")
-        print(f"  Line 1: ({x_start}, {y1}) to ({x_end}, {y1})")
-        print(f"  Line 2: ({x_start}, {y2}) to ({x_end}, {y2})")
-
-    def initialize_lines(self, frame):
-        """Legacy method - calls analyze_video_frame"""
-        if not self.frame_analyzed:
-            self.analyze_video_frame(frame)
-
-    def get_signal_state(self):
-        """Get signal state from global optimizer based on phase logic"""
-        global global_optimizer
-        try:
-            if global_optimizer is None:
-                return "OBSERVATION"  # Fallback if optimizer not available
-            
-            # During observation phase, show OBSERVATION status
-            if global_optimizer.observation_enabled:
-                return "OBSERVATION"
-            
-            return global_optimizer.get_signal_state(self.lane_id)
-        except Exception as e:
-            print(f"Error getting signal state: {e}")
-            return "OBSERVATION"  # Safe fallback
-    
-    def get_green_time(self):
-        """Get remaining green time from global optimizer"""
-        global global_optimizer
-        try:
-            if global_optimizer is None:
-                return 30
-            
-            return global_optimizer.get_green_time(self.lane_id)
-        except Exception as e:
-            print(f"Error getting green time: {e}")
-            return 30  # Safe fallback
-
-    def get_next_green_time(self):
-        """Calculate when this lane will get green light if currently RED"""
-        global global_optimizer
-        try:
-            signal_state = self.get_signal_state()
-            
-            if signal_state == "GREEN" or signal_state == "YELLOW":
-                return 0  # Already green or about to be green
-            
-            if signal_state == "RED" and global_optimizer:
-                # Get opposite phase lanes
-                # North/South: lanes 0, 2; East/West: lanes 1, 3
-                if self.lane_id in [0, 2]:
-                    # This is North/South - opposite is East/West
-                    opposite_lanes = [1, 3]
-                else:
-                    # This is East/West - opposite is North/South
-                    opposite_lanes = [0, 2]
-                
-                # Get the max green time from opposite lanes
-                max_opposite_green = 0
-                for lane_id in opposite_lanes:
-                    opp_green = global_optimizer.get_green_time(lane_id)
-                    if opp_green > max_opposite_green:
-                        max_opposite_green = opp_green
-                
-                # Add yellow and all-red times
-                next_green = max_opposite_green + self.YELLOW_TIME + self.ALL_RED_TIME
-                return max(0, next_green)
-            
-            return 0
-        except Exception as e:
-            print(f"Error calculating next green time: {e}")
-            return 0
-
-    def calculate_lane_metrics(self, vehicle_count, vehicle_types=None):
-        """Calculate lane metrics for this detector's lane"""
-        
-        if not vehicle_types:
-            vehicle_types = ['car'] * vehicle_count
-        
-        # Create vehicle data for optimization
-        vehicles = []
-        for i, v_type in enumerate(vehicle_types[:vehicle_count]):
-            vehicle = VehicleData(
-                vehicle_id=i,
-                vehicle_type=self.vehicle_type_map.get(v_type, 'car'),
-                lane_id=self.lane_id,
-                timestamp=time.time()
-            )
-            vehicles.append(vehicle)
-        
-        # Analyze lane conditions using the optimizer
-        lane_metrics = self.optimizer.analyze_lane_conditions(vehicles)
-        
-        return lane_metrics
-
-    def process_frame(self, frame):
-        # Analyze video frame first (on first frame)
-        if not self.frame_analyzed:
-            self.analyze_video_frame(frame)
-            if global_optimizer and self.observation_start_time is None:
-                self.observation_start_time = time.time()
-                self.cycle_start_time = time.time()  # Reset cycle timer
-                self.frame_count = 0
-                print(f"[Lane {self.lane_id}] Starting 30-second observation phase...")
-        
-        # Initialize lines if needed (legacy support)
-        if self.limit_lines is None:
-            self.initialize_lines(frame)
-        
-        # OBSERVATION PHASE: Track vehicle counts for first 30 seconds
-        if global_optimizer and global_optimizer.observation_enabled and self.observation_start_time:
-            self.observation_elapsed = time.time() - self.observation_start_time
-            global_optimizer.update_observation_time(self.lane_id, self.observation_elapsed)
-        elif global_optimizer and not global_optimizer.observation_enabled and self.observation_start_time:
-            # Transition from observation to signal control
-            # Only happens once per lane
-            if self.lane_id == 0:  # Log once
-                print(f"[Lane {self.lane_id}] Observation complete! Starting signal control...")
-            # Reset timing for actual signal cycles
-            self.cycle_start_time = time.time()
-            self.frame_count = 0
-            self.observation_start_time = None  # Mark transition as complete
-        
-        # Track elapsed time for signal control
-        self.frame_count += 1
-        elapsed_time = (self.frame_count / self.fps)
-        
-        # Update global optimizer with elapsed time for this lane
-        if global_optimizer:
-            global_optimizer.update_phase_elapsed_time(self.lane_id, elapsed_time)
-            
-            # Check if cycle should reset (after all phases complete)
-            total_cycle_time = sum(global_optimizer.current_cycle_timings) + (self.YELLOW_TIME * 4)
-            if elapsed_time >= total_cycle_time:
-                # Cycle complete - prepare next cycle with predicted timings
-                predicted_timings = global_optimizer.predict_next_cycle_timings({
-                    0: len(self.total_count) // 30,  # Rough estimate based on cumulative count
-                    1: len(self.total_count) // 30,
-                    2: len(self.total_count) // 30,
-                    3: len(self.total_count) // 30
-                })
-                # Only update once per feed (coordinator pattern)
-                if self.lane_id == 0:
-                    global_optimizer.set_cycle_timing(predicted_timings)
-                self.cycle_start_time = time.time()
-                self.frame_count = 0
-
-        results = self.model(frame, stream=True)
-        detections = np.empty((0, 5))
-
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0]
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                conf = math.ceil((box.conf[0] * 100)) / 100
-                cls = int(box.cls[0])
-                
-                # Safeguard against invalid class indices
-                if cls < 0 or cls >= len(self.class_names):
-                    continue
-                
-                current_class = self.class_names[cls]
-
-                if current_class in self.target_classes and conf > 0.3:
-                    current_array = np.array([x1, y1, x2, y2, conf])
-                    detections = np.vstack((detections, current_array))
-
-        tracked_objects = self.tracker.update(detections)
-        
-        # Count vehicles and record during observation phase
-        vehicle_count = len(tracked_objects)
-        if global_optimizer and global_optimizer.observation_enabled:
-            global_optimizer.record_observation_vehicle_count(self.lane_id, vehicle_count)
-
-        # Draw detection lines with proper styling
-        for limit in self.limit_lines:
-            # Primary line in teal color
-            cv2.line(frame, (limit[0], limit[1]), (limit[2], limit[3]),
-                     (250, 182, 122), 2)  # Orange: (B, G, R) = (122, 182, 250)
-            # Add line markers at ends
-            cv2.circle(frame, (limit[0], limit[1]), 4, (0, 255, 0), -1)
-            cv2.circle(frame, (limit[2], limit[3]), 4, (0, 255, 0), -1)
-
-        for result in tracked_objects:
-            x1, y1, x2, y2, id = result
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            w, h = x2 - x1, y2 - y1
-
-            cvzone.cornerRect(frame, (x1, y1, w, h), l=5, rt=1,
-                              colorR=(111, 237, 235))
-            cvzone.putTextRect(frame, f'#{int(id)}', (max(0, x1), max(25, y1)),
-                               scale=0.8, thickness=1, offset=5,
-                               colorR=(200, 200, 200), colorT=(0, 0, 0))
-
-            cx, cy = x1 + w // 2, y1 + h // 2
-            cv2.circle(frame, (cx, cy), 5, (22, 192, 240), cv2.FILLED)
-
-            for limit in self.limit_lines:
-                if (limit[0] < cx < limit[2] and
-                        limit[1] - 15 < cy < limit[1] + 15 and
-                        id not in self.total_count):
-                    self.total_count.append(id)
-                    cv2.line(frame, (limit[0], limit[1]), (limit[2], limit[3]),
-                             (12, 202, 245), 3)
-
-        # Get signal state from global phase-based optimizer
-        signal_state = self.get_signal_state()
-        green_time = self.get_green_time()
-
-        # Display signal state and other information
-        if signal_state == "OBSERVATION":
-            signal_color = (0, 165, 255)  # Orange for observation/analysis
-        else:
-            signal_color = (0, 255, 0) if signal_state == "GREEN" else (0, 255, 255) if signal_state == "YELLOW" else (0, 0, 255)
-        
-        cv2.rectangle(frame, (20, 20), (200, 100), signal_color, -1)
-        cvzone.putTextRect(frame, f'Signal: {signal_state}', (30, 40),
-                           scale=1, thickness=2, offset=5,
-                           colorR=signal_color, colorT=(0, 0, 0))
-        cvzone.putTextRect(frame, f'Count: {len(self.total_count)}', (30, 70),
-                           scale=1, thickness=2, offset=5,
-                           colorR=signal_color, colorT=(0, 0, 0))
-        
-        if signal_state == "GREEN":
-            cvzone.putTextRect(frame, f'Green Time: {green_time:.1f}s', (30, 100),
-                               scale=1, thickness=2, offset=5,
-                               colorR=signal_color, colorT=(0, 0, 0))
-        elif signal_state == "OBSERVATION":
-            if global_optimizer and self.observation_elapsed:
-                obs_time = f'{self.observation_elapsed:.1f}s'
-            else:
-                obs_time = '0s'
-            cvzone.putTextRect(frame, f'Analyzing: {obs_time}', (30, 100),
-                               scale=1, thickness=2, offset=5,
-                               colorR=signal_color, colorT=(0, 0, 0))
-
-        return frame, len(self.total_count), green_time, signal_state
-
-# Create detector instances for each feed (lazy initialization)
-detectors = [None for _ in range(4)]
-
-def get_detector(feed_id):
-    """Lazy initialization of detector for specific feed"""
-    global detectors, global_optimizer
-    if detectors[feed_id] is None:
-        print(f"Initializing detector for feed {feed_id}...")
-        detector = VehicleDetector()
-        detector.lane_id = feed_id  # Set lane ID for phase-based signal management
-        detector.optimizer = global_optimizer  # Use shared optimizer
-        detectors[feed_id] = detector
-    return detectors[feed_id]
-
-def initialize_global_optimizer():
-    """Initialize the global optimizer for 4-way junction phase management"""
-    global global_optimizer
-    if global_optimizer is None:
-        print("Initializing global phase-based optimizer...")
-        global_optimizer = IntelligentTrafficOptimizer()
-    return global_optimizer
-
-# Global variables for video sources
-current_video_sources = [None, None, None, None]
-last_frame_time = [0] * 4  # Track frame timing for FPS limiting
-
-def compress_frame(frame, target_resolution=None, jpeg_quality=70):
-    """
-    Compress frame for efficient streaming
-    
-    Args:
-        frame: OpenCV frame
-        target_resolution: (width, height) tuple, defaults to VIDEO_QUALITY
-        jpeg_quality: JPEG quality 0-100
-    
-    Returns:
-        JPEG bytes
-    """
-    if target_resolution is None:
-        target_resolution = VIDEO_QUALITY['resolution']
-    
-    # Resize frame
-    height, width = frame.shape[:2]
-    if (width, height) != target_resolution:
-        frame = cv2.resize(frame, target_resolution, interpolation=cv2.INTER_LINEAR)
-    
-    # Encode to JPEG
-    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
-    if ret:
-        return buffer.tobytes()
-    return None
-
-def should_process_frame(feed_id, fps_limit=None):
-    """Check if enough time has passed to process next frame"""
-    if fps_limit is None:
-        fps_limit = VIDEO_QUALITY['fps_limit']
-    
-    current_time = time.time()
-    min_interval = 1.0 / fps_limit
-    
-    if current_time - last_frame_time[feed_id] >= min_interval:
-        last_frame_time[feed_id] = current_time
-        return True
-    return False
-
-def video_processing_thread(feed_id):
-    global current_video_sources
-    
-    while True:
-        cap = None
-        
-        try:
-            # Map feed IDs to specific video files
-            video_files = {
-                0: "track-v-frontend-main/video/cam1.mp4",
-                1: "track-v-frontend-main/video/cam2.mp4",
-                2: "track-v-frontend-main/video/cam3.mp4",
-                3: "track-v-frontend-main/video/cam4.mp4"
-            }
-            
-            # Try loading the mapped video file
-            if feed_id in video_files:
-                video_path = video_files[feed_id]
-                try:
-                    cap = cv2.VideoCapture(video_path)
-                    if not cap.isOpened():
-                        print(f"Could not open video at {video_path}, trying fallback...")
-                        cap = None
-                    else:
-                        print(f"Loaded {video_path.split('/')[-1]} for feed {feed_id}")
-                except Exception as e:
-                    print(f"Error loading video for feed {feed_id}: {e}")
-                    cap = None
-            
-            # Try YouTube or uploaded video if source is set
-            elif current_video_sources[feed_id]:
-                source = current_video_sources[feed_id]
-                
-                # Check if it's a YouTube URL
-                if 'youtube.com' in source or 'youtu.be' in source:
-                    try:
-                        cap = YouTubeVideoHandler.get_video_stream(source)
-                        if cap and cap.isOpened():
-                            print(f"Loaded YouTube video for feed {feed_id}: {source}")
-                        else:
-                            cap = None
-                    except Exception as e:
-                        print(f"Error loading YouTube video for feed {feed_id}: {e}")
-                        cap = None
-                else:
-                    # Try as file path
-                    try:
-                        cap = VideoUploadHandler.get_video_stream(source)
-                        if cap and cap.isOpened():
-                            print(f"Loaded video file for feed {feed_id}: {source}")
-                        else:
-                            cap = None
-                    except Exception as e:
-                        print(f"Error loading video file for feed {feed_id}: {e}")
-                        cap = None
-            
-            # Fallback to camera or demo
-            if cap is None or not cap.isOpened():
-                try:
-                    # Try to use webcam
-                    cap = cv2.VideoCapture(feed_id if feed_id < 4 else 0)
-                    if cap.isOpened():
-                        print(f"Using camera for feed {feed_id}")
-                except Exception as e:
-                    print(f"Could not open camera for feed {feed_id}: {e}")
-                    cap = None
-            
-            # If no camera available, generate demo frames
-            if cap is None or not cap.isOpened():
-                print(f"Generating demo frames for feed {feed_id}")
-                frame_count = 0
-                while True:
-                    # Create animated dummy frame
-                    dummy_frame = np.zeros((360, 480, 3), dtype=np.uint8)
-                    
-                    # Create some basic animation
-                    time_text = f"Demo Feed {feed_id+1}"
-                    frame_text = f"Frame: {frame_count}"
-                    status_text = "LIVE DEMO"
-                    
-                    cv2.putText(dummy_frame, time_text, (120, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    cv2.putText(dummy_frame, frame_text, (150, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    cv2.putText(dummy_frame, status_text, (150, 250), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                    
-                    # Add some simple animation (moving rectangle)
-                    x_pos = int((frame_count % 100) * 4.8)
-                    cv2.rectangle(dummy_frame, (x_pos, 300), (x_pos + 30, 320), (255, 0, 0), -1)
-                    
-                    frame_bytes = compress_frame(dummy_frame)
-                    if frame_bytes:
-                        try:
-                            frame_queues[feed_id].put(frame_bytes, block=False)
-                        except queue.Full:
-                            try:
-                                frame_queues[feed_id].get_nowait()
-                                frame_queues[feed_id].put(frame_bytes, block=False)
-                            except queue.Empty:
-                                pass
-                    
-                    frame_count += 1
-                    time.sleep(0.1)  # 10 FPS for demo
-                    
-                    # Simple break condition
-                    if frame_count > 1000000:
-                        frame_count = 0
-            
-            # Set buffer size to prevent lag
-            if cap:
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            
-            while True:
-                if cap is None or not cap.isOpened():
-                    break
-                    
-                success, frame = cap.read()
-                if not success:
-                    if hasattr(cap, 'set'):
-                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop video
-                    break
-
-                # Limit FPS to reduce bandwidth
-                if not should_process_frame(feed_id):
-                    continue
-
-                # Resize and compress for transmission
-                frame = cv2.resize(frame, VIDEO_QUALITY['resolution'], interpolation=cv2.INTER_LINEAR)
-                
-                try:
-                    detector = get_detector(feed_id)
-                    processed_frame, count, green_time, signal_state = detector.process_frame(frame)
-                except IndexError as e:
-                    import traceback
-                    print(f"IndexError in detector for feed {feed_id}: {e}")
-                    traceback.print_exc()
-                    # Use unprocessed frame as fallback
-                    processed_frame = frame
-                    count = 0
-                    green_time = 30
-                    signal_state = "GREEN"
-                except Exception as e:
-                    print(f"Error processing frame in detector for feed {feed_id}: {e}")
-                    # Use unprocessed frame as fallback
-                    processed_frame = frame
-                    count = 0
-                    green_time = 30
-                    signal_state = "GREEN"
-                
-                # Update global optimizer phases to rotate traffic signals properly
-                try:
-                    global_optimizer.update_phase({})
-                except Exception as e:
-                    pass  # Silent fail for phase update
-
-                data = {
-                    "count": count,
-                    "green_time": green_time,
-                    "signal_state": signal_state
-                }
-
-                try:
-                    data_queues[feed_id].put(data, block=False)
-                except queue.Full:
-                    try:
-                        data_queues[feed_id].get_nowait()
-                        data_queues[feed_id].put(data, block=False)
-                    except queue.Empty:
-                        pass
-
-                # Compress frame for streaming
-                frame_bytes = compress_frame(processed_frame, jpeg_quality=VIDEO_QUALITY['jpeg_quality'])
-                if frame_bytes:
-                    try:
-                        frame_queues[feed_id].put(frame_bytes, block=False)
-                    except queue.Full:
-                        try:
-                            frame_queues[feed_id].get_nowait()
-                            frame_queues[feed_id].put(frame_bytes, block=False)
-                        except queue.Empty:
-                            pass
-        
-        except Exception as e:
-            print(f"Error in video processing thread {feed_id}: {e}")
-            time.sleep(1)
-            continue
-        finally:
-            if cap:
-                cap.release()
-
-@app.route('/')
-def index():
-    """Root endpoint for quick health check"""
-    try:
-        return jsonify({
-            "message": "Traffic Monitor Backend API", 
-            "status": "running",
-            "port": os.environ.get("PORT", 5000),
-            "threads_active": threading.active_count(),
-            "environment": "production" if os.environ.get("RENDER") else "development"
-        })
-    except Exception as e:
-        return jsonify({
-            "message": "Traffic Monitor Backend API",
-            "status": "error",
-            "error": str(e)
-        }), 500
-
-@app.route('/health')
-def health_check():
-    """Detailed health check with thread and queue status"""
-    queue_sizes = [frame_queues[i].qsize() for i in range(4)]
-    return jsonify({
-        "status": "healthy",
-        "timestamp": time.time(),
-        "threads_active": threading.active_count(),
-        "frame_queue_sizes": queue_sizes,
-        "detectors_initialized": [detectors[i] is not None for i in range(4)],
-        "upload_folder": UPLOAD_FOLDER,
-        "max_file_size": "500MB"
-    })
-
-def generate_frames(feed_id):
-    while True:
-        try:
-            # Use timeout to prevent indefinite blocking
-            frame_bytes = frame_queues[feed_id].get(timeout=5)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except queue.Empty:
-            # Timeout occurred - stream has stalled
-            # Send a dummy frame or break to let client reconnect
-            print(f"Feed {feed_id} timeout: no frames in queue for 5 seconds")
-            break
-
-@app.route('/video_feed/<int:feed_id>')
-def video_feed(feed_id):
-    if 0 <= feed_id < 4:
-        return Response(generate_frames(feed_id),
-                        mimetype='multipart/x-mixed-replace; boundary=frame')
-    return "Invalid feed ID", 404
-
-@app.route('/get_data/<int:feed_id>')
-def get_data(feed_id):
-    """Get real-time traffic data for a specific lane"""
-    if 0 <= feed_id < 4:
-        try:
-            # Initialize global optimizer if needed
-            initialize_global_optimizer()
-            
-            data = data_queues[feed_id].get_nowait()
-            
-            # Get detector for next green time calculation
-            detector = get_detector(feed_id)
-            next_green_time = detector.get_next_green_time()
-            
-            # Check observation phase status
-            observation_status = None
-            if global_optimizer:
-                if global_optimizer.observation_enabled:
-                    obs_info = global_optimizer.get_observation_status()
-                    lane_obs = obs_info.get(f'lane_{feed_id}', {})
-                    observation_status = {
-                        'in_progress': not lane_obs.get('ready', False),
-                        'time_elapsed': lane_obs.get('time', 0),
-                        'max_vehicles': lane_obs.get('max_vehicles', 0)
-                    }
-                    # During observation, show vehicles but not final signal control yet
-                    data['signal_state'] = 'OBSERVATION'
-                    data['green_time'] = 0
-                    next_green_time = 0
-                else:
-                    # Check if observation just completed
-                    if feed_id == 0:  # Only log once
-                        pass
-            
-            # Add phase information from global optimizer
-            lane_phase = "NORTH_SOUTH" if feed_id in [0, 2] else "EAST_WEST"
-            
-            response_data = {
-                **data,
-                "lane_id": feed_id,
-                "lane_name": ["North", "East", "South", "West"][feed_id],
-                "current_phase": lane_phase,
-                "next_green_time": next_green_time,
-                "observation": observation_status,
-                "phase_info": "Analyzing traffic..." if data["signal_state"] == "OBSERVATION" else ("Opposite lanes GREEN" if data["signal_state"] == "RED" else "This lane GREEN")
-            }
-            
-            return jsonify(response_data)
-        except queue.Empty:
-            # Return default observation status during initial period
-            return jsonify({
-                "count": 0, 
-                "green_time": 0, 
-                "signal_state": "OBSERVATION",
-                "lane_id": feed_id,
-                "lane_name": ["North", "East", "South", "West"][feed_id],
-                "next_green_time": 0,
-                "observation": {"in_progress": True, "time_elapsed": 0, "max_vehicles": 0},
-                "phase_info": "Analyzing traffic..."
-            })
-    return jsonify({"error": "Invalid feed ID"}), 404
-
-@app.route('/set_video_source', methods=['POST'])
-def set_video_source():
-    global current_video_sources
-    
-    data = request.get_json()
-    sources = data.get('sources', [])
-    
-    current_video_sources = sources + [None] * (4 - len(sources))
-    
-    return jsonify({"message": "Video sources updated", "sources": current_video_sources})
-
-@app.route('/set_youtube_feed', methods=['POST'])
-def set_youtube_feed():
-    """Set a YouTube video URL for a specific feed"""
-    global current_video_sources
-    
-    data = request.get_json()
-    feed_id = data.get('feed_id', 0)
-    youtube_url = data.get('url', '')
-    
-    if not youtube_url:
-        return jsonify({"error": "YouTube URL required"}), 400
-    
-    if not (0 <= feed_id < 4):
-        return jsonify({"error": "Invalid feed ID"}), 400
-    
-    try:
-        # Validate it's a YouTube URL
-        if 'youtube.com' not in youtube_url and 'youtu.be' not in youtube_url:
-            return jsonify({"error": "Invalid YouTube URL"}), 400
-        
-        current_video_sources[feed_id] = youtube_url
-        
-        return jsonify({
-            "message": f"YouTube video set for feed {feed_id}",
-            "feed_id": feed_id,
-            "url": youtube_url,
-            "status": "active"
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/upload_video', methods=['POST'])
-def upload_video():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file provided"}), 400
-    
-    file = request.files['file']
-    feed_id = request.form.get('feed_id', '0')
-    
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-    
-    try:
-        feed_id = int(feed_id)
-        if not (0 <= feed_id < 4):
-            return jsonify({"error": "Invalid feed ID"}), 400
-    except (ValueError, TypeError):
-        return jsonify({"error": "Invalid feed ID"}), 400
-    
-    if file and allowed_file(file.filename):
-        # Save the uploaded file
-        file_path = VideoUploadHandler.save_uploaded_file(file)
-        
-        if file_path:
-            # Update video source
-            global current_video_sources
-            current_video_sources[feed_id] = file_path
-            
-            return jsonify({
-                "message": "Video uploaded successfully",
-                "feed_id": feed_id,
-                "file_path": file_path,
-                "status": "active"
-            })
-        else:
-            return jsonify({"error": "Failed to save file"}), 500
-    else:
-        return jsonify({"error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
-
-@app.route('/get_all_signal_states')
-def get_all_signal_states():
-    """Get signal state for all 4 lanes (4-way junction phase control)"""
-    global global_optimizer
-    
-    # Initialize optimizer if needed
-    initialize_global_optimizer()
-    
-    # Collect lane metrics from all detectors
-    lane_metrics_dict = {}
-    for lane_id in range(4):
-        detector = get_detector(lane_id)
-        try:
-            data = data_queues[lane_id].get_nowait()
-        except queue.Empty:
-            data = {"count": 0, "green_time": 30, "signal_state": "GREEN"}
-        
-        # Create lane metrics (simplified for phase management)
-        lane_metrics_dict[lane_id] = LaneMetrics(
-            vehicle_count=data.get("count", 0),
-            queue_length=data.get("count", 0) * 5,  # Assume 5m per vehicle
-            average_speed=0,
-            saturation_level=min(data.get("count", 0) / 30.0, 1.0),
-            discharge_rate=2.1,
-            arrival_rate=0,
-            wait_time_avg=0,
-            bottleneck_severity=0
-        )
-    
-    # Get all signal states from global optimizer
-    signal_states = global_optimizer.get_all_signal_states(lane_metrics_dict)
-    
-    # Format response with lane information
-    response = {
-        "timestamp": time.time(),
-        "current_phase": "NORTH_SOUTH" if global_optimizer.current_phase == "NORTH_SOUTH" else "EAST_WEST",
-        "lanes": {}
-    }
-    
-    for lane_id in range(4):
-        lane_names = ["North", "East", "South", "West"]
-        response["lanes"][lane_id] = {
-            "lane_name": lane_names[lane_id],
-            "signal_state": signal_states[lane_id]["state"],
-            "remaining_green_time": signal_states[lane_id]["duration"],
-            "phase": signal_states[lane_id]["phase"],
-            "vehicle_count": lane_metrics_dict[lane_id].vehicle_count
-        }
-    
-    return jsonify(response)
-
-@app.route('/get_bottleneck_analysis/<int:feed_id>')
-def get_bottleneck_analysis(feed_id):
-    """Get detailed bottleneck analysis for a specific feed"""
-    if 0 <= feed_id < 4:
-        detector = detectors[feed_id]
-        
-        # Get current bottleneck strategies
-        strategies = detector.bottleneck_strategies.copy()
-        
-        # Analyze current traffic conditions
-        vehicle_types = [v.vehicle_type for v in detector.vehicles_data[-20:]]  # Last 20 vehicles
-        
-        analysis = {
-            "feed_id": feed_id,
-            "current_strategies": strategies,
-            "traffic_intensity": len(detector.total_count),
-            "signal_optimization": {
-                "current_green_time": detector.current_green_time,
-                "signal_state": detector.signal_state,
-                "vehicles_in_queue": len(detector.vehicles_data),
-                "optimization_active": bool(strategies)
-            },
-            "bottleneck_alerts": []
-        }
-        
-        # Generate bottleneck alerts
-        if len(detector.total_count) > 20:
-            analysis["bottleneck_alerts"].append({
-                "type": "HIGH_CONGESTION",
-                "severity": "HIGH",
-                "message": f"High vehicle density detected: {len(detector.total_count)} vehicles"
-            })
-        
-        if detector.signal_state == "RED" and (time.time() - detector.signal_start_time) > 60:
-            analysis["bottleneck_alerts"].append({
-                "type": "LONG_RED_CYCLE", 
-                "severity": "MEDIUM",
-                "message": "Extended red light may cause spillback"
-            })
-        
-        return jsonify(analysis)
-    
-    return jsonify({"error": "Invalid feed ID"}), 404
-
-@app.route('/optimize_signal/<int:feed_id>', methods=['POST'])
-def optimize_signal(feed_id):
-    """Manually trigger signal optimization for a specific feed"""
-    if 0 <= feed_id < 4:
-        detector = detectors[feed_id]
-        
-        # Force optimization
-        vehicle_types = [v.vehicle_type for v in detector.vehicles_data[-15:]]
-        new_green_time = detector.calculate_green_time(len(detector.total_count), vehicle_types)
-        
-        # Apply optimization
-        detector.current_green_time = new_green_time
-        detector.signal_start_time = time.time()
-        
-        return jsonify({
-            "message": f"Signal optimized for feed {feed_id}",
-            "new_green_time": new_green_time,
-            "vehicles_detected": len(detector.total_count),
-            "optimization_applied": True
-        })
-    
-    return jsonify({"error": "Invalid feed ID"}), 404
-
-# ==== NEW API ENDPOINTS FOR FRONTEND ====
-
-@app.route('/api/health')
-def api_health():
-    """Health check for frontend"""
-    return jsonify({"status": "ok", "message": "Backend is running"}), 200
-
-@app.route('/api/video/start', methods=['POST'])
-def api_start_video():
-    """Start video processing"""
-    return jsonify({"status": "started", "message": "Video processing started"}), 200
-
-@app.route('/api/video/stop', methods=['POST'])
-def api_stop_video():
-    """Stop video processing"""
-    return jsonify({"status": "stopped", "message": "Video processing stopped"}), 200
-
-@app.route('/api/video/frame')
-def api_video_frame():
-    """Get single frame from feed 0 (CAM1) as base64 JPEG"""
-    try:
-        frame_bytes = frame_queues[0].get_nowait()
-        import base64
-        frame_b64 = base64.b64encode(frame_bytes).decode('utf-8')
-        return jsonify({"frame": frame_b64, "status": "ok"}), 200
-    except queue.Empty:
-        # Return a dummy frame if queue is empty
-        dummy = np.zeros((360, 480, 3), dtype=np.uint8)
-        ret, buf = cv2.imencode('.jpg', dummy)
-        import base64
-        b64 = base64.b64encode(buf.tobytes()).decode('utf-8')
-        return jsonify({"frame": b64, "status": "ok"}), 200
-
-@app.route('/api/traffic/data')
-def api_traffic_data():
-    """Get traffic data for feed 0 (CAM1)"""
-    try:
-        data = data_queues[0].get_nowait()
-        return jsonify({
-            "vehicle_counts": [data.get("count", 0), 0, 0, 0],
-            "signal_state": data.get("signal_state", "GREEN"),
-            "green_time": data.get("green_time", 30),
-            "status": "ok"
-        }), 200
-    except queue.Empty:
-        return jsonify({
-            "vehicle_counts": [0, 0, 0, 0],
-            "signal_state": "GREEN",
-            "green_time": 30,
-            "status": "ok"
-        }), 200
-
-# Simple Video Handler Classes
-class YouTubeVideoHandler:
-    """Handle YouTube video streaming"""
-    
-    @staticmethod
-    def get_video_stream(youtube_url, resolution='480p'):
-        """
-        Get video stream from YouTube URL using yt-dlp
-        
-        Args:
-            youtube_url: YouTube URL
-            resolution: Desired resolution (default 480p)
-            
-        Returns:
-            cv2.VideoCapture object or None
-        """
-        try:
-            # Use yt-dlp to get the best format
-            import yt_dlp
-            
-            ydl_opts = {
-                'format': 'best[height<=480]/best',
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=False)
-                video_url = info['url']
-                
-            cap = cv2.VideoCapture(video_url)
-            if cap.isOpened():
-                return cap
-            return None
-            
-        except Exception as e:
-            print(f"Error getting YouTube stream: {e}")
-            return None
-
-
-class VideoUploadHandler:
-    """Handle uploaded video files"""
-    
-    @staticmethod
-    def is_allowed_file(filename):
-        """Check if file extension is allowed"""
-        return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-    
-    @staticmethod
-    def save_uploaded_file(file):
-        """Save uploaded file to disk"""
-        try:
-            if file and VideoUploadHandler.is_allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add timestamp to avoid conflicts
-                filename = f"{int(time.time())}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                return filepath
-        except Exception as e:
-            print(f"Error saving file: {e}")
-        return None
-    
-    @staticmethod
-    def get_video_stream(filepath):
-        """Get video stream from file"""
-        try:
-            if os.path.exists(filepath):
-                cap = cv2.VideoCapture(filepath)
-                if cap.isOpened():
-                    return cap
-        except Exception as e:
-            print(f"Error opening video file: {e}")
-        return None
-
-
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-if __name__ == '__main__':
-    # Initialize global optimizer for 4-way junction phase management
-    initialize_global_optimizer()
-    
-    # Start video processing threads for each feed AFTER Flask starts
-    # This allows the health check endpoint to respond immediately
-    import atexit
-    
-    def start_video_threads():
-        """Start video threads after a short delay"""
-        time.sleep(1)
-        for i in range(4):
-            threading.Thread(target=video_processing_thread, args=(i,), daemon=True).start()
-        print("Video processing threads started")
-    
-    # Start threads in background after Flask boots
-    threading.Thread(target=start_video_threads, daemon=True).start()
-
-    # Render deployment configuration
-    port = int(os.environ.get("PORT", 5000))
-    # Force debug OFF for faster startup
-    debug_mode = False  # os.environ.get("FLASK_ENV") != "production"
-    
-    app.run(host='0.0.0.0', port=port, debug=debug_mode, threaded=True, use_reloader=False)
-
-# Initialize video threads for production deployment (Render/Heroku)
-def initialize_threads():
-    """Initialize video processing threads for production"""
-    try:
-        print("Starting video processing threads...")
-        # Initialize global optimizer first
-        initialize_global_optimizer()
-        
-        for i in range(4):
-            thread = threading.Thread(target=video_processing_thread, args=(i,), daemon=True)
-            thread.start()
-            print(f"Started thread for camera {i+1}")
-        print("All video threads started successfully")
-        print("4-way junction phase-based signal control ACTIVE")
-    except Exception as e:
-        print(f"Error starting threads: {e}")
-        # Continue without threads for basic API functionality
-
-# Start threads when module is imported (for gunicorn)
-# Disabled automatic thread startup to allow faster app initialization
-# Threads will start on first video request
-try:
-    print("Flask app module loaded successfully")
-    print(f"Environment: {'production' if os.environ.get('RENDER') else 'development'}")
-    print(f"Port: {os.environ.get('PORT', 5000)}")
-    print("Signal Control: 4-Way Junction Phase-Based Management")
-except Exception as e:
-    print(f"Error in production initialization: {e}")
-
+from flask import Flask, render_template, Response, jsonify, request
+from flask_cors import CORS
+import cv2
+import numpy as np
+from ultralytics import YOLO
+import cvzone
+import math
+from sort import *
+import collections
+import hashlib
+import json
+import re
+import shutil
+import threading
+import queue
+import time
+import os
+import tempfile
+import requests
+from werkzeug.utils import secure_filename
+from intelligent_traffic_optimizer import IntelligentTrafficOptimizer, VehicleData, LaneMetrics, SignalPhase, LaneVehicleBatch
+import subprocess
+import urllib.parse
+
+# Keep OpenCV/Torch single-threaded per call - parallelism comes from the
+# 4 feed threads plus batched inference, not nested OpenMP thread pools
+cv2.setNumThreads(1)
+try:
+    cv2.ocl.setUseOpenCL(False)
+except Exception:
+    pass
+try:
+    import torch
+    torch.set_num_threads(1)
+    torch.set_num_interop_threads(1)
+    TORCH_AVAILABLE = True
+except Exception as e:
+    TORCH_AVAILABLE = False
+    print(f"Warning: could not configure torch threading: {e}")
+
+# Inference device/precision resolved once: FP16 on CUDA halves activation
+# bandwidth; on CPU stay FP32 (half is not supported there)
+YOLO_DEVICE = 0 if (TORCH_AVAILABLE and torch.cuda.is_available()) else 'cpu'
+YOLO_HALF = YOLO_DEVICE != 'cpu'
+# COCO indices for bicycle, car, motorbike, bus, truck - passing classes= pushes
+# the vehicle filter into the model's NMS instead of Python-level checks
+YOLO_CLASSES = [1, 2, 3, 5, 7]
+
+# Load environment variables from .env file (for local development)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass  # python-dotenv not installed, using system env vars
+
+# Import Supabase routes
+try:
+    from supabase_routes import register_supabase_routes
+    SUPABASE_ROUTES_AVAILABLE = True
+except ImportError:
+    SUPABASE_ROUTES_AVAILABLE = False
+    print("Warning: Supabase routes not available")
+
+# libjpeg-turbo JPEG encoder (SIMD DCT - much faster than cv2.imencode)
+try:
+    import simplejpeg
+    SIMPLEJPEG_AVAILABLE = True
+except ImportError:
+    SIMPLEJPEG_AVAILABLE = False
+    print("Warning: simplejpeg not installed, falling back to cv2.imencode")
+
+# Optional ONNX Runtime backend - skips the Ultralytics predict() wrapper
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Optional Redis mirror for junction state - detector/optimizer state lives
+# in-process, so when gunicorn runs more than one worker only the worker
+# with the video threads has real data. Mirroring lane state to a shared
+# hash gives the other workers a consistent source of truth.
+try:
+    import redis as redis_lib
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Optional C-accelerated JSON encoder for the hot polling endpoints
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional WebSocket push channel - signal state changes on phase
+# transitions (seconds apart), so pushing diffs replaces most of the
+# per-second REST polling from the 4 lane panels
+try:
+    from flask_sock import Sock
+    FLASK_SOCK_AVAILABLE = True
+except ImportError:
+    FLASK_SOCK_AVAILABLE = False
+    print("Warning: flask-sock not installed, WebSocket push disabled")
+
+# Optional response compression - the JSON/CSV payloads are repetitive
+# text that shrinks 3-10x on the wire
+try:
+    from flask_compress import Compress
+    FLASK_COMPRESS_AVAILABLE = True
+except ImportError:
+    FLASK_COMPRESS_AVAILABLE = False
+    print("Warning: flask-compress not installed, response compression disabled")
+
+
+app = Flask(__name__)
+
+# Route every jsonify through orjson: ~5x faster encoding than stdlib
+# json and it emits bytes directly. Flask's default() hook still handles
+# datetime/Decimal/UUID; OPT_SERIALIZE_NUMPY covers numpy scalars from
+# the detector/optimizer without .item() sprinkled at call sites.
+if ORJSON_AVAILABLE:
+    from flask.json.provider import DefaultJSONProvider
+
+    class _OrjsonProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(
+                obj,
+                option=orjson.OPT_SERIALIZE_NUMPY,
+                default=self.default,
+            ).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = _OrjsonProvider(app)
+
+CORS(app, resources={
+    r"/video_feed/*": {"origins": "*", "methods": ["GET", "HEAD", "OPTIONS"]},
+    r"/get_data/*": {"origins": "*"},
+    r"/api/*": {"origins": "*"},
+    r"/*": {"origins": "*"}
+})  # Enable CORS with specific headers for video streaming
+
+# Compress JSON/CSV/HTML responses above 1 KB. Only the listed
+# mimetypes are touched, so the MJPEG video streams pass through
+# untouched; brotli is preferred when the client accepts it.
+if FLASK_COMPRESS_AVAILABLE:
+    app.config['COMPRESS_MIMETYPES'] = [
+        'application/json', 'text/csv', 'text/html', 'text/plain'
+    ]
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    Compress(app)
+
+# Register Supabase API routes
+if SUPABASE_ROUTES_AVAILABLE:
+    register_supabase_routes(app)
+
+# WebSocket push channel (used when flask-sock is installed)
+sock = Sock(app) if FLASK_SOCK_AVAILABLE else None
+_ws_clients = set()
+_ws_clients_lock = threading.Lock()
+# Last state broadcast per lane - diffs are only pushed on transitions
+_last_broadcast_states = [None] * 4
+
+def broadcast_signal_state(payload):
+    """Push a signal-state diff to all connected WebSocket clients"""
+    if not _ws_clients:
+        return
+    message = json.dumps(payload)
+    with _ws_clients_lock:
+        clients = list(_ws_clients)
+    for ws in clients:
+        try:
+            ws.send(message)
+        except Exception:
+            # Client went away - drop it from the set
+            with _ws_clients_lock:
+                _ws_clients.discard(ws)
+
+if FLASK_SOCK_AVAILABLE:
+    @sock.route('/ws/signals')
+    def ws_signals(ws):
+        """Clients subscribe once and receive state diffs on phase changes"""
+        with _ws_clients_lock:
+            _ws_clients.add(ws)
+        try:
+            while True:
+                # Keep the connection open; inbound messages are ignored
+                if ws.receive() is None:
+                    break
+        finally:
+            with _ws_clients_lock:
+                _ws_clients.discard(ws)
+
+# Upload folder configuration
+UPLOAD_FOLDER = 'uploaded_videos'
+ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'}
+
+if not os.path.exists(UPLOAD_FOLDER):
+    os.makedirs(UPLOAD_FOLDER)
+
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
+
+# Font for per-track labels (plain cv2 text - cheaper than cvzone in the hot loop)
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Signal-status panel dimensions (blitted into frames at (20, 20))
+_PANEL_H = 90
+_PANEL_W = 300
+
+# Video quality settings
+VIDEO_QUALITY = {
+    'resolution': (480, 360),  # Width x Height - 480p for bandwidth efficiency
+    'jpeg_quality': 70,  # 0-100, lower = smaller file
+    'fps_limit': 15  # Limit FPS to reduce bandwidth
+}
+
+# MJPEG multipart boundary bytes (static - built once, yielded as-is)
+_MJPEG_HEAD = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_MJPEG_TAIL = b'\r\n'
+
+_redis_client = None
+
+def get_redis():
+    """Lazily connect to Redis when REDIS_URL is configured, else None"""
+    global _redis_client
+    if not REDIS_AVAILABLE or not os.environ.get('REDIS_URL'):
+        return None
+    if _redis_client is None:
+        try:
+            _redis_client = redis_lib.Redis.from_url(
+                os.environ['REDIS_URL'],
+                socket_timeout=0.2, decode_responses=True)
+        except Exception as e:
+            print(f"Warning: could not connect to Redis: {e}")
+            return None
+    return _redis_client
+
+def ojson(obj, status=200):
+    """jsonify replacement for hot endpoints: orjson encodes in C and
+    serializes NumPy scalars natively; falls back to jsonify if missing"""
+    if ORJSON_AVAILABLE:
+        return Response(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+                        status=status, mimetype='application/json')
+    return jsonify(obj), status
+
+# Lane display names and phase membership indexed by feed_id - built once,
+# never reallocated (lanes 0/2 run in the NORTH_SOUTH phase, 1/3 EAST_WEST)
+LANE_NAMES = ("North", "East", "South", "West")
+LANE_PHASE = ("NORTH_SOUTH", "EAST_WEST", "NORTH_SOUTH", "EAST_WEST")
+
+# Default observation block returned while the pipeline is still warming up
+DEFAULT_OBS = {"in_progress": True, "time_elapsed": 0, "max_vehicles": 0}
+
+# Warm-up responses for /get_data, one per lane, serialized once at import -
+# panels poll this path at several Hz before the pipeline produces data, and
+# the payload shape is fully fixed (encode cost is import-time, so plain json
+# is fine here)
+_EMPTY_RESPONSES = [json.dumps({
+    "count": 0,
+    "green_time": 0,
+    "signal_state": "OBSERVATION",
+    "lane_id": i,
+    "lane_name": LANE_NAMES[i],
+    "next_green_time": 0,
+    "observation": DEFAULT_OBS,
+    "phase_info": "Analyzing traffic..."
+}).encode() for i in range(4)]
+
+# Static black fallback frame, encoded once at import - no per-request
+# allocation or JPEG encode when a feed has not produced a frame yet
+_DUMMY_JPEG = cv2.imencode(
+    '.jpg', np.zeros((360, 480, 3), dtype=np.uint8),
+    [cv2.IMWRITE_JPEG_QUALITY, 70]
+)[1].tobytes()
+
+class LatestSlot:
+    """
+    Single-slot "latest value" buffer
+
+    Producers overwrite the slot, consumers read the freshest value. The slot
+    holds a single object reference, and CPython reference stores/loads are
+    atomic under the GIL, so no mutex is needed for the single-writer case -
+    unlike the put/get_nowait/put "keep newest" Queue pattern, which takes the
+    queue's internal lock three times per frame. A racing put between a get's
+    read and its event clear can at worst drop one wakeup, which is fine for
+    keep-latest streaming.
+    """
+    def __init__(self):
+        self._value = None
+        self._event = threading.Event()
+
+    def put(self, value):
+        self._value = value
+        self._event.set()
+
+    def get(self, timeout=None):
+        """Wait for a fresh value; returns None on timeout"""
+        if not self._event.wait(timeout):
+            return None
+        value = self._value
+        self._event.clear()
+        return value
+
+    def peek(self):
+        """Return the most recent value without consuming it"""
+        return self._value
+
+
+# Latest frame/data slots for each of the 4 feeds - live consumers only
+# ever want the freshest value
+frame_slots = [LatestSlot() for _ in range(4)]
+data_slots = [LatestSlot() for _ in range(4)]
+
+# Connected MJPEG stream clients per feed - producers skip JPEG encoding
+# entirely when nobody is watching a feed
+_stream_clients = [0] * 4
+_stream_clients_lock = threading.Lock()
+
+def _feed_has_viewers(feed_id):
+    """True when a frame encoded for this feed can reach a client.
+
+    Feed 0 also backs the /api/video/frame polling endpoint, so it always
+    keeps encoding.
+    """
+    return feed_id == 0 or _stream_clients[feed_id] > 0
+
+# Global optimizer instance (shared across all detectors for phase management)
+global_optimizer = None
+
+# Shared YOLO model + central inference worker (batches all 4 feeds)
+shared_model = None
+shared_model_lock = threading.Lock()
+inference_in_queue = queue.Queue(maxsize=8)
+detections_queues = [queue.Queue(maxsize=1) for _ in range(4)]
+inference_worker_thread = None
+
+
+def get_shared_model():
+    """Load the single shared YOLO model (one copy serves all 4 feeds)"""
+    global shared_model
+    if shared_model is None:
+        with shared_model_lock:
+            if shared_model is None:
+                print("Loading shared YOLO model...")
+                shared_model = YOLO("yolov8n.pt")  # Use smaller model for faster processing
+                try:
+                    shared_model.fuse()  # Fold BatchNorm into Conv layers
+                except Exception as e:
+                    print(f"Warning: could not fuse YOLO model: {e}")
+    return shared_model
+
+
+class OnnxYoloBackend:
+    """
+    Thin onnxruntime wrapper around an exported YOLOv8 model
+
+    Bypasses the Ultralytics Model.__call__ -> Predictor path (LetterBox,
+    Results construction, logging) and returns raw (N,5) detection arrays
+    ready for the tracker.
+    """
+
+    def __init__(self, model_path="yolov8n.onnx", imgsz=480, conf=0.3, iou=0.45):
+        if not os.path.exists(model_path):
+            # One-time export from the bundled weights
+            print("Exporting yolov8n.pt to ONNX...")
+            YOLO("yolov8n.pt").export(format='onnx', imgsz=imgsz, simplify=True)
+        self.session = ort.InferenceSession(
+            model_path,
+            providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def detect(self, frame):
+        """Run one frame; returns an (N,5) [x1,y1,x2,y2,conf] float32 array"""
+        h, w = frame.shape[:2]
+        img = cv2.resize(frame, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        x = np.ascontiguousarray(img.transpose(2, 0, 1)[None], dtype=np.float32)
+        x *= np.float32(1.0 / 255.0)
+
+        out = self.session.run(None, {self.input_name: x})[0][0]  # (84, N)
+
+        boxes = out[:4].T   # cx, cy, w, h
+        scores = out[4:]    # (80, N) per-class scores
+        cls_ids = scores.argmax(axis=0)
+        confs = scores[cls_ids, np.arange(scores.shape[1])]
+
+        keep = (confs > self.conf) & np.isin(cls_ids, YOLO_CLASSES)
+        if not keep.any():
+            return np.empty((0, 5), dtype=np.float32)
+        boxes, confs = boxes[keep], confs[keep]
+
+        # cxcywh -> xyxy, scaled back to the original frame size
+        xy = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy = np.concatenate([xy, xy + boxes[:, 2:]], axis=1)
+        xyxy[:, [0, 2]] *= w / self.imgsz
+        xyxy[:, [1, 3]] *= h / self.imgsz
+
+        wh = xyxy[:, 2:] - xyxy[:, :2]
+        idx = cv2.dnn.NMSBoxes(
+            np.concatenate([xyxy[:, :2], wh], axis=1).tolist(),
+            confs.tolist(), self.conf, self.iou)
+        if len(idx) == 0:
+            return np.empty((0, 5), dtype=np.float32)
+        idx = np.asarray(idx).reshape(-1)
+        return np.column_stack([xyxy[idx], confs[idx]]).astype(np.float32)
+
+
+# Lazy ONNX backend instance (shared, like the YOLO model)
+onnx_backend = None
+
+
+def get_onnx_backend():
+    """Build the shared ONNX backend on first use; None when unavailable"""
+    global onnx_backend
+    if not ONNX_AVAILABLE:
+        return None
+    if onnx_backend is None:
+        with shared_model_lock:
+            if onnx_backend is None:
+                try:
+                    onnx_backend = OnnxYoloBackend()
+                    print("ONNX Runtime backend active")
+                except Exception as e:
+                    print(f"Warning: could not initialize ONNX backend: {e}")
+                    return None
+    return onnx_backend
+
+
+def inference_worker():
+    """
+    Central inference loop: collects pending frames from all feeds and runs
+    them through the shared YOLO model as one batched call.
+
+    Batching amortizes per-call model overhead across up to 4 frames instead
+    of serializing 4 independent forward passes.
+    """
+    backend = get_onnx_backend()
+    model = None if backend else get_shared_model()
+
+    while True:
+        try:
+            # Block for the first frame, then grab whatever else is pending
+            feed_id, frame = inference_in_queue.get(timeout=1)
+            batch_ids = [feed_id]
+            batch_frames = [frame]
+
+            while len(batch_frames) < 4:
+                try:
+                    feed_id, frame = inference_in_queue.get(block=False)
+                    batch_ids.append(feed_id)
+                    batch_frames.append(frame)
+                except queue.Empty:
+                    break
+
+            if backend is not None:
+                # Direct ONNX session per frame (batch-1 export) - the saved
+                # wrapper overhead outweighs losing the batched forward pass
+                results = [backend.detect(f) for f in batch_frames]
+            else:
+                # One batched forward pass for all collected frames
+                results = model.predict(batch_frames, stream=False, verbose=False,
+                                        conf=0.3, classes=YOLO_CLASSES,
+                                        half=YOLO_HALF, device=YOLO_DEVICE)
+
+            # Route each Results object back to its feed
+            for feed_id, result in zip(batch_ids, results):
+                try:
+                    detections_queues[feed_id].put(result, block=False)
+                except queue.Full:
+                    try:
+                        detections_queues[feed_id].get_nowait()
+                        detections_queues[feed_id].put(result, block=False)
+                    except queue.Empty:
+                        pass
+        except queue.Empty:
+            continue
+        except Exception as e:
+            print(f"Error in inference worker: {e}")
+            time.sleep(0.1)
+
+
+def ensure_inference_worker():
+    """Start the central inference worker thread once"""
+    global inference_worker_thread
+    if inference_worker_thread is None or not inference_worker_thread.is_alive():
+        inference_worker_thread = threading.Thread(target=inference_worker, daemon=True)
+        inference_worker_thread.start()
+        print("Central inference worker started")
+    return inference_worker_thread
+
+class VehicleDetector:
+    def __init__(self):
+        try:
+            self.model = get_shared_model()  # Single model shared by all detectors
+            self.tracker = Sort(max_age=10, min_hits=1, iou_threshold=0.1)
+            self.total_count = 0  # Running count of unique vehicles crossing the line
+            self.counted_ids = set()  # O(1) membership test for already-counted track IDs
+            
+            # Initialize intelligent optimizer (will be overridden by global optimizer)
+            self.optimizer = IntelligentTrafficOptimizer()
+            print("VehicleDetector initialized successfully")
+        except Exception as e:
+            print(f"Error initializing VehicleDetector: {e}")
+            # Create minimal fallback
+            self.model = None
+            self.tracker = None
+            self.total_count = 0
+            self.counted_ids = set()
+            self.optimizer = None
+        
+        # Enhanced vehicle data, bounded so long runs don't grow unbounded
+        self.vehicles_data = collections.deque(maxlen=1000)
+        # Ring buffer of recent vehicle type names - the analysis endpoints
+        # read this O(1) instead of slicing vehicles_data per request
+        self.recent_types = collections.deque(maxlen=20)
+        self.bottleneck_strategies = {}
+        self.lane_id = 0  # Will be set per detector instance
+        
+        # Traffic engineering standards
+        self.MAX_SIGNAL_TIME = 120
+        self.MIN_SIGNAL_TIME = 7
+        self.YELLOW_TIME = 3
+        self.ALL_RED_TIME = 2
+        
+        # Real-world vehicle classification
+        self.class_names = ["person", "bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck"]
+        self.target_classes = frozenset(["car", "truck", "bus", "motorbike", "bicycle"])
+        # COCO indices of target_classes, precomputed for vectorized filtering
+        self._target_class_indices = np.array(YOLO_CLASSES, dtype=np.int32)
+        
+        # Vehicle type mapping for optimization
+        self.vehicle_type_map = {
+            "car": "car",
+            "truck": "truck", 
+            "bus": "bus",
+            "motorbike": "bike",
+            "bicycle": "bike"
+        }
+
+        # Detection lines (will be initialized with frame dimensions)
+        self.limit_lines = None
+        self.vehicle_counts_history = []
+        self.frame_analyzed = False
+        self.frame_height = None
+        self.frame_width = None
+        
+        # Signal timing tracking
+        self.cycle_start_time = time.time()
+        self.frame_count = 0
+        self.fps = 15  # Expected FPS for timing calculations
+        self.observation_start_time = None  # Track observation phase start
+        self.observation_elapsed = 0  # Track observation time per lane
+        
+        # Performance tracking
+        self.last_optimization_time = time.time()
+        self.optimization_interval = 5  # Optimize every 5 seconds
+
+        # Per-frame signal snapshot, filled by the single optimizer step in
+        # pre_infer and consumed by post_infer. _signal_state_since marks
+        # the last state transition so /get_bottleneck_analysis can flag
+        # over-long red phases.
+        self._signal_state = "OBSERVATION"
+        self._green_time = 30
+        self._signal_state_since = time.time()
+
+        # Previous downsampled grayscale frame for the motion gate
+        self._prev_gray = None
+
+        # Memoized LaneMetrics keyed by (lane, count, type composition) -
+        # stop-and-go traffic keeps the same composition for many frames
+        self._metrics_cache = {}
+
+        # Rendered signal-status panels keyed by (state, count, seconds)
+        self._panel_cache = {}
+
+    def analyze_video_frame(self, frame):
+        """Analyze video frame dimensions and initialize detection lines"""
+        if self.frame_analyzed:
+            return  # Already analyzed
+        
+        self.frame_height, self.frame_width = frame.shape[:2]
+        print(f"[Lane {self.lane_id}] Video analyzed - Resolution: {self.frame_width}x{self.frame_height}")
+        
+        # Initialize detection lines based on actual frame dimensions
+        # Position lines at 60% height with proper margins
+        y1 = int(self.frame_height * 0.60)  # Main detection line at 60% height
+        y2 = int(self.frame_height * 0.65)  # Secondary line at 65% height
+        
+        # Horizontal span: 20% from left to 80% from left (60% of frame width centered)
+        x_start = int(self.frame_width * 0.20)
+        x_end = int(self.frame_width * 0.80)
+        
+        # Create detection lines with calculated positions
+        self.limit_lines = [
+            [x_start, y1, x_end, y1],  # Main horizontal line
+            [x_start, y2, x_end, y2]   # Secondary horizontal line
+        ]
+        
+        self.frame_analyzed = True
+        print(f"[Lane {self.lane_id}] Detection lines marked:")
+        print(f"  Line 1: ({x_start}, {y1}) to ({x_end}, {y1})")
+        print(f"  Line 2: ({x_start}, {y2}) to ({x_end}, {y2})")
+
+    def initialize_lines(self, frame):
+        """Legacy method - calls analyze_video_frame"""
+        if not self.frame_analyzed:
+            self.analyze_video_frame(frame)
+
+    def get_signal_state(self):
+        """Get signal state from global optimizer based on phase logic"""
+        global global_optimizer
+        try:
+            if global_optimizer is None:
+                return "OBSERVATION"  # Fallback if optimizer not available
+            
+            # During observation phase, show OBSERVATION status
+            if global_optimizer.observation_enabled:
+                return "OBSERVATION"
+            
+            return global_optimizer.get_signal_state(self.lane_id)
+        except Exception as e:
+            print(f"Error getting signal state: {e}")
+            return "OBSERVATION"  # Safe fallback
+    
+    def get_green_time(self):
+        """Get remaining green time from global optimizer"""
+        global global_optimizer
+        try:
+            if global_optimizer is None:
+                return 30
+            
+            return global_optimizer.get_green_time(self.lane_id)
+        except Exception as e:
+            print(f"Error getting green time: {e}")
+            return 30  # Safe fallback
+
+    def get_next_green_time(self):
+        """Calculate when this lane will get green light if currently RED"""
+        global global_optimizer
+        try:
+            signal_state = self.get_signal_state()
+            
+            if signal_state == "GREEN" or signal_state == "YELLOW":
+                return 0  # Already green or about to be green
+            
+            if signal_state == "RED" and global_optimizer:
+                # Get opposite phase lanes
+                # North/South: lanes 0, 2; East/West: lanes 1, 3
+                if self.lane_id in [0, 2]:
+                    # This is North/South - opposite is East/West
+                    opposite_lanes = [1, 3]
+                else:
+                    # This is East/West - opposite is North/South
+                    opposite_lanes = [0, 2]
+                
+                # Get the max green time from opposite lanes
+                max_opposite_green = 0
+                for lane_id in opposite_lanes:
+                    opp_green = global_optimizer.get_green_time(lane_id)
+                    if opp_green > max_opposite_green:
+                        max_opposite_green = opp_green
+                
+                # Add yellow and all-red times
+                next_green = max_opposite_green + self.YELLOW_TIME + self.ALL_RED_TIME
+                return max(0, next_green)
+            
+            return 0
+        except Exception as e:
+            print(f"Error calculating next green time: {e}")
+            return 0
+
+    def calculate_lane_metrics(self, vehicle_count, vehicle_types=None):
+        """Calculate lane metrics for this detector's lane"""
+        
+        # Build a structure-of-arrays batch instead of N VehicleData objects
+        if vehicle_types:
+            type_codes = np.fromiter(
+                (LaneVehicleBatch.TYPE_CODES[self.vehicle_type_map.get(t, 'car')]
+                 for t in vehicle_types[:vehicle_count]),
+                dtype=np.int8)
+            vehicle_count = len(type_codes)
+        else:
+            type_codes = np.zeros(vehicle_count, dtype=np.int8)  # default: all cars
+
+        # Memoize on traffic composition - identical (lane, count, types)
+        # yields identical metrics, so skip the recomputation on cache hit
+        key = (self.lane_id, vehicle_count, tuple(np.sort(type_codes).tolist()))
+        cached = self._metrics_cache.get(key)
+        if cached is not None:
+            return cached
+
+        batch = LaneVehicleBatch(
+            lane_id=self.lane_id,
+            ids=np.arange(vehicle_count, dtype=np.int32),
+            type_codes=type_codes,
+            timestamps=np.full(vehicle_count, time.time())
+        )
+
+        # Analyze lane conditions using the optimizer
+        lane_metrics = self.optimizer.analyze_lane_conditions(batch)
+
+        # Bound the cache (insertion-ordered dict: evict oldest entry)
+        if len(self._metrics_cache) >= 256:
+            self._metrics_cache.pop(next(iter(self._metrics_cache)))
+        self._metrics_cache[key] = lane_metrics
+
+        return lane_metrics
+
+    def pre_infer(self, frame):
+        """Per-frame bookkeeping that runs before inference (timing, observation, cycle tracking)"""
+        # One timestamp per frame - every subsequent use in this call shares it
+        now = time.time()
+
+        # Analyze video frame first (on first frame)
+        if not self.frame_analyzed:
+            self.analyze_video_frame(frame)
+            if global_optimizer and self.observation_start_time is None:
+                self.observation_start_time = now
+                self.cycle_start_time = now  # Reset cycle timer
+                self.frame_count = 0
+                print(f"[Lane {self.lane_id}] Starting 30-second observation phase...")
+        
+        # Initialize lines if needed (legacy support)
+        if self.limit_lines is None:
+            self.initialize_lines(frame)
+        
+        # OBSERVATION PHASE: Track vehicle counts for first 30 seconds
+        if global_optimizer and global_optimizer.observation_enabled and self.observation_start_time:
+            self.observation_elapsed = now - self.observation_start_time
+            global_optimizer.update_observation_time(self.lane_id, self.observation_elapsed)
+        elif global_optimizer and not global_optimizer.observation_enabled and self.observation_start_time:
+            # Transition from observation to signal control
+            # Only happens once per lane
+            if self.lane_id == 0:  # Log once
+                print(f"[Lane {self.lane_id}] Observation complete! Starting signal control...")
+            # Reset timing for actual signal cycles
+            self.cycle_start_time = now
+            self.frame_count = 0
+            self.observation_start_time = None  # Mark transition as complete
+        
+        # Track elapsed time for signal control
+        self.frame_count += 1
+        elapsed_time = (self.frame_count / self.fps)
+        
+        # Update global optimizer with elapsed time for this lane
+        if global_optimizer:
+            # One optimizer call records elapsed time and returns the signal
+            # snapshot used for the rest of this frame
+            state, green = global_optimizer.step(self.lane_id, elapsed_time)
+            if global_optimizer.observation_enabled:
+                state = "OBSERVATION"
+            if state != self._signal_state:
+                self._signal_state_since = now
+            self._signal_state = state
+            self._green_time = green
+            
+            # Check if cycle should reset (after all phases complete)
+            total_cycle_time = sum(global_optimizer.current_cycle_timings) + (self.YELLOW_TIME * 4)
+            if elapsed_time >= total_cycle_time:
+                # Cycle complete - prepare next cycle with predicted timings
+                predicted_timings = global_optimizer.predict_next_cycle_timings({
+                    0: self.total_count // 30,  # Rough estimate based on cumulative count
+                    1: self.total_count // 30,
+                    2: self.total_count // 30,
+                    3: self.total_count // 30
+                })
+                # Only update once per feed (coordinator pattern)
+                if self.lane_id == 0:
+                    global_optimizer.set_cycle_timing(predicted_timings)
+                self.cycle_start_time = now
+                self.frame_count = 0
+
+    def has_motion(self, frame, threshold=2.0):
+        """
+        Cheap temporal-difference gate (NoScope-style): returns True when the
+        frame changed enough since the last one to justify running inference.
+        Works on an 80x60 grayscale downsample so the diff itself is ~free.
+        """
+        small = cv2.resize(frame, (80, 60), interpolation=cv2.INTER_NEAREST)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        prev = self._prev_gray
+        self._prev_gray = gray
+        if prev is None:
+            return True
+        return float(np.mean(cv2.absdiff(gray, prev))) >= threshold
+
+    def post_infer(self, results, frame):
+        """Consume YOLO results for this frame: track, count, draw overlays"""
+        if isinstance(results, np.ndarray):
+            # ONNX backend output: already an (N,5) [x1,y1,x2,y2,conf] array
+            detections = results.astype(np.float32, copy=False)
+        else:
+            # None means the motion gate skipped inference for this frame -
+            # the tracker still updates below (Kalman predict-only)
+            if results is None:
+                results = []
+            # Accept a single Results object (from the batched worker) or a list
+            elif not isinstance(results, (list, tuple)):
+                results = [results]
+
+            # Bulk tensor-to-NumPy conversion: one .cpu().numpy() per field
+            # instead of per-box scalar extraction (each int()/conf read forces
+            # a device sync through the tensor wrapper)
+            det_arrays = []
+            target_idx = self._target_class_indices
+
+            for r in results:
+                b = r.boxes
+                if b is None or len(b) == 0:
+                    continue
+                xyxy = b.xyxy.cpu().numpy()
+                confs = b.conf.cpu().numpy()
+                clss = b.cls.cpu().numpy().astype(np.int32)
+
+                keep = (confs > 0.3) & np.isin(clss, target_idx)
+                if keep.any():
+                    det_arrays.append(np.column_stack([xyxy[keep], confs[keep]]))
+                    self.recent_types.extend(
+                        self.vehicle_type_map.get(self.class_names[c], "car")
+                        for c in clss[keep] if c < len(self.class_names))
+
+            if det_arrays:
+                detections = np.concatenate(det_arrays).astype(np.float32)
+            else:
+                detections = np.empty((0, 5), dtype=np.float32)
+
+        tracked_objects = self.tracker.update(detections)
+        
+        # Count vehicles and record during observation phase
+        vehicle_count = len(tracked_objects)
+        if global_optimizer and global_optimizer.observation_enabled:
+            global_optimizer.record_observation_vehicle_count(self.lane_id, vehicle_count)
+
+        # Draw detection lines with proper styling
+        for limit in self.limit_lines:
+            # Primary line in teal color
+            cv2.line(frame, (limit[0], limit[1]), (limit[2], limit[3]),
+                     (250, 182, 122), 2)  # Orange: (B, G, R) = (122, 182, 250)
+            # Add line markers at ends
+            cv2.circle(frame, (limit[0], limit[1]), 4, (0, 255, 0), -1)
+            cv2.circle(frame, (limit[2], limit[3]), 4, (0, 255, 0), -1)
+
+        for result in tracked_objects:
+            x1, y1, x2, y2, id = result
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+            w, h = x2 - x1, y2 - y1
+
+            # Plain rectangle + label: cvzone's cornerRect/putTextRect issue
+            # 6+ cv2 calls per track, which dominates on crowded frames
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (111, 237, 235), 1)
+            cv2.putText(frame, f'#{int(id)}', (max(0, x1), max(25, y1) - 4),
+                        _FONT, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+
+            cx, cy = x1 + w // 2, y1 + h // 2
+            cv2.circle(frame, (cx, cy), 5, (22, 192, 240), cv2.FILLED)
+
+        # Detection-line hit test: one broadcast comparison over all
+        # (tracks x lines) pairs instead of a Python double loop
+        if len(tracked_objects) > 0 and self.limit_lines:
+            tracks = np.asarray(tracked_objects)
+            cxs = (tracks[:, 0].astype(np.int64) + tracks[:, 2].astype(np.int64)) // 2
+            cys = (tracks[:, 1].astype(np.int64) + tracks[:, 3].astype(np.int64)) // 2
+            lines = np.asarray(self.limit_lines)
+            mask = ((cxs[:, None] > lines[None, :, 0]) &
+                    (cxs[:, None] < lines[None, :, 2]) &
+                    (np.abs(cys[:, None] - lines[None, :, 1]) < 15))
+
+            for row in np.nonzero(mask.any(axis=1))[0]:
+                id_int = int(tracks[row, 4])
+                if id_int not in self.counted_ids:
+                    self.counted_ids.add(id_int)
+                    self.total_count += 1
+                    # Bound memory: SORT IDs grow monotonically, so old IDs
+                    # can never reappear once far behind the newest one
+                    if len(self.counted_ids) > 10000:
+                        self.counted_ids = {i for i in self.counted_ids
+                                            if i > id_int - 10000}
+                    # Flash the crossed line(s) for this newly counted vehicle
+                    for line_idx in np.nonzero(mask[row])[0]:
+                        limit = self.limit_lines[line_idx]
+                        cv2.line(frame, (limit[0], limit[1]), (limit[2], limit[3]),
+                                 (12, 202, 245), 3)
+
+        # Signal snapshot was taken by the optimizer step in pre_infer;
+        # fall back to the direct getters when no global optimizer exists
+        if global_optimizer:
+            signal_state = self._signal_state
+            green_time = self._green_time
+        else:
+            signal_state = self.get_signal_state()
+            green_time = self.get_green_time()
+
+        # Composite the cached signal-status panel: the text only changes on
+        # state/count/second boundaries, so render at most once per key and
+        # blit with a single slice assignment afterwards
+        if signal_state == "GREEN":
+            time_field = int(green_time)
+        elif signal_state == "OBSERVATION":
+            time_field = int(self.observation_elapsed or 0)
+        else:
+            time_field = 0
+
+        key = (signal_state, self.total_count, time_field)
+        panel = self._panel_cache.get(key)
+        if panel is None:
+            panel = self._render_signal_panel(signal_state, time_field)
+            if len(self._panel_cache) >= 128:
+                self._panel_cache.clear()
+            self._panel_cache[key] = panel
+        frame[20:20 + _PANEL_H, 20:20 + _PANEL_W] = panel
+
+        return frame, self.total_count, green_time, signal_state
+
+    def _render_signal_panel(self, signal_state, time_field):
+        """Render the signal-status panel for one (state, count, seconds) key"""
+        if signal_state == "OBSERVATION":
+            signal_color = (0, 165, 255)  # Orange for observation/analysis
+        else:
+            signal_color = (0, 255, 0) if signal_state == "GREEN" else (0, 255, 255) if signal_state == "YELLOW" else (0, 0, 255)
+
+        panel = np.empty((_PANEL_H, _PANEL_W, 3), dtype=np.uint8)
+        panel[:] = signal_color
+        cvzone.putTextRect(panel, f'Signal: {signal_state}', (10, 20),
+                           scale=1, thickness=2, offset=5,
+                           colorR=signal_color, colorT=(0, 0, 0))
+        cvzone.putTextRect(panel, f'Count: {self.total_count}', (10, 50),
+                           scale=1, thickness=2, offset=5,
+                           colorR=signal_color, colorT=(0, 0, 0))
+
+        if signal_state == "GREEN":
+            cvzone.putTextRect(panel, f'Green Time: {time_field}s', (10, 80),
+                               scale=1, thickness=2, offset=5,
+                               colorR=signal_color, colorT=(0, 0, 0))
+        elif signal_state == "OBSERVATION":
+            cvzone.putTextRect(panel, f'Analyzing: {time_field}s', (10, 80),
+                               scale=1, thickness=2, offset=5,
+                               colorR=signal_color, colorT=(0, 0, 0))
+        return panel
+
+    def process_frame(self, frame):
+        """Synchronous fallback path: run inference inline (no batching)"""
+        self.pre_infer(frame)
+        if self.has_motion(frame):
+            backend = get_onnx_backend()
+            if backend is not None:
+                results = backend.detect(frame)
+            else:
+                results = self.model.predict(frame, stream=False, verbose=False,
+                                             conf=0.3, classes=YOLO_CLASSES,
+                                             half=YOLO_HALF, device=YOLO_DEVICE)
+        else:
+            results = None
+        return self.post_infer(results, frame)
+
+# Create detector instances for each feed (lazy initialization)
+detectors = [None for _ in range(4)]
+
+def get_detector(feed_id):
+    """Lazy initialization of detector for specific feed"""
+    global detectors, global_optimizer
+    if detectors[feed_id] is None:
+        print(f"Initializing detector for feed {feed_id}...")
+        detector = VehicleDetector()
+        detector.lane_id = feed_id  # Set lane ID for phase-based signal management
+        detector.optimizer = global_optimizer  # Use shared optimizer
+        detectors[feed_id] = detector
+    return detectors[feed_id]
+
+def initialize_global_optimizer():
+    """Initialize the global optimizer for 4-way junction phase management"""
+    global global_optimizer
+    if global_optimizer is None:
+        print("Initializing global phase-based optimizer...")
+        global_optimizer = IntelligentTrafficOptimizer()
+    return global_optimizer
+
+# Global variables for video sources
+current_video_sources = [None, None, None, None]
+last_frame_time = [0] * 4  # Track frame timing for FPS limiting
+
+def compress_frame(frame, target_resolution=None, jpeg_quality=70, already_sized=False):
+    """
+    Compress frame for efficient streaming
+
+    Args:
+        frame: OpenCV frame
+        target_resolution: (width, height) tuple, defaults to VIDEO_QUALITY
+        jpeg_quality: JPEG quality 0-100
+        already_sized: skip the resize check when the caller resized the frame
+
+    Returns:
+        JPEG bytes
+    """
+    if not already_sized:
+        if target_resolution is None:
+            target_resolution = VIDEO_QUALITY['resolution']
+
+        height, width = frame.shape[:2]
+        if (width, height) != target_resolution:
+            frame = cv2.resize(frame, target_resolution, interpolation=cv2.INTER_LINEAR)
+
+    # Encode to JPEG (libjpeg-turbo when available, cv2 otherwise)
+    if SIMPLEJPEG_AVAILABLE:
+        return simplejpeg.encode_jpeg(np.ascontiguousarray(frame),
+                                      quality=jpeg_quality,
+                                      colorspace='BGR',
+                                      fastdct=True)
+    ret, buffer = cv2.imencode('.jpg', frame,
+                               [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality,
+                                cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+    if ret:
+        return buffer.tobytes()
+    return None
+
+# Pre-rendered demo-frame templates, one per feed (static text baked in once)
+_demo_base_frames = {}
+
+def get_demo_base(feed_id):
+    """Return the cached demo-frame template for a feed, rendering it once"""
+    base = _demo_base_frames.get(feed_id)
+    if base is None:
+        base = np.zeros((360, 480, 3), dtype=np.uint8)
+        cv2.putText(base, f"Demo Feed {feed_id+1}", (120, 150), _FONT, 1, (0, 255, 0), 2)
+        cv2.putText(base, "LIVE DEMO", (150, 250), _FONT, 0.7, (0, 255, 255), 2)
+        _demo_base_frames[feed_id] = base
+    return base
+
+def should_process_frame(feed_id, fps_limit=None, now=None):
+    """Check if enough time has passed to process next frame"""
+    if fps_limit is None:
+        fps_limit = VIDEO_QUALITY['fps_limit']
+    
+    current_time = time.time() if now is None else now
+    min_interval = 1.0 / fps_limit
+    
+    if current_time - last_frame_time[feed_id] >= min_interval:
+        last_frame_time[feed_id] = current_time
+        return True
+    return False
+
+def video_processing_thread(feed_id):
+    global current_video_sources
+
+    # Pin this feed thread to one core so the 4 feeds don't fight over the
+    # same OpenMP pools (Linux only; no-op elsewhere)
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {feed_id % (os.cpu_count() or 1)})
+        except OSError as e:
+            print(f"Could not set affinity for feed {feed_id}: {e}")
+
+    while True:
+        cap = None
+        
+        try:
+            # Map feed IDs to specific video files
+            video_files = {
+                0: "track-v-frontend-main/video/cam1.mp4",
+                1: "track-v-frontend-main/video/cam2.mp4",
+                2: "track-v-frontend-main/video/cam3.mp4",
+                3: "track-v-frontend-main/video/cam4.mp4"
+            }
+            
+            # Try loading the mapped video file
+            if feed_id in video_files:
+                video_path = video_files[feed_id]
+                try:
+                    cap = cv2.VideoCapture(video_path)
+                    if not cap.isOpened():
+                        print(f"Could not open video at {video_path}, trying fallback...")
+                        cap = None
+                    else:
+                        print(f"Loaded {video_path.split('/')[-1]} for feed {feed_id}")
+                except Exception as e:
+                    print(f"Error loading video for feed {feed_id}: {e}")
+                    cap = None
+            
+            # Try YouTube or uploaded video if source is set
+            elif current_video_sources[feed_id]:
+                source = current_video_sources[feed_id]
+                
+                # Check if it's a YouTube URL
+                if 'youtube.com' in source or 'youtu.be' in source:
+                    try:
+                        cap = YouTubeVideoHandler.get_video_stream(source)
+                        if cap and cap.isOpened():
+                            print(f"Loaded YouTube video for feed {feed_id}: {source}")
+                        else:
+                            cap = None
+                    except Exception as e:
+                        print(f"Error loading YouTube video for feed {feed_id}: {e}")
+                        cap = None
+                else:
+                    # Try as file path
+                    try:
+                        cap = VideoUploadHandler.get_video_stream(source)
+                        if cap and cap.isOpened():
+                            print(f"Loaded video file for feed {feed_id}: {source}")
+                        else:
+                            cap = None
+                    except Exception as e:
+                        print(f"Error loading video file for feed {feed_id}: {e}")
+                        cap = None
+            
+            # Fallback to camera or demo
+            if cap is None or not cap.isOpened():
+                try:
+                    # Try to use webcam
+                    cap = cv2.VideoCapture(feed_id if feed_id < 4 else 0)
+                    if cap.isOpened():
+                        print(f"Using camera for feed {feed_id}")
+                except Exception as e:
+                    print(f"Could not open camera for feed {feed_id}: {e}")
+                    cap = None
+            
+            # If no camera available, generate demo frames
+            if cap is None or not cap.isOpened():
+                print(f"Generating demo frames for feed {feed_id}")
+                base_frame = get_demo_base(feed_id)
+                frame_count = 0
+                while True:
+                    # Only the frame counter and rectangle move - static text
+                    # is baked into the cached template
+                    dummy_frame = base_frame.copy()
+                    cv2.putText(dummy_frame, f"Frame: {frame_count}", (150, 200), _FONT, 0.7, (255, 255, 255), 2)
+
+                    # Add some simple animation (moving rectangle)
+                    x_pos = int((frame_count % 100) * 4.8)
+                    cv2.rectangle(dummy_frame, (x_pos, 300), (x_pos + 30, 320), (255, 0, 0), -1)
+                    
+                    # Dummy frame is already at target resolution - no resize
+                    # needed; skip the encode entirely with no viewers
+                    if _feed_has_viewers(feed_id):
+                        frame_bytes = compress_frame(dummy_frame, already_sized=True)
+                        if frame_bytes:
+                            frame_slots[feed_id].put(frame_bytes)
+                    
+                    frame_count += 1
+                    time.sleep(0.1)  # 10 FPS for demo
+                    
+                    # Simple break condition
+                    if frame_count > 1000000:
+                        frame_count = 0
+            
+            # Set buffer size to prevent lag
+            if cap:
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            while True:
+                if cap is None or not cap.isOpened():
+                    break
+                    
+                # Limit FPS to reduce bandwidth. Frames the limiter drops are
+                # advanced with grab() only - that skips the expensive decode
+                # (retrieve) half of cap.read() for frames nobody will see
+                if not should_process_frame(feed_id):
+                    if not cap.grab():
+                        if hasattr(cap, 'set'):
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop video
+                        break
+                    continue
+
+                success, frame = cap.read()
+                if not success:
+                    if hasattr(cap, 'set'):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop video
+                    break
+
+                # Resize and compress for transmission
+                frame = cv2.resize(frame, VIDEO_QUALITY['resolution'], interpolation=cv2.INTER_LINEAR)
+                
+                try:
+                    detector = get_detector(feed_id)
+                    ensure_inference_worker()
+                    # Pre-inference bookkeeping runs in this thread; the forward
+                    # pass is batched with the other feeds in the central worker
+                    detector.pre_infer(frame)
+                    if detector.has_motion(frame):
+                        inference_in_queue.put((feed_id, frame), timeout=2)
+                        results = detections_queues[feed_id].get(timeout=5)
+                    else:
+                        # No meaningful change since last frame - skip the
+                        # network and let the tracker coast on predictions
+                        results = None
+                    processed_frame, count, green_time, signal_state = detector.post_infer(results, frame)
+                except (queue.Full, queue.Empty):
+                    # Inference worker backed up - fall back to inline processing
+                    processed_frame, count, green_time, signal_state = detector.process_frame(frame)
+                except IndexError as e:
+                    import traceback
+                    print(f"IndexError in detector for feed {feed_id}: {e}")
+                    traceback.print_exc()
+                    # Use unprocessed frame as fallback
+                    processed_frame = frame
+                    count = 0
+                    green_time = 30
+                    signal_state = "GREEN"
+                except Exception as e:
+                    print(f"Error processing frame in detector for feed {feed_id}: {e}")
+                    # Use unprocessed frame as fallback
+                    processed_frame = frame
+                    count = 0
+                    green_time = 30
+                    signal_state = "GREEN"
+                
+                # Update global optimizer phases to rotate traffic signals properly
+                # (gated to every 5th frame - phase transitions are sub-second-rate)
+                if detector.frame_count % 5 == 0:
+                    try:
+                        global_optimizer.update_phase({})
+                    except Exception as e:
+                        pass  # Silent fail for phase update
+
+                data = {
+                    "count": count,
+                    "green_time": green_time,
+                    "signal_state": signal_state
+                }
+
+                data_slots[feed_id].put(data)
+
+                # Push a diff to WebSocket subscribers only when the signal
+                # actually changed - polling clients keep the REST endpoints
+                state_changed = signal_state != _last_broadcast_states[feed_id]
+                if state_changed:
+                    _last_broadcast_states[feed_id] = signal_state
+                    broadcast_signal_state({
+                        "lane_id": feed_id,
+                        "lane_name": LANE_NAMES[feed_id],
+                        "signal_state": signal_state,
+                        "green_time": green_time,
+                        "count": count,
+                        "timestamp": time.time()
+                    })
+
+                # Mirror lane state to Redis (when configured) so sibling
+                # gunicorn workers serve consistent junction state. Gated to
+                # transitions plus every 5th frame to bound the write rate.
+                if state_changed or detector.frame_count % 5 == 0:
+                    r = get_redis()
+                    if r is not None:
+                        try:
+                            r.hset('junction:state', str(feed_id),
+                                   json.dumps(data))
+                        except Exception:
+                            pass  # Redis down - local slots still serve
+
+                # Compress frame for streaming (frame was resized once above),
+                # but only when some client can actually receive it
+                if _feed_has_viewers(feed_id):
+                    frame_bytes = compress_frame(processed_frame,
+                                                 jpeg_quality=VIDEO_QUALITY['jpeg_quality'],
+                                                 already_sized=True)
+                    if frame_bytes:
+                        frame_slots[feed_id].put(frame_bytes)
+        
+        except Exception as e:
+            print(f"Error in video processing thread {feed_id}: {e}")
+            time.sleep(1)
+            continue
+        finally:
+            if cap:
+                cap.release()
+
+@app.route('/')
+def index():
+    """Root endpoint for quick health check"""
+    try:
+        return jsonify({
+            "message": "Traffic Monitor Backend API", 
+            "status": "running",
+            "port": os.environ.get("PORT", 5000),
+            "threads_active": threading.active_count(),
+            "environment": "production" if os.environ.get("RENDER") else "development"
+        })
+    except Exception as e:
+        return jsonify({
+            "message": "Traffic Monitor Backend API",
+            "status": "error",
+            "error": str(e)
+        }), 500
+
+@app.route('/health')
+def health_check():
+    """Detailed health check with thread and queue status"""
+    queue_sizes = [1 if frame_slots[i].peek() is not None else 0 for i in range(4)]
+    return jsonify({
+        "status": "healthy",
+        "timestamp": time.time(),
+        "threads_active": threading.active_count(),
+        "frame_queue_sizes": queue_sizes,
+        "detectors_initialized": [detectors[i] is not None for i in range(4)],
+        "upload_folder": UPLOAD_FOLDER,
+        "max_file_size": "500MB"
+    })
+
+def generate_frames(feed_id):
+    with _stream_clients_lock:
+        _stream_clients[feed_id] += 1
+    try:
+        while True:
+            frame_bytes = frame_slots[feed_id].get(timeout=1)
+            if frame_bytes is None:
+                # No fresh frame within a second (model warm-up, source
+                # rebuffering). Keep the connection alive by re-yielding
+                # the last frame - <img> MJPEG clients don't reconnect on
+                # their own, so breaking here froze the feed for good.
+                # Under gevent the wait is cooperative, so holding the
+                # greenlet open costs nothing.
+                frame_bytes = frame_slots[feed_id].peek()
+                if frame_bytes is None:
+                    # Nothing produced yet at all - keep waiting
+                    continue
+            # Yield the static boundary bytes separately - WSGI chains the
+            # chunks without concatenating/reallocating per frame
+            yield _MJPEG_HEAD
+            yield frame_bytes
+            yield _MJPEG_TAIL
+    finally:
+        with _stream_clients_lock:
+            _stream_clients[feed_id] -= 1
+
+@app.route('/video_feed/<int:feed_id>')
+def video_feed(feed_id):
+    if 0 <= feed_id < 4:
+        return Response(generate_frames(feed_id),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    return "Invalid feed ID", 404
+
+@app.route('/get_data/<int:feed_id>')
+def get_data(feed_id):
+    """Get real-time traffic data for a specific lane"""
+    if 0 <= feed_id < 4:
+        # Initialize global optimizer if needed
+        initialize_global_optimizer()
+
+        data = data_slots[feed_id].peek()
+        if data is None:
+            # No local data - this worker may not own the video threads, so
+            # try the shared Redis mirror before falling back to the warm-up
+            # response
+            r = get_redis()
+            if r is not None:
+                try:
+                    raw = r.hget('junction:state', str(feed_id))
+                    if raw:
+                        data = json.loads(raw)
+                except Exception:
+                    data = None
+        if data is None:
+            # No data produced yet - serve the pre-serialized warm-up response
+            return Response(_EMPTY_RESPONSES[feed_id],
+                            mimetype='application/json')
+
+        data = dict(data)  # peek returns the shared dict - don't mutate the slot
+
+        # Get detector for next green time calculation
+        detector = get_detector(feed_id)
+        next_green_time = detector.get_next_green_time()
+        
+        # Check observation phase status
+        observation_status = None
+        if global_optimizer:
+            if global_optimizer.observation_enabled:
+                obs_info = global_optimizer.get_observation_status()
+                lane_obs = obs_info.get(f'lane_{feed_id}', {})
+                observation_status = {
+                    'in_progress': not lane_obs.get('ready', False),
+                    'time_elapsed': lane_obs.get('time', 0),
+                    'max_vehicles': lane_obs.get('max_vehicles', 0)
+                }
+                # During observation, show vehicles but not final signal control yet
+                data['signal_state'] = 'OBSERVATION'
+                data['green_time'] = 0
+                next_green_time = 0
+            else:
+                # Check if observation just completed
+                if feed_id == 0:  # Only log once
+                    pass
+        
+        # Add phase information from global optimizer
+        lane_phase = LANE_PHASE[feed_id]
+        
+        response_data = {
+            **data,
+            "lane_id": feed_id,
+            "lane_name": LANE_NAMES[feed_id],
+            "current_phase": lane_phase,
+            "next_green_time": next_green_time,
+            "observation": observation_status,
+            "phase_info": "Analyzing traffic..." if data["signal_state"] == "OBSERVATION" else ("Opposite lanes GREEN" if data["signal_state"] == "RED" else "This lane GREEN")
+        }
+        
+        return ojson(response_data)
+    return jsonify({"error": "Invalid feed ID"}), 404
+
+@app.route('/set_video_source', methods=['POST'])
+def set_video_source():
+    global current_video_sources
+    
+    data = request.get_json()
+    sources = data.get('sources', [])
+    
+    current_video_sources = sources + [None] * (4 - len(sources))
+    
+    return jsonify({"message": "Video sources updated", "sources": current_video_sources})
+
+@app.route('/set_youtube_feed', methods=['POST'])
+def set_youtube_feed():
+    """Set a YouTube video URL for a specific feed"""
+    global current_video_sources
+    
+    data = request.get_json()
+    feed_id = data.get('feed_id', 0)
+    youtube_url = data.get('url', '')
+    
+    if not youtube_url:
+        return jsonify({"error": "YouTube URL required"}), 400
+    
+    if not (0 <= feed_id < 4):
+        return jsonify({"error": "Invalid feed ID"}), 400
+    
+    try:
+        # Validate it's a YouTube URL
+        if 'youtube.com' not in youtube_url and 'youtu.be' not in youtube_url:
+            return jsonify({"error": "Invalid YouTube URL"}), 400
+        
+        current_video_sources[feed_id] = youtube_url
+        
+        return jsonify({
+            "message": f"YouTube video set for feed {feed_id}",
+            "feed_id": feed_id,
+            "url": youtube_url,
+            "status": "active"
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/upload_video', methods=['POST'])
+def upload_video():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+    
+    file = request.files['file']
+    feed_id = request.form.get('feed_id', '0')
+    
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    try:
+        feed_id = int(feed_id)
+        if not (0 <= feed_id < 4):
+            return jsonify({"error": "Invalid feed ID"}), 400
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid feed ID"}), 400
+    
+    if file and allowed_file(file.filename):
+        # Save the uploaded file
+        file_path = VideoUploadHandler.save_uploaded_file(file)
+        
+        if file_path:
+            # Update video source
+            global current_video_sources
+            current_video_sources[feed_id] = file_path
+            
+            return jsonify({
+                "message": "Video uploaded successfully",
+                "feed_id": feed_id,
+                "file_path": file_path,
+                "status": "active"
+            })
+        else:
+            return jsonify({"error": "Failed to save file"}), 500
+    else:
+        return jsonify({"error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+
+@app.route('/get_all_signal_states')
+def get_all_signal_states():
+    """Get signal state for all 4 lanes (4-way junction phase control)"""
+    global global_optimizer
+    
+    # Initialize optimizer if needed
+    initialize_global_optimizer()
+    
+    # Collect lane metrics from all detectors. The per-lane reads are plain
+    # in-memory slot loads, so they stay sequential/sync; if lane state ever
+    # moves behind real I/O (Redis, DB), overlap the 4 reads instead of
+    # serializing them. Derived quantities are computed for all 4 lanes in
+    # one vectorized pass; only the LaneMetrics boxing stays per-lane
+    for lane_id in range(4):
+        get_detector(lane_id)
+    counts = np.fromiter(
+        ((data_slots[i].peek() or {}).get("count", 0) for i in range(4)),
+        dtype=np.int32, count=4)
+
+    # Classify all lanes and read the whole junction's signal states with
+    # the batched optimizer API - one vectorized pass instead of four
+    # per-lane state dict constructions
+    global_optimizer.analyze_all_lanes(counts)
+    signal_states = global_optimizer.get_signal_states()
+
+    # Format response with lane information. One comprehension instead of
+    # repeated response["lanes"][lane_id] subscript chains
+    response = {
+        "timestamp": time.time(),
+        "current_phase": global_optimizer.current_phase,
+        "lanes": {
+            lane_id: {
+                "lane_name": LANE_NAMES[lane_id],
+                "signal_state": signal_states[lane_id],
+                "remaining_green_time": global_optimizer.get_green_time(lane_id),
+                "phase": LANE_PHASE[lane_id],
+                "vehicle_count": int(counts[lane_id])
+            }
+            for lane_id in range(4)
+        }
+    }
+
+    return ojson(response)
+
+@app.route('/get_bottleneck_analysis/<int:feed_id>')
+def get_bottleneck_analysis(feed_id):
+    """Get detailed bottleneck analysis for a specific feed"""
+    if 0 <= feed_id < 4:
+        detector = detectors[feed_id]
+
+        # Get current bottleneck strategies
+        strategies = detector.bottleneck_strategies.copy()
+
+        # Conditions change on a tens-of-seconds timescale while dashboards
+        # poll every few seconds - a cheap hash of the inputs lets unchanged
+        # states short-circuit to 304 with zero serialization
+        etag = hashlib.blake2b(
+            f"{detector._signal_state}{detector._green_time}"
+            f"{detector.total_count}{len(strategies)}".encode(),
+            digest_size=8).hexdigest()
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304
+
+        # Build the payload from the same per-frame snapshot the ETag
+        # hashes (_signal_state/_green_time) so the two always agree
+        analysis = {
+            "feed_id": feed_id,
+            "current_strategies": strategies,
+            "traffic_intensity": detector.total_count,
+            "signal_optimization": {
+                "current_green_time": detector._green_time,
+                "signal_state": detector._signal_state,
+                "vehicles_in_queue": len(detector.vehicles_data),
+                "optimization_active": bool(strategies)
+            },
+            "bottleneck_alerts": []
+        }
+
+        # Generate bottleneck alerts
+        if detector.total_count > 20:
+            analysis["bottleneck_alerts"].append({
+                "type": "HIGH_CONGESTION",
+                "severity": "HIGH",
+                "message": f"High vehicle density detected: {detector.total_count} vehicles"
+            })
+
+        if detector._signal_state == "RED" and (time.time() - detector._signal_state_since) > 60:
+            analysis["bottleneck_alerts"].append({
+                "type": "LONG_RED_CYCLE", 
+                "severity": "MEDIUM",
+                "message": "Extended red light may cause spillback"
+            })
+
+        resp = jsonify(analysis)
+        resp.headers['ETag'] = etag
+        return resp
+
+    return jsonify({"error": "Invalid feed ID"}), 404
+
+@app.route('/optimize_signal/<int:feed_id>', methods=['POST'])
+def optimize_signal(feed_id):
+    """Manually trigger signal optimization for a specific feed"""
+    if 0 <= feed_id < 4:
+        detector = detectors[feed_id]
+        
+        # Force optimization
+        vehicle_types = list(detector.recent_types)
+        new_green_time = detector.calculate_green_time(detector.total_count, vehicle_types)
+        
+        # Apply optimization
+        detector.current_green_time = new_green_time
+        detector.signal_start_time = time.time()
+        
+        return jsonify({
+            "message": f"Signal optimized for feed {feed_id}",
+            "new_green_time": new_green_time,
+            "vehicles_detected": detector.total_count,
+            "optimization_applied": True
+        })
+    
+    return jsonify({"error": "Invalid feed ID"}), 404
+
+# ==== NEW API ENDPOINTS FOR FRONTEND ====
+
+@app.route('/api/health')
+def api_health():
+    """Health check for frontend"""
+    return jsonify({"status": "ok", "message": "Backend is running"}), 200
+
+@app.route('/api/video/start', methods=['POST'])
+def api_start_video():
+    """Start video processing"""
+    return jsonify({"status": "started", "message": "Video processing started"}), 200
+
+@app.route('/api/video/stop', methods=['POST'])
+def api_stop_video():
+    """Stop video processing"""
+    return jsonify({"status": "stopped", "message": "Video processing stopped"}), 200
+
+@app.route('/api/video/frame')
+def api_video_frame():
+    """Get single frame from feed 0 (CAM1) as raw JPEG bytes"""
+    frame_bytes = frame_slots[0].peek()
+    if frame_bytes is None:
+        # Serve the pre-encoded dummy frame if no frame has been produced yet
+        frame_bytes = _DUMMY_JPEG
+    return Response(frame_bytes, mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
+
+@app.route('/api/video/stream')
+def api_video_stream():
+    """MJPEG stream of feed 0 - one connection instead of per-frame polling"""
+    return Response(generate_frames(0),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/traffic/data')
+def api_traffic_data():
+    """Get traffic data for feed 0 (CAM1)"""
+    data = data_slots[0].peek()
+    if data is not None:
+        return ojson({
+            "vehicle_counts": [data.get("count", 0), 0, 0, 0],
+            "signal_state": data.get("signal_state", "GREEN"),
+            "green_time": data.get("green_time", 30),
+            "status": "ok"
+        })
+    else:
+        return ojson({
+            "vehicle_counts": [0, 0, 0, 0],
+            "signal_state": "GREEN",
+            "green_time": 30,
+            "status": "ok"
+        })
+
+# Resolved YouTube stream URLs: url -> (expiry_ts, direct_url). Signed URLs
+# stay valid for hours, so camera reconnects reuse them instead of paying the
+# yt-dlp extraction round-trip again
+_YT_CACHE = {}
+_YT_CACHE_LOCK = threading.Lock()
+_YT_DEFAULT_TTL = 5 * 3600  # Typical YouTube signature lifetime
+
+# yt-dlp is slow to import, so load it once on first use instead of at app
+# startup - but never re-run the import machinery inside the handler
+_YTDLP = None
+
+def _get_ytdlp():
+    global _YTDLP
+    if _YTDLP is None:
+        import yt_dlp
+        _YTDLP = yt_dlp
+    return _YTDLP
+
+# Simple Video Handler Classes
+class YouTubeVideoHandler:
+    """Handle YouTube video streaming"""
+
+    @staticmethod
+    def get_video_stream(youtube_url, resolution='480p'):
+        """
+        Get video stream from YouTube URL using yt-dlp
+
+        Resolved direct URLs are cached until ~5 minutes before their signed
+        expiry, so reopening the same URL (camera reconnect, thread restart)
+        skips the yt-dlp network round-trip.
+
+        Args:
+            youtube_url: YouTube URL
+            resolution: Desired resolution (default 480p)
+
+        Returns:
+            cv2.VideoCapture object or None
+        """
+        try:
+            with _YT_CACHE_LOCK:
+                cached = _YT_CACHE.get(youtube_url)
+            if cached and time.time() < cached[0] - 300:
+                cap = cv2.VideoCapture(cached[1])
+                if cap.isOpened():
+                    return cap
+                # Stale/revoked URL - drop it and re-extract below
+                with _YT_CACHE_LOCK:
+                    _YT_CACHE.pop(youtube_url, None)
+
+            # Use yt-dlp to get the best format
+            yt_dlp = _get_ytdlp()
+
+            ydl_opts = {
+                'format': 'best[height<=480]/best',
+                'quiet': True,
+                'no_warnings': True,
+            }
+
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(youtube_url, download=False)
+                video_url = info['url']
+
+            # The signed URL carries its expiry in the expire= query param
+            expire_match = re.search(r'[?&]expire=(\d+)', video_url)
+            if expire_match:
+                expiry_ts = int(expire_match.group(1))
+            else:
+                expiry_ts = time.time() + _YT_DEFAULT_TTL
+            with _YT_CACHE_LOCK:
+                _YT_CACHE[youtube_url] = (expiry_ts, video_url)
+
+            cap = cv2.VideoCapture(video_url)
+            if cap.isOpened():
+                return cap
+            return None
+
+        except Exception as e:
+            print(f"Error getting YouTube stream: {e}")
+            return None
+
+
+class VideoUploadHandler:
+    """Handle uploaded video files"""
+    
+    @staticmethod
+    def is_allowed_file(filename):
+        """Check if file extension is allowed"""
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    
+    @staticmethod
+    def save_uploaded_file(file):
+        """Save uploaded file to disk"""
+        try:
+            if file and VideoUploadHandler.is_allowed_file(file.filename):
+                filename = secure_filename(file.filename)
+                # Add timestamp to avoid conflicts
+                filename = f"{int(time.time())}_{filename}"
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                # Stream to disk in 4 MB chunks: Werkzeug's file.save copies
+                # in 16 KB pieces, which is ~256x more syscall pairs for a
+                # large video upload
+                with open(filepath, 'wb', buffering=0) as out:
+                    shutil.copyfileobj(file.stream, out, length=4 * 1024 * 1024)
+                return filepath
+        except Exception as e:
+            print(f"Error saving file: {e}")
+        return None
+    
+    @staticmethod
+    def get_video_stream(filepath):
+        """Get video stream from file"""
+        try:
+            if os.path.exists(filepath):
+                cap = cv2.VideoCapture(filepath)
+                if cap.isOpened():
+                    return cap
+        except Exception as e:
+            print(f"Error opening video file: {e}")
+        return None
+
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+if __name__ == '__main__':
+    # Initialize global optimizer for 4-way junction phase management
+    initialize_global_optimizer()
+    
+    # Start video processing threads for each feed AFTER Flask starts
+    # This allows the health check endpoint to respond immediately
+    import atexit
+    
+    def start_video_threads():
+        """Start video threads after a short delay"""
+        time.sleep(1)
+        for i in range(4):
+            threading.Thread(target=video_processing_thread, args=(i,), daemon=True).start()
+        print("Video processing threads started")
+    
+    # Start threads in background after Flask boots
+    threading.Thread(target=start_video_threads, daemon=True).start()
+
+    # Render deployment configuration
+    port = int(os.environ.get("PORT", 5000))
+    # Force debug OFF for faster startup
+    debug_mode = False  # os.environ.get("FLASK_ENV") != "production"
+    
+    app.run(host='0.0.0.0', port=port, debug=debug_mode, threaded=True, use_reloader=False)
+
+# Initialize video threads for production deployment (Render/Heroku)
+def initialize_threads():
+    """Initialize video processing threads for production"""
+    try:
+        print("Starting video processing threads...")
+        # Initialize global optimizer first
+        initialize_global_optimizer()
+        
+        for i in range(4):
+            thread = threading.Thread(target=video_processing_thread, args=(i,), daemon=True)
+            thread.start()
+            print(f"Started thread for camera {i+1}")
+        print("All video threads started successfully")
+        print("4-way junction phase-based signal control ACTIVE")
+    except Exception as e:
+        print(f"Error starting threads: {e}")
+        # Continue without threads for basic API functionality
+
+# Start threads when module is imported (for gunicorn)
+# Disabled automatic thread startup to allow faster app initialization
+# Threads will start on first video request
+try:
+    print("Flask app module loaded successfully")
+    print(f"Environment: {'production' if os.environ.get('RENDER') else 'development'}")
+    print(f"Port: {os.environ.get('PORT', 5000)}")
+    print("Signal Control: 4-Way Junction Phase-Based Management")
+except Exception as e:
+    print(f"Error in production initialization: {e}")
+
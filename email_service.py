@@ -1,275 +1,383 @@
-"""
-Email Alert Service for Track-V Traffic Management System
-Handles sending email notifications to junction inspectors
-"""
-
-import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
-from datetime import datetime
-from typing import Optional, Dict
-import threading
-
-
-class EmailAlertService:
-    """
-    Email service for sending traffic alerts to inspectors
-    Uses SMTP (Gmail, Outlook, or custom SMTP server)
-    """
-    
-    def __init__(self):
-        # Email configuration from environment variables
-        self.smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        self.sender_email = os.environ.get('SMTP_EMAIL')
-        self.sender_password = os.environ.get('SMTP_PASSWORD')  # App password for Gmail
-        self.sender_name = os.environ.get('SMTP_SENDER_NAME', 'Track-V Traffic System')
-        
-        self.is_configured = all([self.sender_email, self.sender_password])
-        
-        if not self.is_configured:
-            print("Warning: Email service not configured. Set SMTP_EMAIL and SMTP_PASSWORD")
-    
-    def send_alert_email(self, 
-                         to_email: str, 
-                         inspector_name: str,
-                         junction_name: str,
-                         alert_data: Dict) -> bool:
-        """
-        Send traffic alert email to inspector
-        
-        Args:
-            to_email: Inspector's email address
-            inspector_name: Inspector's name
-            junction_name: Name of the junction
-            alert_data: Alert details (type, severity, title, description, camera_index)
-            
-        Returns:
-            True if email sent successfully
-        """
-        if not self.is_configured:
-            print(f"Email not configured. Would send to: {to_email}")
-            return False
-        
-        try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"🚨 Traffic Alert - {junction_name} - {alert_data.get('severity', 'medium').upper()}"
-            msg['From'] = f"{self.sender_name} <{self.sender_email}>"
-            msg['To'] = to_email
-            
-            # Alert details
-            alert_type = alert_data.get('type', 'manual')
-            severity = alert_data.get('severity', 'medium')
-            title = alert_data.get('title', 'Traffic Alert')
-            description = alert_data.get('description', 'No additional details provided.')
-            camera_index = alert_data.get('camera_index', 'N/A')
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Severity colors
-            severity_colors = {
-                'low': '#28a745',      # Green
-                'medium': '#ffc107',   # Yellow
-                'high': '#fd7e14',     # Orange
-                'critical': '#dc3545'  # Red
-            }
-            severity_color = severity_colors.get(severity, '#6c757d')
-            
-            # HTML email template
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
-                    .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; }}
-                    .header h1 {{ margin: 0; font-size: 24px; }}
-                    .alert-badge {{ display: inline-block; background: {severity_color}; color: white; padding: 5px 15px; border-radius: 20px; font-weight: bold; margin-top: 10px; text-transform: uppercase; }}
-                    .content {{ padding: 30px; }}
-                    .info-box {{ background: #f8f9fa; border-left: 4px solid {severity_color}; padding: 15px; margin: 20px 0; border-radius: 0 5px 5px 0; }}
-                    .info-row {{ display: flex; margin: 10px 0; }}
-                    .info-label {{ font-weight: bold; color: #666; width: 120px; }}
-                    .info-value {{ color: #333; }}
-                    .description {{ background: #fff3cd; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                    .footer {{ background: #f8f9fa; padding: 20px; text-align: center; color: #666; font-size: 12px; }}
-                    .btn {{ display: inline-block; background: #667eea; color: white; padding: 12px 30px; border-radius: 5px; text-decoration: none; margin-top: 20px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>🚦 Track-V Traffic Alert</h1>
-                        <div class="alert-badge">{severity} Severity</div>
-                    </div>
-                    <div class="content">
-                        <p>Dear <strong>{inspector_name}</strong>,</p>
-                        <p>A traffic alert has been generated for your assigned junction.</p>
-                        
-                        <div class="info-box">
-                            <div class="info-row">
-                                <span class="info-label">Junction:</span>
-                                <span class="info-value">{junction_name}</span>
-                            </div>
-                            <div class="info-row">
-                                <span class="info-label">Camera:</span>
-                                <span class="info-value">Camera {camera_index}</span>
-                            </div>
-                            <div class="info-row">
-                                <span class="info-label">Alert Type:</span>
-                                <span class="info-value">{alert_type.replace('_', ' ').title()}</span>
-                            </div>
-                            <div class="info-row">
-                                <span class="info-label">Time:</span>
-                                <span class="info-value">{timestamp}</span>
-                            </div>
-                        </div>
-                        
-                        <h3>{title}</h3>
-                        <div class="description">
-                            <p>{description}</p>
-                        </div>
-                        
-                        <p>Please take appropriate action as needed.</p>
-                        
-                        <center>
-                            <a href="#" class="btn">View Dashboard</a>
-                        </center>
-                    </div>
-                    <div class="footer">
-                        <p>This is an automated message from Track-V Traffic Management System.</p>
-                        <p>© 2026 Track-V. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Plain text version
-            text_body = f"""
-            Track-V Traffic Alert
-            =====================
-            
-            Dear {inspector_name},
-            
-            A traffic alert has been generated for your assigned junction.
-            
-            Details:
-            - Junction: {junction_name}
-            - Camera: Camera {camera_index}
-            - Alert Type: {alert_type.replace('_', ' ').title()}
-            - Severity: {severity.upper()}
-            - Time: {timestamp}
-            
-            Title: {title}
-            
-            Description: {description}
-            
-            Please take appropriate action as needed.
-            
-            --
-            Track-V Traffic Management System
-            """
-            
-            # Attach parts
-            msg.attach(MIMEText(text_body, 'plain'))
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
-            
-            print(f"Alert email sent to {to_email}")
-            return True
-            
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return False
-    
-    def send_alert_async(self, to_email: str, inspector_name: str,
-                        junction_name: str, alert_data: Dict) -> None:
-        """Send alert email in background thread"""
-        thread = threading.Thread(
-            target=self.send_alert_email,
-            args=(to_email, inspector_name, junction_name, alert_data)
-        )
-        thread.daemon = True
-        thread.start()
-    
-    def send_daily_report(self, to_email: str, inspector_name: str,
-                         junction_name: str, report_data: Dict) -> bool:
-        """Send daily traffic report email"""
-        if not self.is_configured:
-            return False
-            
-        try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"📊 Daily Traffic Report - {junction_name} - {datetime.now().strftime('%Y-%m-%d')}"
-            msg['From'] = f"{self.sender_name} <{self.sender_email}>"
-            msg['To'] = to_email
-            
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 10px; overflow: hidden; }}
-                    .header {{ background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); color: white; padding: 30px; text-align: center; }}
-                    .content {{ padding: 30px; }}
-                    .stat-box {{ display: inline-block; background: #f8f9fa; padding: 20px; margin: 10px; border-radius: 10px; text-align: center; min-width: 120px; }}
-                    .stat-number {{ font-size: 32px; font-weight: bold; color: #667eea; }}
-                    .stat-label {{ color: #666; font-size: 14px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>📊 Daily Traffic Report</h1>
-                        <p>{junction_name}</p>
-                    </div>
-                    <div class="content">
-                        <p>Dear {inspector_name},</p>
-                        <p>Here is your daily traffic summary:</p>
-                        
-                        <center>
-                            <div class="stat-box">
-                                <div class="stat-number">{report_data.get('total_vehicles', 0)}</div>
-                                <div class="stat-label">Total Vehicles</div>
-                            </div>
-                            <div class="stat-box">
-                                <div class="stat-number">{report_data.get('peak_hour', 'N/A')}</div>
-                                <div class="stat-label">Peak Hour</div>
-                            </div>
-                            <div class="stat-box">
-                                <div class="stat-number">{report_data.get('avg_congestion', 'Low')}</div>
-                                <div class="stat-label">Avg Congestion</div>
-                            </div>
-                        </center>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error sending report email: {e}")
-            return False
-
-
-# Global email service instance
-email_service = EmailAlertService()
+"""
+Email Alert Service for Track-V Traffic Management System
+Handles sending email notifications to junction inspectors
+"""
+
+import atexit
+import os
+import queue
+import smtplib
+import string
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.image import MIMEImage
+from datetime import datetime
+from typing import Optional, Dict
+import threading
+
+
+# Severity badge colors - shared by every alert email
+SEVERITY_COLORS = {
+    'low': '#28a745',      # Green
+    'medium': '#ffc107',   # Yellow
+    'high': '#fd7e14',     # Orange
+    'critical': '#dc3545'  # Red
+}
+
+# Email bodies are ~99% constant markup, so they are compiled once at import
+# as string.Template objects; each send is then a single substitute() call
+# instead of rebuilding a multi-KB f-string
+_ALERT_HTML_TMPL = string.Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body { font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }
+        .container { max-width: 600px; margin: 0 auto; background: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
+        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; }
+        .header h1 { margin: 0; font-size: 24px; }
+        .alert-badge { display: inline-block; background: $severity_color; color: white; padding: 5px 15px; border-radius: 20px; font-weight: bold; margin-top: 10px; text-transform: uppercase; }
+        .content { padding: 30px; }
+        .info-box { background: #f8f9fa; border-left: 4px solid $severity_color; padding: 15px; margin: 20px 0; border-radius: 0 5px 5px 0; }
+        .info-row { display: flex; margin: 10px 0; }
+        .info-label { font-weight: bold; color: #666; width: 120px; }
+        .info-value { color: #333; }
+        .description { background: #fff3cd; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        .footer { background: #f8f9fa; padding: 20px; text-align: center; color: #666; font-size: 12px; }
+        .btn { display: inline-block; background: #667eea; color: white; padding: 12px 30px; border-radius: 5px; text-decoration: none; margin-top: 20px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🚦 Track-V Traffic Alert</h1>
+            <div class="alert-badge">$severity Severity</div>
+        </div>
+        <div class="content">
+            <p>Dear <strong>$inspector_name</strong>,</p>
+            <p>A traffic alert has been generated for your assigned junction.</p>
+
+            <div class="info-box">
+                <div class="info-row">
+                    <span class="info-label">Junction:</span>
+                    <span class="info-value">$junction_name</span>
+                </div>
+                <div class="info-row">
+                    <span class="info-label">Camera:</span>
+                    <span class="info-value">Camera $camera_index</span>
+                </div>
+                <div class="info-row">
+                    <span class="info-label">Alert Type:</span>
+                    <span class="info-value">$alert_type</span>
+                </div>
+                <div class="info-row">
+                    <span class="info-label">Time:</span>
+                    <span class="info-value">$timestamp</span>
+                </div>
+            </div>
+
+            <h3>$title</h3>
+            <div class="description">
+                <p>$description</p>
+            </div>
+
+            <p>Please take appropriate action as needed.</p>
+
+            <center>
+                <a href="#" class="btn">View Dashboard</a>
+            </center>
+        </div>
+        <div class="footer">
+            <p>This is an automated message from Track-V Traffic Management System.</p>
+            <p>© 2026 Track-V. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+_ALERT_TEXT_TMPL = string.Template("""
+Track-V Traffic Alert
+=====================
+
+Dear $inspector_name,
+
+A traffic alert has been generated for your assigned junction.
+
+Details:
+- Junction: $junction_name
+- Camera: Camera $camera_index
+- Alert Type: $alert_type
+- Severity: $severity_upper
+- Time: $timestamp
+
+Title: $title
+
+Description: $description
+
+Please take appropriate action as needed.
+
+--
+Track-V Traffic Management System
+""")
+
+_REPORT_HTML_TMPL = string.Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }
+        .container { max-width: 600px; margin: 0 auto; background: white; border-radius: 10px; overflow: hidden; }
+        .header { background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); color: white; padding: 30px; text-align: center; }
+        .content { padding: 30px; }
+        .stat-box { display: inline-block; background: #f8f9fa; padding: 20px; margin: 10px; border-radius: 10px; text-align: center; min-width: 120px; }
+        .stat-number { font-size: 32px; font-weight: bold; color: #667eea; }
+        .stat-label { color: #666; font-size: 14px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📊 Daily Traffic Report</h1>
+            <p>$junction_name</p>
+        </div>
+        <div class="content">
+            <p>Dear $inspector_name,</p>
+            <p>Here is your daily traffic summary:</p>
+
+            <center>
+                <div class="stat-box">
+                    <div class="stat-number">$total_vehicles</div>
+                    <div class="stat-label">Total Vehicles</div>
+                </div>
+                <div class="stat-box">
+                    <div class="stat-number">$peak_hour</div>
+                    <div class="stat-label">Peak Hour</div>
+                </div>
+                <div class="stat-box">
+                    <div class="stat-number">$avg_congestion</div>
+                    <div class="stat-label">Avg Congestion</div>
+                </div>
+            </center>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+class EmailAlertService:
+    """
+    Email service for sending traffic alerts to inspectors
+    Uses SMTP (Gmail, Outlook, or custom SMTP server)
+    """
+    
+    def __init__(self):
+        # Email configuration from environment variables
+        self.smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = int(os.environ.get('SMTP_PORT', 587))
+        self.sender_email = os.environ.get('SMTP_EMAIL')
+        self.sender_password = os.environ.get('SMTP_PASSWORD')  # App password for Gmail
+        self.sender_name = os.environ.get('SMTP_SENDER_NAME', 'Track-V Traffic System')
+        
+        self.is_configured = all([self.sender_email, self.sender_password])
+
+        # Persistent SMTP connection - opening a socket, negotiating STARTTLS
+        # and logging in costs several network round-trips, so do it once and
+        # reuse the session across sends instead of per email
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        atexit.register(self._close_conn)
+
+        # Single background worker drains queued alerts over the pooled SMTP
+        # session instead of spawning a thread (and TLS handshake) per send.
+        # Started lazily on first enqueue: this singleton is built at import
+        # time, which under gunicorn's preload_app happens in the master -
+        # a thread started there would not survive the fork and queued
+        # emails would never go out in the workers.
+        self._mail_q = queue.Queue(maxsize=1000)
+        self._mail_worker_thread = None
+        self._mail_worker_lock = threading.Lock()
+
+        if not self.is_configured:
+            print("Warning: Email service not configured. Set SMTP_EMAIL and SMTP_PASSWORD")
+
+    def _get_conn(self):
+        """
+        Return a live SMTP connection, reconnecting if the server dropped it.
+        Must be called with self._conn_lock held.
+        """
+        if self._conn is not None:
+            try:
+                if self._conn.noop()[0] == 250:
+                    return self._conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_conn()
+
+        conn = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        conn.starttls()
+        conn.login(self.sender_email, self.sender_password)
+        self._conn = conn
+        return conn
+
+    def _close_conn(self):
+        """Close the persistent SMTP connection if one is open"""
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._conn = None
+
+    def _ensure_mail_worker(self):
+        """Start the mail worker in the current process if needed
+
+        is_alive() is False both before the first start and in a freshly
+        forked gunicorn worker (only the forking thread survives a fork),
+        so each serving process gets its own drainer no matter where the
+        module was first imported.
+        """
+        t = self._mail_worker_thread
+        if t is not None and t.is_alive():
+            return
+        with self._mail_worker_lock:
+            t = self._mail_worker_thread
+            if t is None or not t.is_alive():
+                t = threading.Thread(target=self._mail_worker, daemon=True)
+                self._mail_worker_thread = t
+                t.start()
+
+    def _mail_worker(self):
+        """Consume queued alert jobs one at a time on the shared connection"""
+        while True:
+            job = self._mail_q.get()
+            try:
+                self.send_alert_email(**job)
+            except Exception as e:
+                print(f"Error in mail worker: {e}")
+            finally:
+                self._mail_q.task_done()
+
+    def _send_message(self, msg):
+        """Send a prepared message over the pooled connection, retrying once"""
+        with self._conn_lock:
+            try:
+                self._get_conn().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                # Stale session (server idle timeout) - reconnect and retry
+                self._close_conn()
+                self._get_conn().send_message(msg)
+    
+    def send_alert_email(self, 
+                         to_email: str, 
+                         inspector_name: str,
+                         junction_name: str,
+                         alert_data: Dict) -> bool:
+        """
+        Send traffic alert email to inspector
+        
+        Args:
+            to_email: Inspector's email address
+            inspector_name: Inspector's name
+            junction_name: Name of the junction
+            alert_data: Alert details (type, severity, title, description, camera_index)
+            
+        Returns:
+            True if email sent successfully
+        """
+        if not self.is_configured:
+            print(f"Email not configured. Would send to: {to_email}")
+            return False
+        
+        try:
+            # Create message
+            msg = MIMEMultipart('alternative')
+            msg['Subject'] = f"🚨 Traffic Alert - {junction_name} - {alert_data.get('severity', 'medium').upper()}"
+            msg['From'] = f"{self.sender_name} <{self.sender_email}>"
+            msg['To'] = to_email
+            
+            # Alert details
+            alert_type = alert_data.get('type', 'manual')
+            severity = alert_data.get('severity', 'medium')
+            title = alert_data.get('title', 'Traffic Alert')
+            description = alert_data.get('description', 'No additional details provided.')
+            camera_index = alert_data.get('camera_index', 'N/A')
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            fields = {
+                'severity_color': SEVERITY_COLORS.get(severity, '#6c757d'),
+                'severity': severity,
+                'severity_upper': severity.upper(),
+                'inspector_name': inspector_name,
+                'junction_name': junction_name,
+                'camera_index': camera_index,
+                'alert_type': alert_type.replace('_', ' ').title(),
+                'timestamp': timestamp,
+                'title': title,
+                'description': description,
+            }
+            html_body = _ALERT_HTML_TMPL.substitute(fields)
+            text_body = _ALERT_TEXT_TMPL.substitute(fields)
+
+            msg.attach(MIMEText(text_body, 'plain'))
+            msg.attach(MIMEText(html_body, 'html'))
+
+            # Send email over the persistent connection
+            self._send_message(msg)
+
+            print(f"Alert email sent to {to_email}")
+            return True
+            
+        except Exception as e:
+            print(f"Error sending email: {e}")
+            return False
+    
+    def send_alert_async(self, to_email: str, inspector_name: str,
+                        junction_name: str, alert_data: Dict) -> None:
+        """Queue alert email for the background mail worker"""
+        self._ensure_mail_worker()
+        try:
+            self._mail_q.put_nowait({
+                'to_email': to_email,
+                'inspector_name': inspector_name,
+                'junction_name': junction_name,
+                'alert_data': alert_data
+            })
+        except queue.Full:
+            print(f"Mail queue full - dropping alert email to {to_email}")
+    
+    def send_daily_report(self, to_email: str, inspector_name: str,
+                         junction_name: str, report_data: Dict) -> bool:
+        """Send daily traffic report email"""
+        if not self.is_configured:
+            return False
+            
+        try:
+            msg = MIMEMultipart('alternative')
+            msg['Subject'] = f"📊 Daily Traffic Report - {junction_name} - {datetime.now().strftime('%Y-%m-%d')}"
+            msg['From'] = f"{self.sender_name} <{self.sender_email}>"
+            msg['To'] = to_email
+            
+            html_body = _REPORT_HTML_TMPL.substitute(
+                junction_name=junction_name,
+                inspector_name=inspector_name,
+                total_vehicles=report_data.get('total_vehicles', 0),
+                peak_hour=report_data.get('peak_hour', 'N/A'),
+                avg_congestion=report_data.get('avg_congestion', 'Low'),
+            )
+
+            msg.attach(MIMEText(html_body, 'html'))
+
+            self._send_message(msg)
+
+            return True
+            
+        except Exception as e:
+            print(f"Error sending report email: {e}")
+            return False
+
+
+# Global email service instance
+email_service = EmailAlertService()
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for Track-V Backend
+
+The polling endpoints (/get_data, /get_all_signal_states, /api/traffic/data)
+are I/O wait plus small JSON payloads, which suits gevent greenlets far
+better than one OS thread per connection. monkey.patch_all() runs before the
+app module is imported so smtplib/socket calls in the email service become
+cooperative instead of blocking a worker thread.
+
+This is also why the Flask views stay synchronous: under the patched
+socket layer every Supabase/httpx call already yields to other requests,
+so handlers overlap on I/O without async def. Flask's async views would
+spin up a throwaway event loop per request (slower for this workload),
+and an ASGI port would mean replacing the sync supabase-py client and
+the in-process optimizer/detector state wholesale.
+
+Usage: gunicorn app:app -c gunicorn_config.py
+"""
+
+import os
+
+from gevent import monkey
+
+monkey.patch_all()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Keep a single worker by default: optimizer/detector state lives in-process,
+# so multiple workers would each run their own junction state (see
+# initialize_global_optimizer in app.py). Scale via greenlets, not workers.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gevent'
+worker_connections = 1000
+
+# Load the app (and start the optimizer) once in the master before forking
+preload_app = True
+
+timeout = 120
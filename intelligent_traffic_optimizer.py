@@ -3,8 +3,54 @@ Intelligent Traffic Optimizer for 4-way Junction Phase Management
 Handles traffic signal timing based on vehicle detection and lane analysis
 """
 
+import logging
+from bisect import bisect_right
+
+import numpy as np
+
+# Lazy %-style logging instead of print(): the control-path callbacks run in
+# the video threads, and stdout writes block on the pipe while holding the
+# GIL. With no handler attached these calls cost one level check.
+logger = logging.getLogger(__name__)
+
+
+# Congestion classification bands, shared by the scalar and vectorized
+# paths: counts below 5 are 'low', below 10 'medium', below 15 'high'
+CONGESTION_THRESHOLDS = (5, 10, 15)
+CONGESTION_LEVELS = ('low', 'medium', 'high', 'severe')
+_THRESHOLDS_ARR = np.array(CONGESTION_THRESHOLDS, dtype=np.int32)
+
+# Predicted green durations per congestion band (empty lanes are special-
+# cased to 0 - keep red - before the band lookup)
+_PREDICT_DURATIONS = (15, 25, 35, 55)
+
+# Signal state codes and their names. The code is computed branchlessly as
+# (elapsed >= green) + (elapsed >= green + yellow)
+GREEN, YELLOW, RED = 0, 1, 2
+_STATE_NAMES = ('GREEN', 'YELLOW', 'RED')
+
+# Controller states: the observation -> signal-control flow is an explicit
+# finite-state machine, so control code branches on one int compare instead
+# of combinations of booleans
+OBSERVING, CYCLE_RUNNING, CYCLE_TRANSITION = 0, 1, 2
+
+# Observation-status keys, precomputed to avoid per-poll f-string builds
+_LANE_KEYS = ('lane_0', 'lane_1', 'lane_2', 'lane_3')
+
+# Rows of the packed per-lane state matrix (see IntelligentTrafficOptimizer)
+ROW_ELAPSED = 0    # phase elapsed times
+ROW_OBS_TIME = 1   # observation elapsed times
+ROW_OBS_VEH = 2    # max vehicle counts seen during observation
+ROW_READY = 3      # 0/1 observation-complete flags
+ROW_TIMING = 4     # current cycle green durations
+
+
 class VehicleData:
     """Data class for vehicle information"""
+    # Fixed attribute slots - these objects are created per detection, so
+    # dropping the per-instance __dict__ saves memory and attribute lookups
+    __slots__ = ('vehicle_id', 'vehicle_type', 'lane_id', 'timestamp')
+
     def __init__(self, vehicle_id, vehicle_type, lane_id, timestamp=None):
         self.vehicle_id = vehicle_id
         self.vehicle_type = vehicle_type  # car, truck, bus, bike
@@ -15,8 +61,37 @@ class VehicleData:
         return f"Vehicle(id={self.vehicle_id}, type={self.vehicle_type}, lane={self.lane_id})"
 
 
+class LaneVehicleBatch:
+    """
+    Structure-of-arrays batch of vehicles for one lane
+
+    Replaces per-frame lists of VehicleData objects: ids, type codes and
+    timestamps live in parallel NumPy arrays, so building a batch allocates
+    three arrays instead of N Python objects and downstream aggregation can
+    use np.bincount/np.sum directly.
+    """
+
+    # Small integer codes for vehicle types (index = code)
+    TYPE_CODES = {'car': 0, 'truck': 1, 'bus': 2, 'bike': 3}
+
+    def __init__(self, lane_id, ids, type_codes, timestamps):
+        self.lane_id = lane_id
+        self.ids = ids  # int32 array of vehicle ids
+        self.type_codes = type_codes  # int8 array of TYPE_CODES values
+        self.timestamps = timestamps  # float64 array of detection times
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"LaneVehicleBatch(lane={self.lane_id}, count={len(self.ids)})"
+
+
 class LaneMetrics:
     """Metrics for a specific lane/direction"""
+    __slots__ = ('lane_id', 'vehicle_count', 'congestion_level',
+                 'average_wait_time', 'vehicles')
+
     def __init__(self, lane_id, vehicle_count=0, congestion_level='low'):
         self.lane_id = lane_id
         self.vehicle_count = vehicle_count
@@ -25,15 +100,10 @@ class LaneMetrics:
         self.vehicles = []
         
     def update_congestion(self, vehicle_count):
+        # One C-level bisect instead of a 3-way comparison chain
         self.vehicle_count = vehicle_count
-        if vehicle_count < 5:
-            self.congestion_level = 'low'
-        elif vehicle_count < 10:
-            self.congestion_level = 'medium'
-        elif vehicle_count < 15:
-            self.congestion_level = 'high'
-        else:
-            self.congestion_level = 'severe'
+        self.congestion_level = CONGESTION_LEVELS[
+            bisect_right(CONGESTION_THRESHOLDS, vehicle_count)]
         return self.congestion_level
     
     def __repr__(self):
@@ -42,6 +112,9 @@ class LaneMetrics:
 
 class SignalPhase:
     """Traffic signal phase timing"""
+    __slots__ = ('phase_id', 'duration', 'yellow_time', 'red_time',
+                 'is_active', 'elapsed_time')
+
     def __init__(self, phase_id, duration=30, yellow_time=3):
         self.phase_id = phase_id  # 0-3 for 4-way junction
         self.duration = duration  # Green light duration in seconds
@@ -52,12 +125,10 @@ class SignalPhase:
         
     def get_state(self, elapsed_time):
         """Get current signal state based on elapsed time"""
-        if elapsed_time < self.duration:
-            return 'GREEN'
-        elif elapsed_time < self.duration + self.yellow_time:
-            return 'YELLOW'
-        else:
-            return 'RED'
+        # Branchless: two comparisons sum straight to the state code,
+        # matching the optimizer's vectorized path
+        return _STATE_NAMES[(elapsed_time >= self.duration) +
+                            (elapsed_time >= self.duration + self.yellow_time)]
     
     def get_remaining_green_time(self, elapsed_time):
         """Get remaining green light time"""
@@ -75,9 +146,20 @@ class IntelligentTrafficOptimizer:
     Manages phase timing based on traffic density
     """
     
+    # Precomputed next-state table for the controller FSM: one dict lookup
+    # per transition, unknown (state, event) pairs keep the current state
+    _TRANSITIONS = {
+        (OBSERVING, 'all_ready'): CYCLE_RUNNING,
+        (CYCLE_RUNNING, 'cycle_end'): CYCLE_TRANSITION,
+        (CYCLE_TRANSITION, 'timings_set'): CYCLE_RUNNING,
+    }
+
     def __init__(self):
         self.num_lanes = 4
         self.lanes = {i: LaneMetrics(i) for i in range(4)}
+        # Shared empty-lane result - analyze_lane_conditions runs per frame
+        # and must not allocate a fresh LaneMetrics on every empty call
+        self._empty_metrics = LaneMetrics(0)
         
         # Initial signal timings as per user configuration
         # cam1: 30s green, cam2: 22s green, cam3: red, cam4: red
@@ -91,29 +173,59 @@ class IntelligentTrafficOptimizer:
         self.current_phase = 0
         self.phase_start_time = 0
         self.cycle_number = 0  # Track which cycle we're in
-        self.phase_elapsed_times = [0, 0, 0, 0]  # Track elapsed time for each phase
-        
-        # OBSERVATION PHASE: Initial 30 second analysis per lane
-        self.observation_enabled = True  # Enable observation phase
+
+        # All per-lane scalar state packed into one contiguous int32 matrix
+        # (one row per field, one column per lane) so every all-lane
+        # reduction is a single vectorized row operation and the whole
+        # junction state fits in 80 contiguous bytes. The named attributes
+        # below are views into the rows, so per-lane indexing reads and
+        # writes through to the matrix.
+        self._state = np.zeros((5, 4), dtype=np.int32)
+        self.phase_elapsed_times = self._state[ROW_ELAPSED]  # Elapsed time per phase
+
+        # OBSERVATION PHASE: Initial 30 second analysis per lane. The
+        # controller starts in OBSERVING; observation_enabled is derived
+        # from self.state (see property below)
+        self.state = OBSERVING
         self.observation_duration = 30  # 30 seconds per lane for initial analysis
-        self.lane_observation_times = [0, 0, 0, 0]  # Track observation time for each lane
-        self.observation_vehicle_counts = [0, 0, 0, 0]  # Store vehicle counts during observation
-        self.lanes_ready = [False, False, False, False]  # Track which lanes completed observation
+        self.lane_observation_times = self._state[ROW_OBS_TIME]  # Observation time per lane
+        self.observation_vehicle_counts = self._state[ROW_OBS_VEH]  # Vehicle counts during observation
+        self.lanes_ready = self._state[ROW_READY]  # 1 when a lane completed observation
+        # Per-second observation samples: one int32 column per observation
+        # second, one row per lane. Recording a count is a single indexed
+        # store, and the summary statistics (max/mean per lane) come out of
+        # two axis reductions in finalize_observation_phase.
+        self._obs_buf = np.zeros((4, self.observation_duration), dtype=np.int32)
+        # Preallocated observation-status payload, updated in place on each
+        # get_observation_status call - dashboards poll this at several Hz
+        # and rebuilding 5 dicts per call just churns the allocator
+        self._obs_status = {
+            key: {'time': 0, 'max_vehicles': 0, 'ready': False}
+            for key in _LANE_KEYS
+        }
         
         # Adaptive timings for cycles after first (predicted vehicle counts)
         # Cycle 1: [30, 22, 0, 0] (user provided)
         # Cycle 2+: Dynamically calculated based on vehicle analysis
-        self.adaptive_timings = [
+        self.adaptive_timings = np.array([
             [30, 22, 0, 0],      # Cycle 1: Initial user-defined
             [22, 19, 24, 55],    # Cycle 2: Example predicted timings
-        ]
-        self.current_cycle_timings = self.adaptive_timings[0]
+        ], dtype=np.int32)
+        self._state[ROW_TIMING] = self.adaptive_timings[0]
+        self.current_cycle_timings = self._state[ROW_TIMING]
+
         
         # Traffic engineering standards
         self.min_phase_duration = 7
         self.max_phase_duration = 120
         self.yellow_time = 3
         self.all_red_time = 2
+
+        # Per-cycle schedule table: green end is the timing row itself (a
+        # view, so it stays in sync with set_cycle_timing), yellow end is
+        # recomputed once per cycle instead of per get_signal_state call
+        self._green_end = self._state[ROW_TIMING]
+        self._yellow_end = self._state[ROW_TIMING] + self.yellow_time
         
         # Adaptive timing
         self.base_phase_duration = 30
@@ -123,22 +235,75 @@ class IntelligentTrafficOptimizer:
             'high': 1.5,
             'severe': 2.0
         }
+        # Same multipliers as a lookup table indexed by congestion level
+        # (CONGESTION_LEVELS order) for the vectorized timing path
+        self._mult_lut = np.array(
+            [self.congestion_multiplier[level] for level in CONGESTION_LEVELS],
+            dtype=np.float32)
+
+        # Prediction bands as digitize edges: counts of 0 land in band 0
+        # (keep red), then the shared congestion thresholds pick the green
+        # duration - the whole 4-lane prediction is one np.digitize call
+        self._predict_bins = np.array([1, 5, 10, 15], dtype=np.int32)
+        self._predict_durs = np.array((0,) + _PREDICT_DURATIONS, dtype=np.int32)
+
+        # Mirrors of per-phase duration/yellow kept as int32 vectors so
+        # get_phase_info sums the cycle time in one reduction, plus a
+        # preallocated info payload mutated in place per call
+        self._phase_durations = np.array(
+            [p.duration for p in self.phases], dtype=np.int32)
+        self._phase_yellows = np.array(
+            [p.yellow_time for p in self.phases], dtype=np.int32)
+        self._phase_info = {
+            'current_phase': 0,
+            'phases': [
+                {'phase_id': p.phase_id, 'duration': p.duration,
+                 'yellow_time': p.yellow_time, 'congestion': 'low'}
+                for p in self.phases
+            ],
+            'total_cycle_time': 0,
+        }
         
+    def dispatch(self, event):
+        """
+        Advance the controller FSM: one dict lookup per event
+
+        Args:
+            event: 'all_ready', 'cycle_end' or 'timings_set'
+
+        Returns:
+            The (possibly unchanged) controller state
+        """
+        self.state = self._TRANSITIONS.get((self.state, event), self.state)
+        return self.state
+
+    @property
+    def observation_enabled(self):
+        """True while the controller is still in the observation phase"""
+        return self.state == OBSERVING
+
     def analyze_lane_conditions(self, vehicles):
         """
         Analyze lane conditions based on vehicle data
         
         Args:
-            vehicles: List of VehicleData objects
-            
+            vehicles: LaneVehicleBatch or list of VehicleData objects
+
         Returns:
             LaneMetrics for the lane
         """
-        if not vehicles:
-            return LaneMetrics(0, vehicle_count=0, congestion_level='low')
-        
-        lane_id = vehicles[0].lane_id if vehicles else 0
-        lane_metrics = self.lanes.get(lane_id, LaneMetrics(lane_id))
+        if vehicles is None or len(vehicles) == 0:
+            return self._empty_metrics
+
+        if isinstance(vehicles, LaneVehicleBatch):
+            lane_id = vehicles.lane_id
+        else:
+            lane_id = vehicles[0].lane_id
+        # self.lanes always holds all 4 lanes; unknown lane ids fall back to
+        # the shared empty metrics instead of allocating
+        lane_metrics = self.lanes.get(lane_id)
+        if lane_metrics is None:
+            return self._empty_metrics
         
         # Update vehicle count and congestion
         vehicle_count = len(vehicles)
@@ -147,6 +312,40 @@ class IntelligentTrafficOptimizer:
         
         return lane_metrics
     
+    def classify_all(self, counts):
+        """
+        Vectorized congestion classification for all lanes at once
+
+        Args:
+            counts: array-like of 4 vehicle counts
+
+        Returns:
+            int array of level indices into CONGESTION_LEVELS (0..3)
+        """
+        counts = np.asarray(counts, dtype=np.int32)
+        return np.searchsorted(_THRESHOLDS_ARR, counts, side='right')
+
+    def analyze_all_lanes(self, counts):
+        """
+        Update LaneMetrics for all 4 lanes from a count vector in one pass
+
+        One searchsorted call classifies every lane, replacing four separate
+        analyze_lane_conditions invocations with per-lane branching.
+
+        Args:
+            counts: array-like of 4 vehicle counts
+
+        Returns:
+            The updated self.lanes dict
+        """
+        counts = np.asarray(counts, dtype=np.int32)
+        levels = np.searchsorted(_THRESHOLDS_ARR, counts, side='right')
+        for i in range(self.num_lanes):
+            metrics = self.lanes[i]
+            metrics.vehicle_count = int(counts[i])
+            metrics.congestion_level = CONGESTION_LEVELS[levels[i]]
+        return self.lanes
+
     def optimize_phase_timing(self, lane_metrics_dict):
         """
         Optimize signal phase timing based on lane metrics
@@ -157,18 +356,25 @@ class IntelligentTrafficOptimizer:
         Returns:
             Updated phase durations
         """
-        for lane_id, metrics in lane_metrics_dict.items():
-            if lane_id < len(self.phases):
-                # Calculate adaptive duration based on congestion
-                congestion_factor = self.congestion_multiplier.get(metrics.congestion_level, 1.0)
-                new_duration = int(self.base_phase_duration * congestion_factor)
-                
-                # Enforce limits
-                new_duration = max(self.min_phase_duration, min(new_duration, self.max_phase_duration))
-                
-                self.phases[lane_id].duration = new_duration
-                self.lanes[lane_id] = metrics
-        
+        lane_ids = [lane_id for lane_id in lane_metrics_dict
+                    if lane_id < len(self.phases)]
+        if lane_ids:
+            # Map congestion level names to LUT indices, then compute every
+            # adaptive duration (multiply + clamp) in one vectorized pass
+            levels = np.fromiter(
+                (CONGESTION_LEVELS.index(lane_metrics_dict[lane_id].congestion_level)
+                 if lane_metrics_dict[lane_id].congestion_level in CONGESTION_LEVELS else 0
+                 for lane_id in lane_ids),
+                dtype=np.int32, count=len(lane_ids))
+            durations = np.clip(
+                (self.base_phase_duration * self._mult_lut[levels]).astype(np.int32),
+                self.min_phase_duration, self.max_phase_duration)
+
+            for lane_id, duration in zip(lane_ids, durations):
+                self.phases[lane_id].duration = int(duration)
+                self._phase_durations[lane_id] = duration
+                self.lanes[lane_id] = lane_metrics_dict[lane_id]
+
         return [p.duration for p in self.phases]
     
     def update_phase(self, elapsed_times=None):
@@ -178,10 +384,12 @@ class IntelligentTrafficOptimizer:
         Args:
             elapsed_times: Dict mapping phase_id to elapsed time (optional)
         """
-        if elapsed_times and isinstance(elapsed_times, dict):
-            # Update specific phases
+        if elapsed_times:
+            # Callers always pass a dict of phase_id -> elapsed seconds;
+            # bound-check with a direct range compare instead of re-checking
+            # the container type and len(self.phases) per entry
             for phase_id, elapsed_time in elapsed_times.items():
-                if phase_id < len(self.phases):
+                if 0 <= phase_id < 4:
                     self.phases[phase_id].elapsed_time = elapsed_time
         
         # Simple round-robin: cycle through phases
@@ -192,6 +400,16 @@ class IntelligentTrafficOptimizer:
         """Update elapsed time for a specific phase"""
         if phase_id < len(self.phase_elapsed_times):
             self.phase_elapsed_times[phase_id] = elapsed_time
+
+    def step(self, lane_id, elapsed_time):
+        """
+        Single per-frame entry point for a lane: record elapsed time and
+        return (signal_state, remaining_green_time) in one call instead of
+        three separate optimizer calls per frame.
+        """
+        if lane_id < len(self.phase_elapsed_times):
+            self.phase_elapsed_times[lane_id] = elapsed_time
+        return self.get_signal_state(lane_id), self.get_green_time(lane_id)
     
     def get_signal_state(self, lane_id=0):
         """
@@ -205,27 +423,47 @@ class IntelligentTrafficOptimizer:
         """
         if lane_id >= len(self.phases):
             return 'RED'
-        
+
         # Get current cycle timing for this lane
         green_duration = self.current_cycle_timings[lane_id] if lane_id < len(self.current_cycle_timings) else 0
-        elapsed_time = self.phase_elapsed_times[lane_id]
-        
-        # State logic:
-        # GREEN: 0 to green_duration seconds
-        # YELLOW: green_duration to green_duration + yellow_time seconds
-        # RED: beyond that
-        
+
         if green_duration == 0:
             # No green time allocated (e.g., cam3, cam4 in cycle 1)
             return 'RED'
-        
-        if elapsed_time < green_duration:
-            return 'GREEN'
-        elif elapsed_time < green_duration + self.yellow_time:
-            return 'YELLOW'
-        else:
-            return 'RED'
+
+        # Branchless state code: GREEN until green_duration, YELLOW until
+        # green_duration + yellow_time, RED beyond - two comparisons, no
+        # comparison chain to mispredict. int() on each comparison matters:
+        # these are numpy scalars, and adding two np.bool_ values is a
+        # logical OR (or a TypeError as an index on numpy >= 2), not the
+        # 0/1/2 sum this lookup needs.
+        elapsed_time = self.phase_elapsed_times[lane_id]
+        return _STATE_NAMES[int(elapsed_time >= green_duration) +
+                            int(elapsed_time >= green_duration + self.yellow_time)]
     
+    def get_all_signal_state_codes(self):
+        """
+        Compute signal state codes for all 4 lanes in one vectorized pass
+
+        Returns:
+            int array of codes indexing _STATE_NAMES (0=GREEN, 1=YELLOW,
+            2=RED); zero-green lanes are forced RED
+        """
+        elapsed = self._state[ROW_ELAPSED]
+        return np.where(self._green_end == 0, 2,
+                        np.where(elapsed < self._green_end, 0,
+                                 np.where(elapsed < self._yellow_end, 1, 2)))
+
+    def get_signal_states(self):
+        """
+        Get signal state names for all 4 lanes in one call
+
+        Returns:
+            Tuple of 4 state names ('GREEN'/'YELLOW'/'RED'), lane order
+        """
+        codes = self.get_all_signal_state_codes()
+        return tuple(_STATE_NAMES[code] for code in codes)
+
     def get_green_time(self, lane_id=0):
         """
         Get remaining green light time for a lane
@@ -239,11 +477,12 @@ class IntelligentTrafficOptimizer:
         if lane_id >= len(self.current_cycle_timings):
             return 0
         
-        green_duration = self.current_cycle_timings[lane_id]
-        elapsed_time = self.phase_elapsed_times[lane_id]
-        
+        green_duration = int(self.current_cycle_timings[lane_id])
+        elapsed_time = int(self.phase_elapsed_times[lane_id])
+
         if elapsed_time < green_duration:
-            return max(0, green_duration - elapsed_time)
+            # Plain int - this value flows into JSON payloads
+            return green_duration - elapsed_time
         return 0
     
     def set_cycle_timing(self, cycle_timings):
@@ -254,11 +493,26 @@ class IntelligentTrafficOptimizer:
             cycle_timings: List of 4 integers [cam1_green, cam2_green, cam3_green, cam4_green]
         """
         if len(cycle_timings) == 4:
-            self.current_cycle_timings = cycle_timings
+            # asarray is a no-op for int32 arrays (e.g. adaptive_timings
+            # rows) and converts lists from the prediction path once
+            self._state[ROW_TIMING] = np.asarray(cycle_timings, dtype=np.int32)
+            # Refresh the schedule table for the new cycle (green ends are
+            # the timing row view and update automatically)
+            self._yellow_end = self._state[ROW_TIMING] + self.yellow_time
+            # Red time per phase is the rest of the cycle, computed for all
+            # phases in one vectorized pass: full cycle length minus the
+            # phase's own green and yellow
+            total_cycle = (int(self._green_end.sum())
+                           + self.yellow_time * 4 + self.all_red_time)
+            red_times = total_cycle - self._green_end - self.yellow_time
+            for phase, red in zip(self.phases, red_times):
+                phase.red_time = int(red)
             # Reset elapsed times for new cycle
-            self.phase_elapsed_times = [0, 0, 0, 0]
+            self._state[ROW_ELAPSED] = 0
             self.cycle_number += 1
-            print(f"[Traffic Control] New cycle #{self.cycle_number}: Timings = {self.current_cycle_timings}")
+            self.dispatch('timings_set')
+            logger.info("[Traffic Control] New cycle #%d: Timings = %s",
+                        self.cycle_number, self.current_cycle_timings.tolist())
     
     def predict_next_cycle_timings(self, lane_metrics_dict):
         """
@@ -270,26 +524,15 @@ class IntelligentTrafficOptimizer:
         Returns:
             List of predicted timings [cam1, cam2, cam3, cam4]
         """
-        predicted = []
-        for lane_id in range(4):
-            vehicle_count = lane_metrics_dict.get(lane_id, 0)
-            
-            # Simple prediction: allocate time based on vehicle count
-            # More vehicles = longer green time (up to max 120s)
-            if vehicle_count == 0:
-                duration = 0  # No vehicles, keep red
-            elif vehicle_count < 5:
-                duration = 15
-            elif vehicle_count < 10:
-                duration = 25
-            elif vehicle_count < 15:
-                duration = 35
-            else:
-                duration = 55  # Max for heavy traffic
-            
-            predicted.append(duration)
-        
-        return predicted
+        # Planning the next cycle ends the running one; a no-op while still
+        # observing (the transition table has no OBSERVING/cycle_end entry)
+        self.dispatch('cycle_end')
+        counts = np.fromiter(
+            (lane_metrics_dict.get(lane_id, 0) for lane_id in range(4)),
+            dtype=np.int32, count=4)
+        # One digitize bands all 4 lanes at once; band 0 is the empty-lane
+        # keep-red case, bands 1-4 follow the congestion thresholds
+        return self._predict_durs[np.digitize(counts, self._predict_bins)].tolist()
     
     def update_observation_time(self, lane_id, elapsed_seconds):
         """
@@ -305,13 +548,14 @@ class IntelligentTrafficOptimizer:
             
             # Mark lane as ready when observation period is complete
             if elapsed_seconds >= self.observation_duration and not self.lanes_ready[lane_id]:
-                self.lanes_ready[lane_id] = True
-                print(f"[Traffic Control] Lane {lane_id} observation complete! Max vehicles: {self.observation_vehicle_counts[lane_id]}")
-                
-                # Check if ALL lanes are ready
-                if all(self.lanes_ready):
-                    print(f"[Traffic Control] ALL LANES OBSERVATION COMPLETE - Starting signal control!")
-                    self.observation_enabled = False
+                self.lanes_ready[lane_id] = 1
+                logger.info("[Traffic Control] Lane %d observation complete! Max vehicles: %d",
+                            lane_id, self.observation_vehicle_counts[lane_id])
+
+                # Check if ALL lanes are ready (one vectorized reduction)
+                if self._state[ROW_READY].all():
+                    logger.info("[Traffic Control] ALL LANES OBSERVATION COMPLETE - Starting signal control!")
+                    self.dispatch('all_ready')
     
     def record_observation_vehicle_count(self, lane_id, vehicle_count):
         """
@@ -321,21 +565,37 @@ class IntelligentTrafficOptimizer:
             lane_id: Lane being observed
             vehicle_count: Number of vehicles detected
         """
-        if lane_id < 4:
-            self.observation_vehicle_counts[lane_id] = max(self.observation_vehicle_counts[lane_id], vehicle_count)
-    
+        # Stop sampling once the lane's window is complete: its clock is
+        # capped at observation_duration, so the modulo would park on slot
+        # 0 and let every later frame overwrite the lane's t=0 sample
+        # while the other lanes finish
+        if lane_id < 4 and not self.lanes_ready[lane_id]:
+            # Per-second sample into the ring buffer, indexed by the lane's
+            # observation clock
+            self._obs_buf[lane_id,
+                          self.lane_observation_times[lane_id] % self.observation_duration] = vehicle_count
+            # Single slot compare-and-store - skips Python max() boxing
+            row = self._state[ROW_OBS_VEH]
+            if vehicle_count > row[lane_id]:
+                row[lane_id] = vehicle_count
+
     def is_observation_complete(self):
         """Check if all lanes have completed their 30-second observation period"""
-        return all(self.lanes_ready)
+        return bool(self._state[ROW_READY].all())
     
     def get_observation_status(self):
-        """Get current observation status for all lanes"""
-        return {
-            'lane_0': {'time': self.lane_observation_times[0], 'max_vehicles': self.observation_vehicle_counts[0], 'ready': self.lanes_ready[0]},
-            'lane_1': {'time': self.lane_observation_times[1], 'max_vehicles': self.observation_vehicle_counts[1], 'ready': self.lanes_ready[1]},
-            'lane_2': {'time': self.lane_observation_times[2], 'max_vehicles': self.observation_vehicle_counts[2], 'ready': self.lanes_ready[2]},
-            'lane_3': {'time': self.lane_observation_times[3], 'max_vehicles': self.observation_vehicle_counts[3], 'ready': self.lanes_ready[3]},
-        }
+        """Get current observation status for all lanes
+
+        Returns the preallocated status dict updated in place - callers must
+        treat it as a read-only snapshot.
+        """
+        for i in range(4):
+            lane_status = self._obs_status[_LANE_KEYS[i]]
+            # Cast to plain int/bool - these flow straight into JSON responses
+            lane_status['time'] = int(self.lane_observation_times[i])
+            lane_status['max_vehicles'] = int(self.observation_vehicle_counts[i])
+            lane_status['ready'] = bool(self.lanes_ready[i])
+        return self._obs_status
     
     def finalize_observation_phase(self):
         """
@@ -343,21 +603,33 @@ class IntelligentTrafficOptimizer:
         Uses observed vehicle counts to predict next cycle timings
         """
         if self.is_observation_complete():
-            print("[Traffic Control] Observation phase complete!")
-            print(f"[Traffic Control] Observed vehicle counts: cam1={self.observation_vehicle_counts[0]}, cam2={self.observation_vehicle_counts[1]}, cam3={self.observation_vehicle_counts[2]}, cam4={self.observation_vehicle_counts[3]}")
+            # Two axis reductions over the per-second sample buffer give the
+            # full observation summary; the peaks also reconcile the running
+            # maxima in case any per-second sample arrived late
+            peaks = self._obs_buf.max(axis=1)
+            means = self._obs_buf.mean(axis=1)
+            np.maximum(self._state[ROW_OBS_VEH], peaks,
+                       out=self._state[ROW_OBS_VEH])
+            logger.info("[Traffic Control] Observation phase complete!")
+            logger.info("[Traffic Control] Observed vehicle counts: cam1=%d, cam2=%d, cam3=%d, cam4=%d",
+                        *self.observation_vehicle_counts)
+            logger.info("[Traffic Control] Mean vehicles over observation: %s",
+                        np.round(means, 1).tolist())
             
             # Reset elapsed times for fresh signal control cycle
-            self.phase_elapsed_times = [0, 0, 0, 0]
-            
+            self._state[ROW_ELAPSED] = 0
+
             # Apply initial cycle timings [30, 22, 0, 0]
-            print(f"[Traffic Control] Starting signal control with initial timings: {self.current_cycle_timings}")
-            
+            logger.info("[Traffic Control] Starting signal control with initial timings: %s",
+                        self.current_cycle_timings.tolist())
+
             # Predict next cycle based on observations
-            lane_metrics = {i: self.observation_vehicle_counts[i] for i in range(4)}
+            lane_metrics = {i: int(self.observation_vehicle_counts[i]) for i in range(4)}
             next_timings = self.predict_next_cycle_timings(lane_metrics)
-            print(f"[Traffic Control] Predicted cycle 2 timings (for after cycle 1): {next_timings}")
+            logger.info("[Traffic Control] Predicted cycle 2 timings (for after cycle 1): %s",
+                        next_timings)
             
-            self.observation_enabled = False
+            self.dispatch('all_ready')
             return next_timings
         return None
         
@@ -374,20 +646,21 @@ class IntelligentTrafficOptimizer:
         return False  # Override handled at application level
     
     def get_phase_info(self):
-        """Get information about all phases"""
-        return {
-            'current_phase': self.current_phase,
-            'phases': [
-                {
-                    'phase_id': p.phase_id,
-                    'duration': p.duration,
-                    'yellow_time': p.yellow_time,
-                    'congestion': self.lanes[i].congestion_level
-                }
-                for i, p in enumerate(self.phases)
-            ],
-            'total_cycle_time': sum(p.duration + p.yellow_time for p in self.phases)
-        }
+        """Get information about all phases
+
+        Returns the preallocated info dict updated in place - callers must
+        treat it as a read-only snapshot.
+        """
+        info = self._phase_info
+        info['current_phase'] = self.current_phase
+        for i, entry in enumerate(info['phases']):
+            phase = self.phases[i]
+            entry['duration'] = phase.duration
+            entry['yellow_time'] = phase.yellow_time
+            entry['congestion'] = self.lanes[i].congestion_level
+        info['total_cycle_time'] = int(
+            (self._phase_durations + self._phase_yellows).sum())
+        return info
     
     def __repr__(self):
         return f"IntelligentTrafficOptimizer(lanes={self.num_lanes}, current_phase={self.current_phase})"
@@ -151,6 +151,34 @@ class KalmanBoxTracker(object):
     return convert_x_to_bbox(self.kf.x)
 
 
+def batch_predict(trackers):
+  """
+  Advances the Kalman state of all trackers with stacked matrix ops.
+
+  All trackers share the same F/Q matrices, so the time update can be done as
+  one (7,N) matmul plus one broadcast (N,7,7) covariance update instead of N
+  separate 7x7 multiplies inside filterpy.
+  """
+  if len(trackers) == 0:
+    return
+  F = trackers[0].kf.F
+  X = np.concatenate([t.kf.x for t in trackers], axis=1)  # (7, N)
+  #clamp negative area velocity (same guard as KalmanBoxTracker.predict)
+  neg = (X[6] + X[2]) <= 0
+  X[6, neg] = 0.0
+  X = F @ X
+  P = np.stack([t.kf.P for t in trackers])  # (N, 7, 7)
+  P = F @ P @ F.T
+  for i, t in enumerate(trackers):
+    t.kf.x = X[:, i:i+1].copy()
+    t.kf.P = P[i] + t.kf.Q
+    t.age += 1
+    if(t.time_since_update > 0):
+      t.hit_streak = 0
+    t.time_since_update += 1
+    t.history.append(convert_x_to_bbox(t.kf.x))
+
+
 def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
   """
   Assigns detections to tracked object (both represented as bounding boxes)
@@ -169,31 +197,22 @@ def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
     else:
       matched_indices = linear_assignment(-iou_matrix)
   else:
-    matched_indices = np.empty(shape=(0,2))
-
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
-
-  #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
+    matched_indices = np.empty(shape=(0,2), dtype=int)
+
+  #filter out matched with low IOU (vectorized gather instead of per-pair loop)
+  matched_indices = matched_indices.astype(int)
+  if matched_indices.shape[0] > 0:
+    keep = iou_matrix[matched_indices[:,0], matched_indices[:,1]] >= iou_threshold
+    matches = matched_indices[keep]
   else:
-    matches = np.concatenate(matches,axis=0)
+    matches = np.empty((0,2), dtype=int)
+
+  #anything not in a kept match is unmatched - set difference instead of
+  #O(N*M) Python membership tests
+  unmatched_detections = np.setdiff1d(np.arange(len(detections)), matches[:,0])
+  unmatched_trackers = np.setdiff1d(np.arange(len(trackers)), matches[:,1])
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+  return matches, unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
@@ -217,12 +236,13 @@ class Sort(object):
     NOTE: The number of objects returned may differ from the number of detections provided.
     """
     self.frame_count += 1
-    # get predicted locations from existing trackers.
+    # get predicted locations from existing trackers (batched Kalman predict).
+    batch_predict(self.trackers)
     trks = np.zeros((len(self.trackers), 5))
     to_del = []
     ret = []
     for t, trk in enumerate(trks):
-      pos = self.trackers[t].predict()[0]
+      pos = self.trackers[t].history[-1][0]
       trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
       if np.any(np.isnan(pos)):
         to_del.append(t)
@@ -1,460 +1,1185 @@
-"""
-Supabase Database Configuration for Track-V Traffic Management System
-Handles all database operations, authentication, and real-time features
-"""
-
-import os
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
-import json
-
-# Supabase Python Client
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    print("Warning: supabase-py not installed. Run: pip install supabase")
-
-
-class SupabaseConfig:
-    """Supabase configuration and client management"""
-    
-    def __init__(self):
-        self.url = os.environ.get('SUPABASE_URL')
-        self.anon_key = os.environ.get('SUPABASE_ANON_KEY')
-        self.service_role_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
-        self.client: Optional[Client] = None
-        self.admin_client: Optional[Client] = None
-        
-        if not all([self.url, self.anon_key]):
-            print("Warning: Supabase credentials not configured")
-            print("Set SUPABASE_URL and SUPABASE_ANON_KEY environment variables")
-        
-    def get_client(self) -> Optional[Client]:
-        """Get Supabase client for authenticated requests"""
-        if not SUPABASE_AVAILABLE:
-            return None
-            
-        if self.client is None and self.url and self.anon_key:
-            self.client = create_client(self.url, self.anon_key)
-        return self.client
-    
-    def get_admin_client(self) -> Optional[Client]:
-        """Get Supabase admin client (service role) for backend operations"""
-        if not SUPABASE_AVAILABLE:
-            return None
-            
-        if self.admin_client is None and self.url and self.service_role_key:
-            self.admin_client = create_client(self.url, self.service_role_key)
-        return self.admin_client
-
-
-# Global Supabase instance
-supabase_config = SupabaseConfig()
-
-
-class TrafficDataManager:
-    """Manage traffic data storage and retrieval from Supabase"""
-    
-    def __init__(self):
-        self.client = supabase_config.get_admin_client() or supabase_config.get_client()
-        
-    def save_traffic_data(self, junction_id: str, camera_index: int, data: Dict) -> bool:
-        """
-        Save real-time traffic data to Supabase
-        
-        Args:
-            junction_id: UUID of the junction
-            camera_index: Camera index (0-3)
-            data: Traffic metrics dictionary
-        """
-        if not self.client:
-            return False
-            
-        try:
-            record = {
-                'junction_id': junction_id,
-                'camera_index': camera_index,
-                'vehicle_count': data.get('total_count', 0),
-                'car_count': data.get('car_count', 0),
-                'truck_count': data.get('truck_count', 0),
-                'bus_count': data.get('bus_count', 0),
-                'bike_count': data.get('bike_count', 0),
-                'congestion_level': data.get('congestion_level', 'low'),
-                'signal_state': data.get('signal_state', 'RED'),
-                'green_time_remaining': data.get('green_time', 0),
-                'average_speed': data.get('average_speed'),
-            }
-            
-            self.client.table('traffic_data').insert(record).execute()
-            return True
-            
-        except Exception as e:
-            print(f"Error saving traffic data: {e}")
-            return False
-    
-    def get_latest_traffic_data(self, junction_id: str, camera_index: Optional[int] = None) -> List[Dict]:
-        """Get latest traffic data for a junction"""
-        if not self.client:
-            return []
-            
-        try:
-            query = self.client.table('traffic_data')\
-                .select('*')\
-                .eq('junction_id', junction_id)\
-                .order('timestamp', desc=True)\
-                .limit(10)
-            
-            if camera_index is not None:
-                query = query.eq('camera_index', camera_index)
-                
-            result = query.execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching traffic data: {e}")
-            return []
-    
-    def get_traffic_history(self, junction_id: str, hours: int = 24) -> List[Dict]:
-        """Get traffic history for the past N hours"""
-        if not self.client:
-            return []
-            
-        try:
-            since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
-            
-            result = self.client.table('traffic_data')\
-                .select('*')\
-                .eq('junction_id', junction_id)\
-                .gte('timestamp', since)\
-                .order('timestamp', desc=True)\
-                .execute()
-                
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching traffic history: {e}")
-            return []
-
-
-class JunctionManager:
-    """Manage junction data in Supabase"""
-    
-    def __init__(self):
-        self.client = supabase_config.get_admin_client() or supabase_config.get_client()
-        
-    def get_all_junctions(self) -> List[Dict]:
-        """Get all junctions with their details"""
-        if not self.client:
-            return []
-            
-        try:
-            result = self.client.table('junctions')\
-                .select('*, cameras(*)')\
-                .eq('status', 'active')\
-                .execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching junctions: {e}")
-            return []
-    
-    def get_junction_by_id(self, junction_id: str) -> Optional[Dict]:
-        """Get a specific junction"""
-        if not self.client:
-            return None
-            
-        try:
-            result = self.client.table('junctions')\
-                .select('*, cameras(*)')\
-                .eq('id', junction_id)\
-                .single()\
-                .execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching junction: {e}")
-            return None
-    
-    def update_camera_source(self, junction_id: str, camera_index: int, 
-                             source_type: str, source_url: str) -> bool:
-        """Update camera video source"""
-        if not self.client:
-            return False
-            
-        try:
-            self.client.table('cameras')\
-                .update({
-                    'source_type': source_type,
-                    'source_url': source_url,
-                    'is_active': True,
-                    'last_active': datetime.utcnow().isoformat()
-                })\
-                .eq('junction_id', junction_id)\
-                .eq('camera_index', camera_index)\
-                .execute()
-            return True
-            
-        except Exception as e:
-            print(f"Error updating camera: {e}")
-            return False
-
-
-class AlertManager:
-    """Manage traffic alerts and email notifications"""
-    
-    def __init__(self):
-        self.client = supabase_config.get_admin_client() or supabase_config.get_client()
-        
-    def create_alert(self, junction_id: str, alert_data: Dict, user_id: Optional[str] = None) -> Optional[str]:
-        """
-        Create a new traffic alert
-        
-        Args:
-            junction_id: Junction UUID
-            alert_data: Alert details (type, severity, title, description, camera_index)
-            user_id: ID of user creating the alert
-            
-        Returns:
-            Alert ID if successful
-        """
-        if not self.client:
-            return None
-            
-        try:
-            # Get junction to find inspector email
-            junction = self.client.table('junctions')\
-                .select('inspector_email, inspector_name')\
-                .eq('id', junction_id)\
-                .single()\
-                .execute()
-            
-            inspector_email = junction.data.get('inspector_email') if junction.data else None
-            
-            record = {
-                'junction_id': junction_id,
-                'camera_index': alert_data.get('camera_index'),
-                'alert_type': alert_data.get('type', 'manual'),
-                'severity': alert_data.get('severity', 'medium'),
-                'title': alert_data.get('title', 'Traffic Alert'),
-                'description': alert_data.get('description', ''),
-                'sent_to_email': inspector_email,
-                'created_by': user_id,
-            }
-            
-            result = self.client.table('alerts').insert(record).execute()
-            
-            if result.data:
-                return result.data[0].get('id')
-            return None
-            
-        except Exception as e:
-            print(f"Error creating alert: {e}")
-            return None
-    
-    def mark_email_sent(self, alert_id: str) -> bool:
-        """Mark alert email as sent"""
-        if not self.client:
-            return False
-            
-        try:
-            self.client.table('alerts')\
-                .update({
-                    'email_sent': True,
-                    'email_sent_at': datetime.utcnow().isoformat()
-                })\
-                .eq('id', alert_id)\
-                .execute()
-            return True
-            
-        except Exception as e:
-            print(f"Error updating alert: {e}")
-            return False
-    
-    def get_pending_alerts(self) -> List[Dict]:
-        """Get alerts that need email sending"""
-        if not self.client:
-            return []
-            
-        try:
-            result = self.client.table('alerts')\
-                .select('*, junctions(name, inspector_email, inspector_name)')\
-                .eq('email_sent', False)\
-                .not_.is_('sent_to_email', 'null')\
-                .execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching pending alerts: {e}")
-            return []
-    
-    def get_junction_alerts(self, junction_id: str, limit: int = 50) -> List[Dict]:
-        """Get alerts for a specific junction"""
-        if not self.client:
-            return []
-            
-        try:
-            result = self.client.table('alerts')\
-                .select('*')\
-                .eq('junction_id', junction_id)\
-                .order('created_at', desc=True)\
-                .limit(limit)\
-                .execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching alerts: {e}")
-            return []
-
-
-class UserProfileManager:
-    """Manage user profiles in Supabase"""
-    
-    def __init__(self):
-        self.client = supabase_config.get_client()
-        
-    def get_profile(self, user_id: str) -> Optional[Dict]:
-        """Get user profile"""
-        if not self.client:
-            return None
-            
-        try:
-            result = self.client.table('profiles')\
-                .select('*')\
-                .eq('id', user_id)\
-                .single()\
-                .execute()
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching profile: {e}")
-            return None
-    
-    def update_profile(self, user_id: str, updates: Dict) -> bool:
-        """
-        Update user profile
-        
-        Args:
-            user_id: User UUID
-            updates: Fields to update (full_name, badge_number, phone, etc.)
-        """
-        if not self.client:
-            return False
-            
-        # Only allow specific fields to be updated
-        allowed_fields = ['full_name', 'badge_number', 'phone', 'department', 
-                         'avatar_url', 'email_alerts_enabled', 'dark_mode']
-        safe_updates = {k: v for k, v in updates.items() if k in allowed_fields}
-        
-        if not safe_updates:
-            return False
-            
-        try:
-            self.client.table('profiles')\
-                .update(safe_updates)\
-                .eq('id', user_id)\
-                .execute()
-            return True
-            
-        except Exception as e:
-            print(f"Error updating profile: {e}")
-            return False
-    
-    def get_user_settings(self, user_id: str) -> Dict:
-        """Get user settings (dark mode, email alerts)"""
-        profile = self.get_profile(user_id)
-        if profile:
-            return {
-                'dark_mode': profile.get('dark_mode', False),
-                'email_alerts_enabled': profile.get('email_alerts_enabled', True)
-            }
-        return {'dark_mode': False, 'email_alerts_enabled': True}
-
-
-class ReportManager:
-    """Manage traffic reports"""
-    
-    def __init__(self):
-        self.client = supabase_config.get_admin_client() or supabase_config.get_client()
-        
-    def generate_hourly_report(self, junction_id: str) -> Optional[Dict]:
-        """Generate hourly traffic report from aggregated data"""
-        if not self.client:
-            return None
-            
-        try:
-            # Get traffic data for the past hour
-            one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
-            
-            result = self.client.table('traffic_data')\
-                .select('*')\
-                .eq('junction_id', junction_id)\
-                .gte('timestamp', one_hour_ago)\
-                .execute()
-            
-            if not result.data:
-                return None
-            
-            # Aggregate data
-            total_vehicles = sum(d.get('vehicle_count', 0) for d in result.data)
-            total_cars = sum(d.get('car_count', 0) for d in result.data)
-            total_trucks = sum(d.get('truck_count', 0) for d in result.data)
-            total_buses = sum(d.get('bus_count', 0) for d in result.data)
-            total_bikes = sum(d.get('bike_count', 0) for d in result.data)
-            
-            report = {
-                'junction_id': junction_id,
-                'report_type': 'hourly',
-                'report_date': datetime.utcnow().date().isoformat(),
-                'report_hour': datetime.utcnow().hour,
-                'total_vehicles': total_vehicles,
-                'car_percentage': (total_cars / total_vehicles * 100) if total_vehicles > 0 else 0,
-                'truck_percentage': (total_trucks / total_vehicles * 100) if total_vehicles > 0 else 0,
-                'bus_percentage': (total_buses / total_vehicles * 100) if total_vehicles > 0 else 0,
-                'bike_percentage': (total_bikes / total_vehicles * 100) if total_vehicles > 0 else 0,
-                'report_data': json.dumps({
-                    'raw_count': len(result.data),
-                    'peak_count': max(d.get('vehicle_count', 0) for d in result.data)
-                })
-            }
-            
-            # Save report
-            self.client.table('traffic_reports').upsert(report).execute()
-            
-            return report
-            
-        except Exception as e:
-            print(f"Error generating report: {e}")
-            return None
-    
-    def get_reports(self, junction_id: str, report_type: str = 'hourly', 
-                   days: int = 7) -> List[Dict]:
-        """Get traffic reports"""
-        if not self.client:
-            return []
-            
-        try:
-            since = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
-            
-            result = self.client.table('traffic_reports')\
-                .select('*')\
-                .eq('junction_id', junction_id)\
-                .eq('report_type', report_type)\
-                .gte('report_date', since)\
-                .order('report_date', desc=True)\
-                .execute()
-                
-            return result.data
-            
-        except Exception as e:
-            print(f"Error fetching reports: {e}")
-            return []
-
-
-# Export managers for use in Flask app
-traffic_data_manager = TrafficDataManager()
-junction_manager = JunctionManager()
-alert_manager = AlertManager()
-profile_manager = UserProfileManager()
-report_manager = ReportManager()
+"""
+Supabase Database Configuration for Track-V Traffic Management System
+Handles all database operations, authentication, and real-time features
+"""
+
+import atexit
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Tuple
+import json
+
+# Lazy %-style logging instead of print(): error formatting only runs when a
+# handler is enabled, and bursts of DB errors no longer serialise request
+# threads behind CPython's stdout lock
+logger = logging.getLogger(__name__)
+
+# Supabase Python Client
+try:
+    from supabase import create_client, Client
+    SUPABASE_AVAILABLE = True
+except ImportError:
+    SUPABASE_AVAILABLE = False
+    logger.warning("supabase-py not installed. Run: pip install supabase")
+
+# httpx ships with supabase-py; used to tune the PostgREST connection pool
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); multiplexes the many
+# small concurrent PostgREST requests over one connection
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Optional Redis last-value cache for the per-second dashboard polls
+# (same REDIS_URL convention as the junction-state mirror in app.py)
+try:
+    import redis as redis_lib
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+_redis_client = None
+
+
+def _get_redis():
+    """Lazily build the shared Redis client; None when not configured"""
+    global _redis_client
+    if not REDIS_AVAILABLE:
+        return None
+    if _redis_client is None:
+        url = os.environ.get('REDIS_URL')
+        if not url:
+            return None
+        try:
+            _redis_client = redis_lib.Redis.from_url(
+                url, socket_timeout=0.2, decode_responses=True)
+        except Exception as e:
+            logger.warning("Could not connect to Redis: %s", e)
+            return None
+    return _redis_client
+
+
+# orjson parses the wide list responses (traffic_data, alerts) ~3x faster
+# than stdlib json; route every httpx response decode through it
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if HTTPX_AVAILABLE and ORJSON_AVAILABLE:
+    _stdlib_response_json = httpx.Response.json
+
+    def _orjson_response_json(self, **kwargs):
+        if kwargs:  # custom decode options - defer to stdlib
+            return _stdlib_response_json(self, **kwargs)
+        return orjson.loads(self.content)
+
+    httpx.Response.json = _orjson_response_json
+
+
+def _tune_transport(client) -> None:
+    """
+    Replace the PostgREST session with a pooled, keep-alive httpx client
+
+    The default transport is not tuned for Flask's threaded server: without
+    generous keep-alive limits, concurrent request threads pay a fresh
+    TCP+TLS handshake against Supabase. The replacement keeps the original
+    session's base_url and headers and adds connect retries for transient
+    drops of pooled connections.
+    """
+    if not HTTPX_AVAILABLE or client is None:
+        return
+    try:
+        # Size the pool to the deployment: effective Supabase concurrency
+        # is capped by gunicorn's worker_connections per worker, so
+        # deployments that raise that should raise SUPABASE_POOL_SIZE
+        # with it rather than queueing on the transport
+        pool_size = int(os.environ.get('SUPABASE_POOL_SIZE', 60))
+        old_session = client.postgrest.session
+        client.postgrest.session = httpx.Client(
+            base_url=old_session.base_url,
+            headers=old_session.headers,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            # limits and http2 must go on the transport - an explicit
+            # transport overrides both Client-level settings
+            transport=httpx.HTTPTransport(
+                retries=2,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=max(pool_size * 2 // 3, 1),
+                    keepalive_expiry=60,
+                ),
+            ),
+        )
+        logger.debug("Supabase transport pool sized to %d connections "
+                     "(SUPABASE_POOL_SIZE)", pool_size)
+    except Exception as e:
+        # Supabase client internals changed - keep the default transport
+        logger.warning("Could not tune Supabase transport: %s", e)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_client(url: str, key: str) -> 'Client':
+    """
+    Build and tune a Supabase client, exactly once per (url, key)
+
+    lru_cache is thread-safe, unlike the previous lazy `if self.client is
+    None` check which could race two Flask threads into building two
+    clients (and two httpx connection pools) for the same key.
+    """
+    client = create_client(url, key)
+    _tune_transport(client)
+    return client
+
+
+class SupabaseConfig:
+    """Supabase configuration and client management"""
+
+    def __init__(self):
+        self.url = os.environ.get('SUPABASE_URL')
+        self.anon_key = os.environ.get('SUPABASE_ANON_KEY')
+        self.service_role_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+
+        if not all([self.url, self.anon_key]):
+            logger.warning("Supabase credentials not configured - set SUPABASE_URL and SUPABASE_ANON_KEY")
+
+    def get_client(self) -> Optional[Client]:
+        """Get Supabase client for authenticated requests"""
+        if not SUPABASE_AVAILABLE or not (self.url and self.anon_key):
+            return None
+        return _build_client(self.url, self.anon_key)
+
+    def get_admin_client(self) -> Optional[Client]:
+        """Get Supabase admin client (service role) for backend operations"""
+        if not SUPABASE_AVAILABLE or not (self.url and self.service_role_key):
+            return None
+        return _build_client(self.url, self.service_role_key)
+
+
+# Global Supabase instance
+supabase_config = SupabaseConfig()
+
+
+def make_auth_client() -> Optional[Client]:
+    """
+    Build a fresh, unshared client for auth flows
+
+    sign_up/sign_in_with_password mutate the client's auth state, so auth
+    endpoints must not run them on the shared memoised client - two
+    concurrent logins would race on the same session. Deliberately not
+    cached; transport tuning is skipped since the client serves one
+    request.
+    """
+    if not SUPABASE_AVAILABLE or not (supabase_config.url and supabase_config.anon_key):
+        return None
+    return create_client(supabase_config.url, supabase_config.anon_key)
+
+
+class TrafficDataManager:
+    """Manage traffic data storage and retrieval from Supabase"""
+
+    FLUSH_INTERVAL = 2.0    # seconds between background flushes
+    FLUSH_THRESHOLD = 200   # buffered rows that trigger an immediate flush
+    MAX_BUFFERED_ROWS = 2000  # drop rows instead of re-queueing past this
+    LATEST_CACHE_TTL = 60   # seconds a last-value entry lives in Redis
+
+    def __init__(self):
+        # Buffered writes: every camera tick was one PostgREST round-trip
+        # (HTTP + TLS + JSON per row). Rows now accumulate per
+        # (junction_id, camera_index) and go out as one bulk insert when the
+        # buffer hits FLUSH_THRESHOLD or every FLUSH_INTERVAL seconds.
+        self._buf: Dict[Tuple[str, int], List[Dict]] = defaultdict(list)
+        self._buf_count = 0
+        self._buf_lock = threading.Lock()
+        # Wakes the flusher early when the size threshold is hit, so the
+        # PostgREST call always runs on the background thread and never in
+        # a Flask request thread. Started lazily (see _ensure_flush_thread):
+        # this singleton is built at import time, which under gunicorn's
+        # preload_app happens in the master - a thread started there would
+        # not survive the fork and rows would buffer forever in the workers.
+        self._flush_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def _ensure_flush_thread(self) -> None:
+        """Start the background flusher in the current process if needed
+
+        Called on every enqueue; is_alive() is False both before the first
+        start and in a freshly forked gunicorn worker (only the forking
+        thread survives a fork), so each serving process gets its own
+        flusher no matter where the module was first imported.
+        """
+        t = self._flush_thread
+        if t is not None and t.is_alive():
+            return
+        with self._buf_lock:
+            t = self._flush_thread
+            if t is None or not t.is_alive():
+                t = threading.Thread(
+                    target=self._flush_loop, daemon=True, name='traffic-data-flush')
+                self._flush_thread = t
+                t.start()
+
+    @property
+    def client(self):
+        """Resolve the shared client on demand (memoised, O(1) lookup)"""
+        return supabase_config.get_admin_client() or supabase_config.get_client()
+
+    def _flush_loop(self):
+        """Background flusher: drain the buffer every FLUSH_INTERVAL seconds
+        or as soon as the size threshold wakes it"""
+        while True:
+            self._flush_event.wait(self.FLUSH_INTERVAL)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Flush all buffered traffic rows as a single bulk insert"""
+        with self._buf_lock:
+            if not self._buf_count:
+                return
+            rows = [row for batch in self._buf.values() for row in batch]
+            self._buf.clear()
+            self._buf_count = 0
+
+        if not self.client:
+            return
+
+        # One timestamp per batch instead of one strftime per record; rows
+        # that already carry a timestamp keep it
+        ts = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            row.setdefault('timestamp', ts)
+
+        try:
+            # return=minimal: skip the RETURNING * payload - nobody reads
+            # the inserted rows back
+            self.client.table('traffic_data').insert(rows, returning='minimal').execute()
+        except Exception as e:
+            logger.exception("Error saving traffic data batch (%d rows)", len(rows))
+            # Re-queue on transient failure so the next flush retries, but
+            # never let the buffer grow without bound while Supabase is down
+            with self._buf_lock:
+                if self._buf_count + len(rows) <= self.MAX_BUFFERED_ROWS:
+                    for row in rows:
+                        self._buf[(row['junction_id'], row['camera_index'])].append(row)
+                    self._buf_count += len(rows)
+                else:
+                    logger.warning("Dropping %d traffic rows (buffer full)", len(rows))
+
+    def save_traffic_data(self, junction_id: str, camera_index: int, data: Dict) -> bool:
+        """
+        Queue real-time traffic data for batched insert to Supabase
+
+        Rows are buffered in-process and flushed in bulk (see flush), so
+        this returns as soon as the record is queued.
+
+        Args:
+            junction_id: UUID of the junction
+            camera_index: Camera index (0-3)
+            data: Traffic metrics dictionary
+        """
+        if not self.client:
+            return False
+
+        try:
+            record = {
+                'junction_id': junction_id,
+                'camera_index': camera_index,
+                'vehicle_count': data.get('total_count', 0),
+                'car_count': data.get('car_count', 0),
+                'truck_count': data.get('truck_count', 0),
+                'bus_count': data.get('bus_count', 0),
+                'bike_count': data.get('bike_count', 0),
+                'congestion_level': data.get('congestion_level', 'low'),
+                'signal_state': data.get('signal_state', 'RED'),
+                'green_time_remaining': data.get('green_time', 0),
+                'average_speed': data.get('average_speed'),
+            }
+
+            self._ensure_flush_thread()
+            with self._buf_lock:
+                self._buf[(junction_id, camera_index)].append(record)
+                self._buf_count += 1
+                should_flush = self._buf_count >= self.FLUSH_THRESHOLD
+            if should_flush:
+                self._flush_event.set()
+
+            # Write-through last-value cache: the dashboards polling
+            # "latest" every second hit Redis (<1 ms) instead of PostgREST
+            r = _get_redis()
+            if r is not None:
+                try:
+                    cached = dict(record)
+                    cached['timestamp'] = datetime.now(timezone.utc).isoformat()
+                    r.setex(f'latest:{junction_id}:{camera_index}',
+                            self.LATEST_CACHE_TTL, json.dumps(cached))
+                except Exception:
+                    pass  # Redis down - rows still reach Supabase
+            return True
+
+        except Exception as e:
+            logger.exception("Error saving traffic data")
+            return False
+
+    def save_traffic_data_async(self, junction_id: str, camera_index: int, data: Dict) -> bool:
+        """
+        Queue traffic data without ever blocking the caller
+
+        Returns False when the buffer is at capacity (Supabase down or
+        falling behind) so HTTP handlers can answer 503 instead of
+        queueing work that would be dropped.
+        """
+        with self._buf_lock:
+            if self._buf_count >= self.MAX_BUFFERED_ROWS:
+                return False
+        return self.save_traffic_data(junction_id, camera_index, data)
+    
+    def get_latest_traffic_data(self, junction_id: str, camera_index: Optional[int] = None) -> List[Dict]:
+        """Get latest traffic data for a junction"""
+        # Serve from the Redis last-value cache when populated; fall
+        # through to Supabase when Redis is absent, down, or cold
+        r = _get_redis()
+        if r is not None:
+            try:
+                if camera_index is not None:
+                    keys = [f'latest:{junction_id}:{camera_index}']
+                else:
+                    keys = r.keys(f'latest:{junction_id}:*')
+                vals = r.mget(keys) if keys else []
+                rows = [json.loads(v) for v in vals if v]
+                if rows:
+                    return rows
+            except Exception:
+                pass
+
+        if not self.client:
+            return []
+
+        try:
+            # Only the columns the dashboards render - select('*') shipped
+            # every table column per row on a once-per-second poll
+            query = self.client.table('traffic_data')\
+                .select('timestamp,camera_index,vehicle_count,congestion_level,'
+                        'signal_state,green_time_remaining')\
+                .eq('junction_id', junction_id)\
+                .order('timestamp', desc=True)\
+                .limit(10)
+            
+            if camera_index is not None:
+                query = query.eq('camera_index', camera_index)
+                
+            result = query.execute()
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching traffic data")
+            return []
+
+    def get_latest_from_cache(self, pairs: List[Tuple[str, int]]) -> Optional[Dict[Tuple[str, int], Dict]]:
+        """
+        Latest traffic rows from the Redis last-value cache, no database
+
+        The ingest path write-throughs every saved row to
+        latest:{junction_id}:{camera_index}, so when Redis is up and every
+        requested key is warm this answers the whole map from one MGET.
+        Returns None when Redis is absent or any key is cold (idle camera,
+        expired TTL) so the caller falls back to the database - a partial
+        answer would silently hide rows older than the cache TTL.
+        """
+        if not pairs:
+            return None
+        r = _get_redis()
+        if r is None:
+            return None
+        try:
+            vals = r.mget([f'latest:{j}:{c}' for j, c in pairs])
+            if not all(vals):
+                return None
+            return {pair: json.loads(v) for pair, v in zip(pairs, vals)}
+        except Exception:
+            return None
+
+    def get_latest_traffic_data_bulk(self, junction_ids: List[str]) -> Dict[Tuple[str, int], Dict]:
+        """
+        Latest traffic row per (junction_id, camera_index), one round trip
+
+        Returns a lookup dict so callers rendering many junctions (the
+        map view) do a single query instead of one per camera. Prefers
+        the latest_traffic_bulk() DISTINCT ON function from
+        supabase_functions.sql; falls back to one recent-rows query
+        reduced client-side when the function is not installed.
+        """
+        if not junction_ids or not self.client:
+            return {}
+
+        try:
+            result = self.client.rpc('latest_traffic_bulk', {'jids': junction_ids}).execute()
+            return {(row['junction_id'], row['camera_index']): row
+                    for row in result.data or []}
+        except Exception:
+            logger.warning(
+                "latest_traffic_bulk() RPC unavailable, falling back to "
+                "recent-rows scan (run supabase_functions.sql to fix)"
+            )
+
+        try:
+            # Fallback: grab a recent window across all junctions in one
+            # query and keep the newest row per key. The window is a
+            # heuristic - with per-second ingest it comfortably covers
+            # every active camera's latest row.
+            result = self.client.table('traffic_data')\
+                .select('junction_id,timestamp,camera_index,vehicle_count,'
+                        'congestion_level,signal_state,green_time_remaining')\
+                .in_('junction_id', junction_ids)\
+                .order('timestamp', desc=True)\
+                .limit(min(50 * len(junction_ids), 1000))\
+                .execute()
+            latest: Dict[Tuple[str, int], Dict] = {}
+            for row in result.data or []:
+                key = (row['junction_id'], row['camera_index'])
+                if key not in latest:  # rows arrive newest-first
+                    latest[key] = row
+            return latest
+
+        except Exception as e:
+            logger.exception("Error bulk-fetching latest traffic data")
+            return {}
+
+    def iter_traffic_history(self, junction_id: str, hours: int = 24, page_size: int = 1000):
+        """
+        Yield traffic history rows in bounded pages
+
+        Generator counterpart to get_traffic_history for streaming
+        responses: fetches page_size rows per PostgREST call, so memory per
+        consumer stays O(page_size) however long the history is.
+        """
+        if not self.client:
+            return
+
+        since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+        offset = 0
+        while True:
+            try:
+                chunk = self.client.table('traffic_data')\
+                    .select('timestamp,camera_index,vehicle_count,congestion_level,'
+                            'signal_state,green_time_remaining')\
+                    .eq('junction_id', junction_id)\
+                    .gte('timestamp', since)\
+                    .order('timestamp', desc=True)\
+                    .range(offset, offset + page_size - 1)\
+                    .execute()
+            except Exception as e:
+                logger.exception("Error streaming traffic history")
+                return
+            if not chunk.data:
+                return
+            yield from chunk.data
+            if len(chunk.data) < page_size:
+                return
+            offset += page_size
+
+    def get_traffic_history(self, junction_id: str, hours: int = 24) -> List[Dict]:
+        """Get traffic history for the past N hours"""
+        if not self.client:
+            return []
+            
+        try:
+            since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+            
+            result = self.client.table('traffic_data')\
+                .select('*')\
+                .eq('junction_id', junction_id)\
+                .gte('timestamp', since)\
+                .order('timestamp', desc=True)\
+                .execute()
+                
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching traffic history")
+            return []
+
+
+class JunctionManager:
+    """Manage junction data in Supabase"""
+
+    # Junction/inspector data changes on the order of minutes, but the
+    # lookups run on every alert and map/dashboard hit - cache reads
+    # in-process for a short TTL and invalidate on mutation
+    CACHE_TTL = float(os.environ.get('JUNCTION_CACHE_TTL', 60))
+    DASHBOARD_TTL = 5.0  # snapshot staleness budget for concurrent loads
+    _ALL_KEY = '__all__'
+    _DASHBOARD_KEY = '__dashboard__'
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._cache_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Resolve the shared client on demand (memoised, O(1) lookup)"""
+        return supabase_config.get_admin_client() or supabase_config.get_client()
+
+    def _cache_get(self, key: str) -> Optional[Any]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    return entry[1]
+                del self._cache[key]
+        return None
+
+    def _cache_put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + (ttl or self.CACHE_TTL), value)
+
+    # Default projection for callers that need the full junction record
+    _ALL_COLUMNS = '*, cameras(id,camera_index,name,source_type,source_url,is_active)'
+
+    def invalidate(self, junction_id: Optional[str] = None) -> None:
+        """Drop cached junction data after a mutation"""
+        with self._cache_lock:
+            if junction_id is not None:
+                self._cache.pop(junction_id, None)
+            # One cache entry per projection - drop them all
+            for key in [k for k in self._cache if k.startswith(self._ALL_KEY)]:
+                del self._cache[key]
+
+    def get_all_junctions(self, columns: Optional[str] = None) -> List[Dict]:
+        """
+        Get all junctions with their details (cached for CACHE_TTL)
+
+        Pass an explicit PostgREST projection (e.g.
+        'id,name,cameras(camera_index)') to transfer only the columns a
+        view actually renders; the default returns the full record.
+        Results are cached per projection.
+        """
+        if not self.client:
+            return []
+
+        columns = columns or self._ALL_COLUMNS
+        cache_key = f'{self._ALL_KEY}:{columns}'
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            result = self.client.table('junctions')\
+                .select(columns)\
+                .eq('status', 'active')\
+                .execute()
+            self._cache_put(cache_key, result.data)
+            return result.data
+
+        except Exception as e:
+            logger.exception("Error fetching junctions")
+            return []
+
+    def get_map_payload(self) -> Optional[List[Dict]]:
+        """
+        Whole map payload in one round trip
+
+        Calls the map_data() function from supabase_functions.sql, which
+        aggregates junctions, cameras and each camera's latest traffic
+        row server-side. Returns None when the function is not installed
+        so the route can fall back to assembling the payload itself.
+        """
+        if not self.client:
+            return None
+
+        try:
+            result = self.client.rpc('map_data').execute()
+            return result.data
+        except Exception:
+            logger.warning(
+                "map_data() RPC unavailable, assembling map payload "
+                "client-side (run supabase_functions.sql to fix)"
+            )
+            return None
+
+    def get_dashboard(self) -> List[Dict]:
+        """
+        Get active junctions with latest traffic row and open-alert count
+
+        Reads the dashboard_snapshot view (see supabase_functions.sql) -
+        one query for the whole dashboard instead of one junctions request
+        plus a traffic and an alerts request per junction. Cached briefly
+        so concurrent page loads share the result. Falls back to the plain
+        junction list (no latest/open_alerts fields) when the view is not
+        installed.
+        """
+        if not self.client:
+            return []
+
+        cached = self._cache_get(self._DASHBOARD_KEY)
+        if cached is not None:
+            return cached
+
+        try:
+            result = self.client.table('dashboard_snapshot').select('*').execute()
+            self._cache_put(self._DASHBOARD_KEY, result.data, ttl=self.DASHBOARD_TTL)
+            return result.data
+        except Exception as e:
+            logger.exception("Error fetching dashboard snapshot")
+            return self.get_all_junctions()
+
+    def get_junction_by_id(self, junction_id: str) -> Optional[Dict]:
+        """Get a specific junction (cached for CACHE_TTL)"""
+        if not self.client:
+            return None
+
+        cached = self._cache_get(junction_id)
+        if cached is not None:
+            return cached
+
+        try:
+            result = self.client.table('junctions')\
+                .select('*, cameras(id,camera_index,name,source_type,source_url,is_active)')\
+                .eq('id', junction_id)\
+                .single()\
+                .execute()
+            if result.data:
+                self._cache_put(junction_id, result.data)
+            return result.data
+
+        except Exception as e:
+            logger.exception("Error fetching junction")
+            return None
+
+    def update_camera_source(self, junction_id: str, camera_index: int,
+                             source_type: str, source_url: str) -> bool:
+        """Update camera video source"""
+        if not self.client:
+            return False
+
+        try:
+            self.client.table('cameras')\
+                .update({
+                    'source_type': source_type,
+                    'source_url': source_url,
+                    'is_active': True,
+                    # Postgres evaluates now() server-side - no client
+                    # datetime formatting, matches acknowledge_alert
+                    'last_active': 'now()'
+                }, returning='minimal')\
+                .eq('junction_id', junction_id)\
+                .eq('camera_index', camera_index)\
+                .execute()
+            self.invalidate(junction_id)
+            return True
+
+        except Exception as e:
+            logger.exception("Error updating camera")
+            return False
+
+
+class AlertManager:
+    """Manage traffic alerts and email notifications"""
+
+    @property
+    def client(self):
+        """Resolve the shared client on demand (memoised, O(1) lookup)"""
+        return supabase_config.get_admin_client() or supabase_config.get_client()
+
+
+    def create_alert(self, junction_id: str, alert_data: Dict, user_id: Optional[str] = None,
+                     junction: Optional[Dict] = None, mark_email_sent: bool = False) -> Optional[str]:
+        """
+        Create a new traffic alert
+
+        Args:
+            junction_id: Junction UUID
+            alert_data: Alert details (type, severity, title, description, camera_index)
+            user_id: ID of user creating the alert
+            junction: Pre-fetched junction row - skips the internal
+                inspector-email lookup when the caller already has it
+            mark_email_sent: Set email_sent in the same round-trip (the
+                caller is about to queue the notification email)
+
+        Returns:
+            Alert ID if successful
+        """
+        if not self.client:
+            return None
+
+        try:
+            if junction is None:
+                # Get junction to find inspector email
+                result = self.client.table('junctions')\
+                    .select('inspector_email, inspector_name')\
+                    .eq('id', junction_id)\
+                    .single()\
+                    .execute()
+                junction = result.data
+
+            inspector_email = junction.get('inspector_email') if junction else None
+
+            record = {
+                'junction_id': junction_id,
+                'camera_index': alert_data.get('camera_index'),
+                'alert_type': alert_data.get('type', 'manual'),
+                'severity': alert_data.get('severity', 'medium'),
+                'title': alert_data.get('title', 'Traffic Alert'),
+                'description': alert_data.get('description', ''),
+                'sent_to_email': inspector_email,
+                'created_by': user_id,
+            }
+
+            # Insert + mark-sent in one statement via the SQL function (see
+            # supabase_functions.sql); fall back to INSERT then UPDATE when
+            # the function is not installed
+            if mark_email_sent:
+                try:
+                    result = self.client.rpc('create_alert_and_mark_sent', {
+                        'p_junction_id': junction_id,
+                        'p_camera_index': record['camera_index'],
+                        'p_alert_type': record['alert_type'],
+                        'p_severity': record['severity'],
+                        'p_title': record['title'],
+                        'p_description': record['description'],
+                        'p_sent_to_email': inspector_email,
+                        'p_created_by': user_id,
+                        'p_mark_sent': True,
+                    }).execute()
+                    if result.data:
+                        return result.data
+                except Exception:
+                    pass  # Function not installed - two-step path below
+
+            result = self.client.table('alerts').insert(record).execute()
+
+            if result.data:
+                alert_id = result.data[0].get('id')
+                if alert_id and mark_email_sent:
+                    self.mark_email_sent(alert_id)
+                return alert_id
+            return None
+
+        except Exception as e:
+            logger.exception("Error creating alert")
+            return None
+    
+    def mark_email_sent(self, alert_id: str) -> bool:
+        """Mark alert email as sent"""
+        if not self.client:
+            return False
+            
+        try:
+            self.client.table('alerts')\
+                .update({
+                    'email_sent': True,
+                    'email_sent_at': 'now()'
+                }, returning='minimal')\
+                .eq('id', alert_id)\
+                .execute()
+            return True
+            
+        except Exception as e:
+            logger.exception("Error updating alert")
+            return False
+    
+    def get_pending_alerts(self) -> List[Dict]:
+        """Get alerts that need email sending"""
+        if not self.client:
+            return []
+            
+        try:
+            result = self.client.table('alerts')\
+                .select('*, junctions(name, inspector_email, inspector_name)')\
+                .eq('email_sent', False)\
+                .not_.is_('sent_to_email', 'null')\
+                .execute()
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching pending alerts")
+            return []
+
+    def claim_pending_alerts(self, n: int = 100) -> List[Dict]:
+        """
+        Atomically claim up to n pending alerts for email delivery
+
+        One claim_pending_alerts() RPC marks the alerts as sent and
+        returns them in a single statement (FOR UPDATE SKIP LOCKED),
+        so concurrent workers never email the same alert twice. Falls
+        back to the non-atomic fetch-then-mark path when the SQL
+        function from supabase_functions.sql is not installed; the
+        caller should still send the emails either way.
+        """
+        if not self.client:
+            return []
+
+        try:
+            result = self.client.rpc('claim_pending_alerts', {'n': n}).execute()
+            return result.data or []
+        except Exception:
+            logger.warning(
+                "claim_pending_alerts() RPC unavailable, falling back to "
+                "fetch-then-mark (run supabase_functions.sql to fix)"
+            )
+
+        alerts = self.get_pending_alerts()[:n]
+        for alert in alerts:
+            self.mark_email_sent(alert['id'])
+        return alerts
+
+    def get_junction_alerts(self, junction_id: str, limit: int = 50) -> List[Dict]:
+        """Get alerts for a specific junction"""
+        if not self.client:
+            return []
+            
+        try:
+            result = self.client.table('alerts')\
+                .select('id,title,description,severity,alert_type,camera_index,'
+                        'created_at,acknowledged')\
+                .eq('junction_id', junction_id)\
+                .order('created_at', desc=True)\
+                .limit(limit)\
+                .execute()
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching alerts")
+            return []
+
+
+# Profile fields clients may update, hoisted so update_profile does one
+# C-level set intersection instead of rebuilding a list per call
+_PROFILE_ALLOWED = frozenset({
+    'full_name', 'badge_number', 'phone', 'department',
+    'avatar_url', 'email_alerts_enabled', 'dark_mode',
+})
+
+
+# The two settings booleans, used to decide when a profile update must
+# invalidate the settings cache
+_SETTINGS_FIELDS = frozenset({'dark_mode', 'email_alerts_enabled'})
+
+
+class UserProfileManager:
+    """Manage user profiles in Supabase"""
+
+    # Settings are read on every X-User-ID request (alert creation checks
+    # email_alerts_enabled, the dashboard polls GET /profile/settings) but
+    # change only when the user flips a toggle - cache per user in-process.
+    # Missing profiles are cached briefly too, so repeated requests for an
+    # unknown user don't hammer Supabase with 404 lookups.
+    SETTINGS_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', 300))
+    SETTINGS_NEGATIVE_TTL = 30.0
+
+    def __init__(self):
+        self._settings_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._settings_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Resolve the shared client on demand (memoised, O(1) lookup)"""
+        return supabase_config.get_client()
+        
+    def get_profile(self, user_id: str) -> Optional[Dict]:
+        """Get user profile"""
+        if not self.client:
+            return None
+            
+        try:
+            result = self.client.table('profiles')\
+                .select('*')\
+                .eq('id', user_id)\
+                .single()\
+                .execute()
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching profile")
+            return None
+    
+    def update_profile(self, user_id: str, updates: Dict) -> bool:
+        """
+        Update user profile
+        
+        Args:
+            user_id: User UUID
+            updates: Fields to update (full_name, badge_number, phone, etc.)
+        """
+        if not self.client:
+            return False
+            
+        # Only allow specific fields to be updated
+        safe_updates = {k: updates[k] for k in updates.keys() & _PROFILE_ALLOWED}
+        
+        if not safe_updates:
+            return False
+            
+        try:
+            self.client.table('profiles')\
+                .update(safe_updates, returning='minimal')\
+                .eq('id', user_id)\
+                .execute()
+            # Drop the cached settings when either toggle changed
+            if not _SETTINGS_FIELDS.isdisjoint(safe_updates):
+                with self._settings_lock:
+                    self._settings_cache.pop(user_id, None)
+            return True
+
+        except Exception as e:
+            logger.exception("Error updating profile")
+            return False
+    
+    def get_user_settings(self, user_id: str) -> Dict:
+        """Get user settings (dark mode, email alerts), cached per user"""
+        with self._settings_lock:
+            entry = self._settings_cache.get(user_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    return entry[1]
+                del self._settings_cache[user_id]
+
+        defaults = {'dark_mode': False, 'email_alerts_enabled': True}
+        if not self.client:
+            return defaults
+
+        # Specialised two-column read - the full profile (avatar_url etc.)
+        # is not needed just to check two booleans
+        try:
+            result = self.client.table('profiles')\
+                .select('dark_mode,email_alerts_enabled')\
+                .eq('id', user_id)\
+                .single()\
+                .execute()
+            if result.data:
+                settings = {
+                    'dark_mode': result.data.get('dark_mode', False),
+                    'email_alerts_enabled': result.data.get('email_alerts_enabled', True)
+                }
+                ttl = self.SETTINGS_TTL
+            else:
+                settings = defaults
+                ttl = self.SETTINGS_NEGATIVE_TTL
+            with self._settings_lock:
+                self._settings_cache[user_id] = (time.monotonic() + ttl, settings)
+            return settings
+        except Exception as e:
+            logger.exception("Error fetching settings")
+            return defaults
+
+
+class ReportManager:
+    """Manage traffic reports"""
+
+    @property
+    def client(self):
+        """Resolve the shared client on demand (memoised, O(1) lookup)"""
+        return supabase_config.get_admin_client() or supabase_config.get_client()
+
+
+    def _hourly_aggregate(self, junction_id: str) -> Optional[Dict]:
+        """
+        Get the past hour's aggregate scalars for a junction
+
+        Prefers the hourly_traffic_agg Postgres function (see
+        supabase_functions.sql): one round-trip returning one row instead
+        of transferring every raw traffic_data row just to sum it here.
+        Falls back to client-side aggregation when the function is not
+        installed.
+        """
+        try:
+            result = self.client.rpc('hourly_traffic_agg', {'j': junction_id}).execute()
+            if result.data:
+                return result.data[0] if isinstance(result.data, list) else result.data
+        except Exception:
+            pass  # Function not installed - caller falls back to client-side
+        return None
+
+    def _hourly_aggregate_fallback(self, junction_id: str) -> Optional[Dict]:
+        """Client-side aggregation over raw rows (pre-RPC behaviour)"""
+        one_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+
+        result = self.client.table('traffic_data')\
+            .select('vehicle_count,car_count,truck_count,bus_count,bike_count')\
+            .eq('junction_id', junction_id)\
+            .gte('timestamp', one_hour_ago)\
+            .execute()
+
+        if not result.data:
+            return None
+
+        # One pass over the rows instead of six generator sweeps
+        total_vehicles = total_cars = total_trucks = 0
+        total_buses = total_bikes = peak = 0
+        for d in result.data:
+            v = d.get('vehicle_count', 0)
+            total_vehicles += v
+            if v > peak:
+                peak = v
+            total_cars += d.get('car_count', 0)
+            total_trucks += d.get('truck_count', 0)
+            total_buses += d.get('bus_count', 0)
+            total_bikes += d.get('bike_count', 0)
+
+        return {
+            'total_vehicles': total_vehicles,
+            'total_cars': total_cars,
+            'total_trucks': total_trucks,
+            'total_buses': total_buses,
+            'total_bikes': total_bikes,
+            'peak_count': peak,
+            'raw_count': len(result.data),
+        }
+
+    def generate_hourly_report(self, junction_id: str) -> Optional[Dict]:
+        """Generate hourly traffic report from aggregated data"""
+        if not self.client:
+            return None
+
+        try:
+            agg = self._hourly_aggregate(junction_id)
+            if agg is None:
+                agg = self._hourly_aggregate_fallback(junction_id)
+            if not agg or not agg.get('raw_count'):
+                return None
+
+            total_vehicles = agg.get('total_vehicles', 0)
+            # One reciprocal shared by the four percentages, zero-guarded
+            inv = 100.0 / total_vehicles if total_vehicles else 0.0
+            now = datetime.now(timezone.utc)
+
+            report = {
+                'junction_id': junction_id,
+                'report_type': 'hourly',
+                'report_date': now.date().isoformat(),
+                'report_hour': now.hour,
+                'total_vehicles': total_vehicles,
+                'car_percentage': agg.get('total_cars', 0) * inv,
+                'truck_percentage': agg.get('total_trucks', 0) * inv,
+                'bus_percentage': agg.get('total_buses', 0) * inv,
+                'bike_percentage': agg.get('total_bikes', 0) * inv,
+                'report_data': json.dumps({
+                    'raw_count': agg.get('raw_count', 0),
+                    'peak_count': agg.get('peak_count', 0)
+                })
+            }
+
+            # Save report
+            self.client.table('traffic_reports').upsert(report, returning='minimal').execute()
+
+            return report
+
+        except Exception as e:
+            logger.exception("Error generating report")
+            return None
+    
+    def get_reports(self, junction_id: str, report_type: str = 'hourly', 
+                   days: int = 7) -> List[Dict]:
+        """Get traffic reports"""
+        if not self.client:
+            return []
+            
+        try:
+            since = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+            
+            result = self.client.table('traffic_reports')\
+                .select('*')\
+                .eq('junction_id', junction_id)\
+                .eq('report_type', report_type)\
+                .gte('report_date', since)\
+                .order('report_date', desc=True)\
+                .execute()
+                
+            return result.data
+            
+        except Exception as e:
+            logger.exception("Error fetching reports")
+            return []
+
+    def get_reports_page(self, junction_id: str, report_type: str = 'hourly',
+                         days: int = 7, cursor: Optional[str] = None,
+                         limit: int = 200) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Keyset-paged reports: one bounded page plus a cursor
+
+        Orders by created_at DESC and resumes below the cursor, so deep
+        pages cost the same index probe as the first (no OFFSET scans).
+        Fetches limit+1 rows to detect whether another page exists;
+        returns (rows, next_cursor) with next_cursor None on the last
+        page.
+        """
+        if not self.client:
+            return [], None
+
+        try:
+            since = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+            query = self.client.table('traffic_reports')\
+                .select('*')\
+                .eq('junction_id', junction_id)\
+                .eq('report_type', report_type)\
+                .gte('report_date', since)\
+                .order('created_at', desc=True)\
+                .limit(limit + 1)
+            if cursor:
+                query = query.lt('created_at', cursor)
+
+            rows = query.execute().data or []
+            next_cursor = rows[limit - 1]['created_at'] if len(rows) > limit else None
+            return rows[:limit], next_cursor
+
+        except Exception as e:
+            logger.exception("Error fetching report page")
+            return [], None
+
+    def iter_reports(self, junction_id: str, report_type: str = 'hourly',
+                     days: int = 7, page_size: int = 1000):
+        """
+        Yield reports in bounded pages
+
+        Generator counterpart to get_reports for streaming downloads:
+        fetches page_size rows per PostgREST call, so memory per consumer
+        stays O(page_size) however long the export window is.
+        """
+        if not self.client:
+            return
+
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+        offset = 0
+        while True:
+            try:
+                chunk = self.client.table('traffic_reports')\
+                    .select('*')\
+                    .eq('junction_id', junction_id)\
+                    .eq('report_type', report_type)\
+                    .gte('report_date', since)\
+                    .order('report_date', desc=True)\
+                    .range(offset, offset + page_size - 1)\
+                    .execute()
+            except Exception as e:
+                logger.exception("Error streaming reports")
+                return
+            if not chunk.data:
+                return
+            yield from chunk.data
+            if len(chunk.data) < page_size:
+                return
+            offset += page_size
+
+
+# Export managers for use in Flask app
+traffic_data_manager = TrafficDataManager()
+junction_manager = JunctionManager()
+alert_manager = AlertManager()
+profile_manager = UserProfileManager()
+report_manager = ReportManager()
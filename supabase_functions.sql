@@ -0,0 +1,197 @@
+-- =============================================
+-- Track-V: Performance helpers for Supabase
+-- =============================================
+-- Run this in the Supabase SQL Editor (like supabase_schema.sql).
+-- The Python managers call these via .rpc(...) and fall back to
+-- client-side queries when a function is missing, so applying this
+-- file is optional but strongly recommended for busy junctions.
+
+-- Compound indexes matching the query shapes the managers issue.
+-- (Plain CREATE INDEX rather than CONCURRENTLY: the SQL Editor runs
+-- statements inside a transaction, and these tables are small when the
+-- schema is first applied. On an already-large production table, run
+-- the CONCURRENTLY variants from psql instead.)
+
+-- get_latest_traffic_data / get_traffic_history / hourly_traffic_agg:
+-- filter by junction_id, range/sort on timestamp DESC
+CREATE INDEX IF NOT EXISTS idx_traffic_data_junction_ts
+    ON traffic_data (junction_id, timestamp DESC);
+
+-- Covering index for the hottest lookup of all: latest row per
+-- (junction_id, camera_index), as issued by latest_traffic_bulk() /
+-- map_data() / get_latest_traffic_data. The key makes each lookup a
+-- single ordered index probe instead of a sort, and INCLUDE carries
+-- the columns those paths select so the heap is never touched.
+CREATE INDEX IF NOT EXISTS idx_traffic_latest
+    ON traffic_data (junction_id, camera_index, timestamp DESC)
+    INCLUDE (vehicle_count, congestion_level, signal_state,
+             green_time_remaining);
+
+-- get_pending_alerts: partial index matching its exact predicate
+CREATE INDEX IF NOT EXISTS idx_alerts_pending
+    ON alerts (email_sent)
+    WHERE email_sent = false AND sent_to_email IS NOT NULL;
+
+-- get_junction_alerts: newest alerts per junction
+CREATE INDEX IF NOT EXISTS idx_alerts_junction_created
+    ON alerts (junction_id, created_at DESC);
+
+-- get_reports: filter by junction + type, range/sort on report_date
+CREATE INDEX IF NOT EXISTS idx_reports_j_type_date
+    ON traffic_reports (junction_id, report_type, report_date DESC);
+
+-- One-query dashboard payload: active junctions with their latest
+-- traffic row and open-alert count embedded, replacing the 1 + 2N
+-- requests the dashboard otherwise makes (junctions, then traffic and
+-- alerts per junction).
+CREATE OR REPLACE VIEW dashboard_snapshot AS
+SELECT
+    j.*,
+    (
+        SELECT row_to_json(t)
+        FROM traffic_data t
+        WHERE t.junction_id = j.id
+        ORDER BY t.timestamp DESC
+        LIMIT 1
+    ) AS latest,
+    (
+        SELECT count(*)
+        FROM alerts a
+        WHERE a.junction_id = j.id
+          AND a.acknowledged = false
+    ) AS open_alerts
+FROM junctions j
+WHERE j.status = 'active';
+
+-- Insert an alert and optionally mark its email as sent in the same
+-- statement, so the POST /alerts path does one round-trip instead of
+-- INSERT followed by UPDATE.
+CREATE OR REPLACE FUNCTION create_alert_and_mark_sent(
+    p_junction_id uuid,
+    p_camera_index int,
+    p_alert_type text,
+    p_severity text,
+    p_title text,
+    p_description text,
+    p_sent_to_email text,
+    p_created_by uuid,
+    p_mark_sent boolean
+)
+RETURNS uuid
+LANGUAGE sql AS $$
+    INSERT INTO alerts (
+        junction_id, camera_index, alert_type, severity, title,
+        description, sent_to_email, created_by, email_sent, email_sent_at
+    )
+    VALUES (
+        p_junction_id, p_camera_index, p_alert_type, p_severity, p_title,
+        p_description, p_sent_to_email, p_created_by, p_mark_sent,
+        CASE WHEN p_mark_sent THEN now() END
+    )
+    RETURNING id;
+$$;
+
+-- Whole /map/data payload in one round trip: active junctions with
+-- their cameras, each camera embedding its latest traffic row via a
+-- correlated LIMIT 1 lookup. Shapes match what the Flask route builds
+-- client-side, so it can jsonify the result directly.
+CREATE OR REPLACE FUNCTION map_data()
+RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'id', j.id,
+        'name', j.name,
+        'location_name', j.location_name,
+        'latitude', j.latitude,
+        'longitude', j.longitude,
+        'status', j.status,
+        'inspector_name', j.inspector_name,
+        'cameras', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'index', c.camera_index,
+                'name', c.name,
+                'source_type', c.source_type,
+                'is_active', c.is_active,
+                'traffic', (
+                    SELECT to_jsonb(t)
+                    FROM (
+                        SELECT timestamp, camera_index, vehicle_count,
+                               congestion_level, signal_state,
+                               green_time_remaining
+                        FROM traffic_data td
+                        WHERE td.junction_id = j.id
+                          AND td.camera_index = c.camera_index
+                        ORDER BY td.timestamp DESC
+                        LIMIT 1
+                    ) t
+                )
+            ) ORDER BY c.camera_index), '[]'::jsonb)
+            FROM cameras c
+            WHERE c.junction_id = j.id
+        )
+    )), '[]'::jsonb)
+    FROM junctions j
+    WHERE j.status = 'active';
+$$;
+
+-- Latest traffic row per (junction_id, camera_index) for a set of
+-- junctions, in one statement. The map endpoint used to issue one
+-- query per camera; this collapses junctions x cameras round trips
+-- into a single index-ordered DISTINCT ON scan.
+CREATE OR REPLACE FUNCTION latest_traffic_bulk(jids uuid[])
+RETURNS SETOF traffic_data
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT ON (junction_id, camera_index) *
+    FROM traffic_data
+    WHERE junction_id = ANY (jids)
+    ORDER BY junction_id, camera_index, timestamp DESC;
+$$;
+
+-- Atomically claim up to n pending alerts for email delivery: mark
+-- them sent and return them in one statement. FOR UPDATE SKIP LOCKED
+-- lets concurrent workers each claim a disjoint batch, so no alert is
+-- ever emailed twice.
+CREATE OR REPLACE FUNCTION claim_pending_alerts(n int)
+RETURNS SETOF alerts
+LANGUAGE sql AS $$
+    UPDATE alerts
+    SET email_sent = true,
+        email_sent_at = now()
+    WHERE id IN (
+        SELECT id
+        FROM alerts
+        WHERE email_sent = false
+          AND sent_to_email IS NOT NULL
+        ORDER BY created_at
+        LIMIT n
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
+
+-- Hourly aggregate for traffic reports: returns the six scalars
+-- generate_hourly_report needs instead of shipping every raw row
+-- of the past hour over HTTP.
+CREATE OR REPLACE FUNCTION hourly_traffic_agg(j uuid)
+RETURNS TABLE (
+    total_vehicles bigint,
+    total_cars bigint,
+    total_trucks bigint,
+    total_buses bigint,
+    total_bikes bigint,
+    peak_count int,
+    raw_count bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        COALESCE(sum(vehicle_count), 0),
+        COALESCE(sum(car_count), 0),
+        COALESCE(sum(truck_count), 0),
+        COALESCE(sum(bus_count), 0),
+        COALESCE(sum(bike_count), 0),
+        COALESCE(max(vehicle_count), 0),
+        count(*)
+    FROM traffic_data
+    WHERE junction_id = j
+      AND timestamp > now() - interval '1 hour';
+$$;
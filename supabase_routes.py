@@ -1,525 +1,902 @@
-"""
-Supabase API Routes for Track-V Traffic Management System
-Add these routes to app.py for full Supabase integration
-"""
-
-from flask import Blueprint, request, jsonify
-import os
-
-# Import Supabase managers
-from supabase_config import (
-    traffic_data_manager,
-    junction_manager,
-    alert_manager,
-    profile_manager,
-    report_manager,
-    supabase_config
-)
-from email_service import email_service
-
-# Create Blueprint for Supabase routes
-supabase_bp = Blueprint('supabase', __name__, url_prefix='/api/v1')
-
-
-# =============================================
-# AUTHENTICATION ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/auth/signup', methods=['POST'])
-def signup():
-    """Register new user"""
-    client = supabase_config.get_client()
-    if not client:
-        return jsonify({'error': 'Database not configured'}), 503
-    
-    try:
-        data = request.json
-        email = data.get('email')
-        password = data.get('password')
-        full_name = data.get('full_name', '')
-        
-        if not email or not password:
-            return jsonify({'error': 'Email and password required'}), 400
-        
-        # Sign up with Supabase Auth
-        result = client.auth.sign_up({
-            'email': email,
-            'password': password,
-            'options': {
-                'data': {
-                    'full_name': full_name
-                }
-            }
-        })
-        
-        if result.user:
-            return jsonify({
-                'success': True,
-                'user': {
-                    'id': result.user.id,
-                    'email': result.user.email
-                },
-                'message': 'Account created successfully'
-            })
-        
-        return jsonify({'error': 'Registration failed'}), 400
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@supabase_bp.route('/auth/login', methods=['POST'])
-def login():
-    """User login"""
-    client = supabase_config.get_client()
-    if not client:
-        return jsonify({'error': 'Database not configured'}), 503
-    
-    try:
-        data = request.json
-        email = data.get('email')
-        password = data.get('password')
-        
-        if not email or not password:
-            return jsonify({'error': 'Email and password required'}), 400
-        
-        # Sign in with Supabase Auth
-        result = client.auth.sign_in_with_password({
-            'email': email,
-            'password': password
-        })
-        
-        if result.user and result.session:
-            # Get user profile
-            profile = profile_manager.get_profile(result.user.id)
-            
-            return jsonify({
-                'success': True,
-                'user': {
-                    'id': result.user.id,
-                    'email': result.user.email,
-                    'profile': profile
-                },
-                'session': {
-                    'access_token': result.session.access_token,
-                    'refresh_token': result.session.refresh_token,
-                    'expires_at': result.session.expires_at
-                }
-            })
-        
-        return jsonify({'error': 'Invalid credentials'}), 401
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@supabase_bp.route('/auth/logout', methods=['POST'])
-def logout():
-    """User logout"""
-    client = supabase_config.get_client()
-    if not client:
-        return jsonify({'error': 'Database not configured'}), 503
-    
-    try:
-        client.auth.sign_out()
-        return jsonify({'success': True, 'message': 'Logged out successfully'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# =============================================
-# USER PROFILE ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/profile', methods=['GET'])
-def get_profile():
-    """Get current user's profile"""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 401
-    
-    profile = profile_manager.get_profile(user_id)
-    if profile:
-        return jsonify({'success': True, 'profile': profile})
-    return jsonify({'error': 'Profile not found'}), 404
-
-
-@supabase_bp.route('/profile', methods=['PUT'])
-def update_profile():
-    """Update user profile"""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 401
-    
-    try:
-        updates = request.json
-        success = profile_manager.update_profile(user_id, updates)
-        
-        if success:
-            profile = profile_manager.get_profile(user_id)
-            return jsonify({'success': True, 'profile': profile})
-        return jsonify({'error': 'Update failed'}), 400
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@supabase_bp.route('/profile/settings', methods=['GET'])
-def get_settings():
-    """Get user settings (dark mode, email alerts)"""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 401
-    
-    settings = profile_manager.get_user_settings(user_id)
-    return jsonify({'success': True, 'settings': settings})
-
-
-@supabase_bp.route('/profile/settings', methods=['PUT'])
-def update_settings():
-    """Update user settings"""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 401
-    
-    try:
-        settings = request.json
-        allowed = ['dark_mode', 'email_alerts_enabled']
-        updates = {k: v for k, v in settings.items() if k in allowed}
-        
-        success = profile_manager.update_profile(user_id, updates)
-        if success:
-            return jsonify({'success': True, 'settings': profile_manager.get_user_settings(user_id)})
-        return jsonify({'error': 'Update failed'}), 400
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# =============================================
-# JUNCTION ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/junctions', methods=['GET'])
-def get_junctions():
-    """Get all junctions with cameras"""
-    junctions = junction_manager.get_all_junctions()
-    return jsonify({'success': True, 'junctions': junctions})
-
-
-@supabase_bp.route('/junctions/<junction_id>', methods=['GET'])
-def get_junction(junction_id):
-    """Get specific junction"""
-    junction = junction_manager.get_junction_by_id(junction_id)
-    if junction:
-        return jsonify({'success': True, 'junction': junction})
-    return jsonify({'error': 'Junction not found'}), 404
-
-
-@supabase_bp.route('/junctions/<junction_id>/cameras/<int:camera_index>', methods=['PUT'])
-def update_camera_source(junction_id, camera_index):
-    """Update camera video source"""
-    try:
-        data = request.json
-        source_type = data.get('source_type')  # video_file, youtube, rtsp, http_stream
-        source_url = data.get('source_url')
-        
-        if not source_type or not source_url:
-            return jsonify({'error': 'source_type and source_url required'}), 400
-        
-        success = junction_manager.update_camera_source(
-            junction_id, camera_index, source_type, source_url
-        )
-        
-        if success:
-            return jsonify({'success': True, 'message': 'Camera source updated'})
-        return jsonify({'error': 'Update failed'}), 400
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# =============================================
-# TRAFFIC DATA ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/traffic/<junction_id>', methods=['GET'])
-def get_traffic_data(junction_id):
-    """Get latest traffic data for junction"""
-    camera_index = request.args.get('camera', type=int)
-    data = traffic_data_manager.get_latest_traffic_data(junction_id, camera_index)
-    return jsonify({'success': True, 'data': data})
-
-
-@supabase_bp.route('/traffic/<junction_id>/history', methods=['GET'])
-def get_traffic_history(junction_id):
-    """Get traffic history"""
-    hours = request.args.get('hours', default=24, type=int)
-    data = traffic_data_manager.get_traffic_history(junction_id, hours)
-    return jsonify({'success': True, 'data': data})
-
-
-@supabase_bp.route('/traffic/<junction_id>', methods=['POST'])
-def save_traffic_data(junction_id):
-    """Save traffic data (called by backend processor)"""
-    try:
-        data = request.json
-        camera_index = data.get('camera_index', 0)
-        
-        success = traffic_data_manager.save_traffic_data(junction_id, camera_index, data)
-        
-        if success:
-            return jsonify({'success': True})
-        return jsonify({'error': 'Failed to save data'}), 500
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# =============================================
-# ALERT ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/alerts', methods=['POST'])
-def create_alert():
-    """Create traffic alert and send email"""
-    try:
-        data = request.json
-        junction_id = data.get('junction_id')
-        user_id = request.headers.get('X-User-ID')
-        
-        if not junction_id:
-            return jsonify({'error': 'junction_id required'}), 400
-        
-        alert_data = {
-            'type': data.get('type', 'manual'),
-            'severity': data.get('severity', 'medium'),
-            'title': data.get('title', 'Traffic Alert'),
-            'description': data.get('description', ''),
-            'camera_index': data.get('camera_index')
-        }
-        
-        # Create alert in database
-        alert_id = alert_manager.create_alert(junction_id, alert_data, user_id)
-        
-        if alert_id:
-            # Get junction info for email
-            junction = junction_manager.get_junction_by_id(junction_id)
-            
-            if junction and junction.get('inspector_email'):
-                # Check if user has email alerts enabled
-                should_send_email = True
-                if user_id:
-                    settings = profile_manager.get_user_settings(user_id)
-                    should_send_email = settings.get('email_alerts_enabled', True)
-                
-                if should_send_email:
-                    # Send email asynchronously
-                    email_service.send_alert_async(
-                        to_email=junction.get('inspector_email'),
-                        inspector_name=junction.get('inspector_name', 'Inspector'),
-                        junction_name=junction.get('name', 'Unknown Junction'),
-                        alert_data=alert_data
-                    )
-                    
-                    # Mark email as sent
-                    alert_manager.mark_email_sent(alert_id)
-            
-            return jsonify({
-                'success': True,
-                'alert_id': alert_id,
-                'message': 'Alert created and email sent'
-            })
-        
-        return jsonify({'error': 'Failed to create alert'}), 500
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@supabase_bp.route('/alerts/junction/<junction_id>', methods=['GET'])
-def get_junction_alerts(junction_id):
-    """Get alerts for a junction"""
-    limit = request.args.get('limit', default=50, type=int)
-    alerts = alert_manager.get_junction_alerts(junction_id, limit)
-    return jsonify({'success': True, 'alerts': alerts})
-
-
-@supabase_bp.route('/alerts/<alert_id>/acknowledge', methods=['POST'])
-def acknowledge_alert(alert_id):
-    """Acknowledge an alert"""
-    client = supabase_config.get_client()
-    if not client:
-        return jsonify({'error': 'Database not configured'}), 503
-    
-    try:
-        user_id = request.headers.get('X-User-ID')
-        
-        client.table('alerts').update({
-            'acknowledged': True,
-            'acknowledged_by': user_id,
-            'acknowledged_at': 'now()'
-        }).eq('id', alert_id).execute()
-        
-        return jsonify({'success': True, 'message': 'Alert acknowledged'})
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# =============================================
-# REPORT ENDPOINTS
-# =============================================
-
-@supabase_bp.route('/reports/<junction_id>/generate', methods=['POST'])
-def generate_report(junction_id):
-    """Generate hourly report"""
-    report = report_manager.generate_hourly_report(junction_id)
-    if report:
-        return jsonify({'success': True, 'report': report})
-    return jsonify({'error': 'Failed to generate report'}), 500
-
-
-@supabase_bp.route('/reports/<junction_id>', methods=['GET'])
-def get_reports(junction_id):
-    """Get traffic reports"""
-    report_type = request.args.get('type', default='hourly')
-    days = request.args.get('days', default=7, type=int)
-    
-    reports = report_manager.get_reports(junction_id, report_type, days)
-    return jsonify({'success': True, 'reports': reports})
-
-
-@supabase_bp.route('/reports/<junction_id>/download', methods=['GET'])
-def download_report(junction_id):
-    """Download report as CSV"""
-    import csv
-    from io import StringIO
-    from flask import Response
-    
-    report_type = request.args.get('type', default='daily')
-    days = request.args.get('days', default=30, type=int)
-    
-    reports = report_manager.get_reports(junction_id, report_type, days)
-    
-    if not reports:
-        return jsonify({'error': 'No reports found'}), 404
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=reports[0].keys())
-    writer.writeheader()
-    writer.writerows(reports)
-    
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=traffic_report_{junction_id}.csv'}
-    )
-
-
-# =============================================
-# MAP DATA ENDPOINT
-# =============================================
-
-@supabase_bp.route('/map/data', methods=['GET'])
-def get_map_data():
-    """Get all junctions with their latest traffic data for map view"""
-    junctions = junction_manager.get_all_junctions()
-    
-    map_data = []
-    for junction in junctions:
-        junction_data = {
-            'id': junction.get('id'),
-            'name': junction.get('name'),
-            'location_name': junction.get('location_name'),
-            'latitude': float(junction.get('latitude', 0)),
-            'longitude': float(junction.get('longitude', 0)),
-            'status': junction.get('status'),
-            'inspector_name': junction.get('inspector_name'),
-            'cameras': []
-        }
-        
-        # Get latest traffic data for each camera
-        cameras = junction.get('cameras', [])
-        for camera in cameras:
-            camera_index = camera.get('camera_index')
-            latest_data = traffic_data_manager.get_latest_traffic_data(
-                junction.get('id'), camera_index
-            )
-            
-            camera_data = {
-                'index': camera_index,
-                'name': camera.get('name'),
-                'source_type': camera.get('source_type'),
-                'is_active': camera.get('is_active', False),
-                'traffic': latest_data[0] if latest_data else None
-            }
-            junction_data['cameras'].append(camera_data)
-        
-        map_data.append(junction_data)
-    
-    return jsonify({'success': True, 'data': map_data})
-
-
-# =============================================
-# AVATAR UPLOAD ENDPOINT
-# =============================================
-
-@supabase_bp.route('/profile/avatar', methods=['POST'])
-def upload_avatar():
-    """Upload profile avatar to Supabase Storage"""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 401
-    
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    # Validate file type
-    allowed_types = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-    
-    if ext not in allowed_types:
-        return jsonify({'error': 'Invalid file type'}), 400
-    
-    try:
-        client = supabase_config.get_client()
-        if not client:
-            return jsonify({'error': 'Storage not configured'}), 503
-        
-        # Upload to Supabase Storage
-        filename = f"avatars/{user_id}.{ext}"
-        file_bytes = file.read()
-        
-        # Upload file
-        result = client.storage.from_('avatars').upload(
-            filename,
-            file_bytes,
-            {'upsert': 'true'}
-        )
-        
-        # Get public URL
-        public_url = client.storage.from_('avatars').get_public_url(filename)
-        
-        # Update profile with avatar URL
-        profile_manager.update_profile(user_id, {'avatar_url': public_url})
-        
-        return jsonify({
-            'success': True,
-            'avatar_url': public_url
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Function to register blueprint with Flask app
-def register_supabase_routes(app):
-    """Register Supabase routes with Flask app"""
-    app.register_blueprint(supabase_bp)
-    print("Supabase API routes registered at /api/v1/")
+"""
+Supabase API Routes for Track-V Traffic Management System
+Add these routes to app.py for full Supabase integration
+"""
+
+from flask import Blueprint, request, jsonify, Response, g
+import hashlib
+import json
+import os
+import queue
+from operator import itemgetter
+import threading
+import time
+import uuid
+import zlib
+
+# Fast JSON encoding for the streamed history rows
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Server-side avatar downscaling - avatars render at <=256px, so
+# storing originals wastes storage and CDN egress
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Import Supabase managers
+from supabase_config import (
+    traffic_data_manager,
+    junction_manager,
+    alert_manager,
+    profile_manager,
+    report_manager,
+    supabase_config,
+    make_auth_client
+)
+from email_service import email_service
+
+# Create Blueprint for Supabase routes
+supabase_bp = Blueprint('supabase', __name__, url_prefix='/api/v1')
+
+# Settings fields clients may change via PUT /profile/settings
+_SETTINGS_ALLOWED = frozenset({'dark_mode', 'email_alerts_enabled'})
+
+
+def _auth_client():
+    """
+    Request-scoped client for auth endpoints
+
+    sign_up/sign_in_with_password mutate client auth state, so these flows
+    get their own client hung off flask.g instead of racing on the shared
+    memoised one. Data endpoints keep using the shared pooled client.
+    """
+    if 'sb_auth' not in g:
+        g.sb_auth = make_auth_client()
+    return g.sb_auth
+
+
+@supabase_bp.teardown_request
+def _drop_auth_client(exc):
+    # Request-scoped: drop the reference so the client (and any session
+    # state it accumulated) dies with the request
+    g.pop('sb_auth', None)
+
+
+# =============================================
+# AUTHENTICATION ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/auth/signup', methods=['POST'])
+def signup():
+    """Register new user"""
+    client = _auth_client()
+    if not client:
+        return jsonify({'error': 'Database not configured'}), 503
+    
+    try:
+        data = request.json
+        email = data.get('email')
+        password = data.get('password')
+        full_name = data.get('full_name', '')
+        
+        if not email or not password:
+            return jsonify({'error': 'Email and password required'}), 400
+        
+        # Sign up with Supabase Auth
+        result = client.auth.sign_up({
+            'email': email,
+            'password': password,
+            'options': {
+                'data': {
+                    'full_name': full_name
+                }
+            }
+        })
+        
+        if result.user:
+            return jsonify({
+                'success': True,
+                'user': {
+                    'id': result.user.id,
+                    'email': result.user.email
+                },
+                'message': 'Account created successfully'
+            })
+        
+        return jsonify({'error': 'Registration failed'}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@supabase_bp.route('/auth/login', methods=['POST'])
+def login():
+    """User login"""
+    client = _auth_client()
+    if not client:
+        return jsonify({'error': 'Database not configured'}), 503
+    
+    try:
+        data = request.json
+        email = data.get('email')
+        password = data.get('password')
+        
+        if not email or not password:
+            return jsonify({'error': 'Email and password required'}), 400
+        
+        # Sign in with Supabase Auth
+        result = client.auth.sign_in_with_password({
+            'email': email,
+            'password': password
+        })
+        
+        if result.user and result.session:
+            # Get user profile
+            profile = profile_manager.get_profile(result.user.id)
+            
+            return jsonify({
+                'success': True,
+                'user': {
+                    'id': result.user.id,
+                    'email': result.user.email,
+                    'profile': profile
+                },
+                'session': {
+                    'access_token': result.session.access_token,
+                    'refresh_token': result.session.refresh_token,
+                    'expires_at': result.session.expires_at
+                }
+            })
+        
+        return jsonify({'error': 'Invalid credentials'}), 401
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@supabase_bp.route('/auth/logout', methods=['POST'])
+def logout():
+    """User logout"""
+    client = _auth_client()
+    if not client:
+        return jsonify({'error': 'Database not configured'}), 503
+    
+    try:
+        client.auth.sign_out()
+        return jsonify({'success': True, 'message': 'Logged out successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# =============================================
+# USER PROFILE ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/profile', methods=['GET'])
+def get_profile():
+    """Get current user's profile"""
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    
+    profile = profile_manager.get_profile(user_id)
+    if profile:
+        return jsonify({'success': True, 'profile': profile})
+    return jsonify({'error': 'Profile not found'}), 404
+
+
+@supabase_bp.route('/profile', methods=['PUT'])
+def update_profile():
+    """Update user profile"""
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    
+    try:
+        updates = request.json
+        success = profile_manager.update_profile(user_id, updates)
+        
+        if success:
+            profile = profile_manager.get_profile(user_id)
+            return jsonify({'success': True, 'profile': profile})
+        return jsonify({'error': 'Update failed'}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@supabase_bp.route('/profile/settings', methods=['GET'])
+def get_settings():
+    """Get user settings (dark mode, email alerts)"""
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    
+    settings = profile_manager.get_user_settings(user_id)
+    return jsonify({'success': True, 'settings': settings})
+
+
+@supabase_bp.route('/profile/settings', methods=['PUT'])
+def update_settings():
+    """Update user settings"""
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    
+    try:
+        settings = request.json
+        updates = {k: settings[k] for k in settings.keys() & _SETTINGS_ALLOWED}
+        
+        success = profile_manager.update_profile(user_id, updates)
+        if success:
+            return jsonify({'success': True, 'settings': profile_manager.get_user_settings(user_id)})
+        return jsonify({'error': 'Update failed'}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# =============================================
+# JUNCTION ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/junctions', methods=['GET'])
+def get_junctions():
+    """Get all junctions with cameras"""
+    junctions = junction_manager.get_all_junctions()
+    return jsonify({'success': True, 'junctions': junctions})
+
+
+@supabase_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Get all active junctions with latest traffic and open-alert counts"""
+    return jsonify({'success': True, 'dashboard': junction_manager.get_dashboard()})
+
+
+@supabase_bp.route('/junctions/<junction_id>', methods=['GET'])
+def get_junction(junction_id):
+    """Get specific junction"""
+    junction = junction_manager.get_junction_by_id(junction_id)
+    if junction:
+        return jsonify({'success': True, 'junction': junction})
+    return jsonify({'error': 'Junction not found'}), 404
+
+
+@supabase_bp.route('/junctions/<junction_id>/cameras/<int:camera_index>', methods=['PUT'])
+def update_camera_source(junction_id, camera_index):
+    """Update camera video source"""
+    try:
+        data = request.json
+        source_type = data.get('source_type')  # video_file, youtube, rtsp, http_stream
+        source_url = data.get('source_url')
+        
+        if not source_type or not source_url:
+            return jsonify({'error': 'source_type and source_url required'}), 400
+        
+        success = junction_manager.update_camera_source(
+            junction_id, camera_index, source_type, source_url
+        )
+        
+        if success:
+            return jsonify({'success': True, 'message': 'Camera source updated'})
+        return jsonify({'error': 'Update failed'}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# =============================================
+# TRAFFIC DATA ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/traffic/<junction_id>', methods=['GET'])
+def get_traffic_data(junction_id):
+    """Get latest traffic data for junction"""
+    camera_index = request.args.get('camera', type=int)
+    data = traffic_data_manager.get_latest_traffic_data(junction_id, camera_index)
+    return jsonify({'success': True, 'data': data})
+
+
+@supabase_bp.route('/traffic/<junction_id>/history', methods=['GET'])
+def get_traffic_history(junction_id):
+    """Get traffic history"""
+    hours = request.args.get('hours', default=24, type=int)
+    data = traffic_data_manager.get_traffic_history(junction_id, hours)
+    return jsonify({'success': True, 'data': data})
+
+
+@supabase_bp.route('/traffic/<junction_id>/history/stream', methods=['GET'])
+def stream_traffic_history(junction_id):
+    """Stream traffic history as NDJSON
+
+    Unlike /history, rows are fetched in 1000-row pages and written out as
+    they arrive, so a 24-hour history never materialises in server memory.
+    """
+    hours = request.args.get('hours', default=24, type=int)
+
+    def generate():
+        for row in traffic_data_manager.iter_traffic_history(junction_id, hours):
+            if ORJSON_AVAILABLE:
+                yield orjson.dumps(row) + b'\n'
+            else:
+                yield (json.dumps(row) + '\n').encode('utf-8')
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@supabase_bp.route('/traffic/<junction_id>', methods=['POST'])
+def save_traffic_data(junction_id):
+    """Save traffic data (called by backend processor)"""
+    try:
+        data = request.json
+        camera_index = data.get('camera_index', 0)
+
+        # Queue for the background flusher and return immediately - the
+        # ingest path never waits on a PostgREST round-trip
+        queued = traffic_data_manager.save_traffic_data_async(junction_id, camera_index, data)
+
+        if queued:
+            return jsonify({'success': True, 'queued': True}), 202
+        return jsonify({'error': 'Ingest buffer full, retry later'}), 503
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# =============================================
+# ALERT ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/alerts', methods=['POST'])
+def create_alert():
+    """Create traffic alert and send email"""
+    try:
+        data = request.json
+        junction_id = data.get('junction_id')
+        user_id = request.headers.get('X-User-ID')
+        
+        if not junction_id:
+            return jsonify({'error': 'junction_id required'}), 400
+        
+        alert_data = {
+            'type': data.get('type', 'manual'),
+            'severity': data.get('severity', 'medium'),
+            'title': data.get('title', 'Traffic Alert'),
+            'description': data.get('description', ''),
+            'camera_index': data.get('camera_index')
+        }
+        
+        # One cached junction read serves both the alert insert (inspector
+        # email) and the notification - previously the manager and the
+        # route each issued their own SELECT of the same junction
+        junction = junction_manager.get_junction_by_id(junction_id)
+
+        should_send_email = bool(junction and junction.get('inspector_email'))
+        if should_send_email and user_id:
+            settings = profile_manager.get_user_settings(user_id)
+            should_send_email = settings.get('email_alerts_enabled', True)
+
+        # Create alert in database; email_sent is set in the same
+        # round-trip when we are about to queue the email
+        alert_id = alert_manager.create_alert(
+            junction_id, alert_data, user_id,
+            junction=junction, mark_email_sent=should_send_email
+        )
+
+        if alert_id:
+            if should_send_email:
+                # Send email asynchronously
+                email_service.send_alert_async(
+                    to_email=junction.get('inspector_email'),
+                    inspector_name=junction.get('inspector_name', 'Inspector'),
+                    junction_name=junction.get('name', 'Unknown Junction'),
+                    alert_data=alert_data
+                )
+
+            return jsonify({
+                'success': True,
+                'alert_id': alert_id,
+                'message': 'Alert created and email sent'
+            })
+        
+        return jsonify({'error': 'Failed to create alert'}), 500
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@supabase_bp.route('/alerts/junction/<junction_id>', methods=['GET'])
+def get_junction_alerts(junction_id):
+    """Get alerts for a junction"""
+    limit = request.args.get('limit', default=50, type=int)
+    alerts = alert_manager.get_junction_alerts(junction_id, limit)
+    return jsonify({'success': True, 'alerts': alerts})
+
+
+@supabase_bp.route('/alerts/<alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Acknowledge an alert"""
+    client = supabase_config.get_client()
+    if not client:
+        return jsonify({'error': 'Database not configured'}), 503
+    
+    try:
+        user_id = request.headers.get('X-User-ID')
+
+        # Only touch rows not yet acknowledged: a double-click or retry
+        # matches zero rows instead of overwriting who acknowledged first.
+        # Keep the representation here - result.data tells us which case hit.
+        result = client.table('alerts').update({
+            'acknowledged': True,
+            'acknowledged_by': user_id,
+            'acknowledged_at': 'now()'
+        }).eq('id', alert_id).eq('acknowledged', False).execute()
+
+        return jsonify({
+            'success': True,
+            'message': 'Alert acknowledged',
+            'already_acknowledged': len(result.data) == 0
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# =============================================
+# REPORT ENDPOINTS
+# =============================================
+
+@supabase_bp.route('/reports/<junction_id>/generate', methods=['POST'])
+def generate_report(junction_id):
+    """Generate hourly report"""
+    report = report_manager.generate_hourly_report(junction_id)
+    if report:
+        return jsonify({'success': True, 'report': report})
+    return jsonify({'error': 'Failed to generate report'}), 500
+
+
+@supabase_bp.route('/reports/<junction_id>', methods=['GET'])
+def get_reports(junction_id):
+    """Get traffic reports (keyset-paged; pass cursor to continue)"""
+    report_type = request.args.get('type', default='hourly')
+    days = request.args.get('days', default=7, type=int)
+    cursor = request.args.get('cursor')
+    limit = min(request.args.get('limit', default=200, type=int), 500)
+
+    reports, next_cursor = report_manager.get_reports_page(
+        junction_id, report_type, days, cursor=cursor, limit=limit
+    )
+    return jsonify({
+        'success': True,
+        'reports': reports,
+        'next_cursor': next_cursor
+    })
+
+
+@supabase_bp.route('/reports/<junction_id>/download', methods=['GET'])
+def download_report(junction_id):
+    """Download report as CSV"""
+    import csv
+    from io import StringIO
+    from flask import Response
+    
+    report_type = request.args.get('type', default='daily')
+    days = request.args.get('days', default=30, type=int)
+
+    # Peek one row so empty exports still 404 before we commit to a 200
+    rows = report_manager.iter_reports(junction_id, report_type, days)
+    first = next(rows, None)
+    if first is None:
+        return jsonify({'error': 'No reports found'}), 404
+
+    # csv.writer over pre-extracted value tuples: DictWriter re-hashes
+    # every field name per row, which adds up over a month of rows
+    fieldnames = list(first.keys())
+    values = _row_values(fieldnames)
+
+    def generate():
+        # Stream row-by-row through a reusable one-row buffer: peak
+        # memory stays O(1 row) and the first bytes go out before the
+        # remaining pages are even fetched
+        buf = StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fieldnames)
+        writer.writerow(values(first))
+        yield buf.getvalue()
+        for row in rows:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(values(row))
+            yield buf.getvalue()
+
+    headers = {'Content-Disposition': f'attachment; filename=traffic_report_{junction_id}.csv'}
+
+    # flask-compress leaves streamed responses alone, so gzip the CSV
+    # stream here - the rows are repetitive text that shrinks 5-10x
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        def gzipped(chunks):
+            co = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip framing
+            for chunk in chunks:
+                out = co.compress(chunk.encode())
+                if out:
+                    yield out
+            yield co.flush()
+
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+        body = gzipped(generate())
+    else:
+        body = generate()
+
+    return Response(body, mimetype='text/csv', headers=headers)
+
+
+# Long exports run on one background worker draining a bounded queue
+# (the email service pattern) instead of occupying a request for the
+# whole query + serialize - a burst of POSTs queues or gets a 503, it
+# never spawns a thread and an in-memory gzip per request. Job state
+# lives in-process, which is consistent with the single-worker
+# deployment gunicorn_config.py documents; finished entries expire
+# with their signed URL so the dict stays bounded too.
+EXPORT_JOB_TTL = 3600.0  # matches the signed URL lifetime
+_export_q = queue.Queue(maxsize=16)
+_export_jobs = {}
+_export_jobs_lock = threading.Lock()
+_export_worker_thread = None
+
+
+def _row_values(fieldnames):
+    """Row-dict -> value-tuple extractor for csv.writer"""
+    if len(fieldnames) == 1:  # itemgetter returns a bare scalar here
+        key = fieldnames[0]
+        return lambda row: (row[key],)
+    return itemgetter(*fieldnames)
+
+
+def _set_export_job(job_id, **fields):
+    with _export_jobs_lock:
+        entry = _export_jobs.setdefault(job_id, {'job': {}})
+        entry['expires'] = time.monotonic() + EXPORT_JOB_TTL
+        entry['job'].update(fields)
+
+
+def _prune_export_jobs():
+    """Drop job entries whose signed URL (and so the entry) has expired"""
+    now = time.monotonic()
+    with _export_jobs_lock:
+        for job_id in [k for k, v in _export_jobs.items() if v['expires'] <= now]:
+            del _export_jobs[job_id]
+
+
+def _export_worker():
+    """Drain queued export jobs one at a time"""
+    while True:
+        job = _export_q.get()
+        try:
+            _run_export(*job)
+        finally:
+            _export_q.task_done()
+
+
+def _ensure_export_worker():
+    """Start the export worker in the current process if needed
+
+    Lazy for the same reason as the flush and mail workers: under
+    gunicorn's preload_app a thread started at import time would die
+    with the fork, and is_alive() is False in a fresh child.
+    """
+    global _export_worker_thread
+    t = _export_worker_thread
+    if t is not None and t.is_alive():
+        return
+    with _export_jobs_lock:
+        t = _export_worker_thread
+        if t is None or not t.is_alive():
+            t = threading.Thread(
+                target=_export_worker, daemon=True, name='report-export')
+            _export_worker_thread = t
+            t.start()
+
+
+def _run_export(job_id, junction_id, report_type, days):
+    """Stream the report into Supabase Storage and record a signed URL"""
+    import csv
+    from io import StringIO
+
+    _set_export_job(job_id, status='running')
+    try:
+        rows = report_manager.iter_reports(junction_id, report_type, days)
+        first = next(rows, None)
+        if first is None:
+            _set_export_job(job_id, status='error', error='No reports found')
+            return
+
+        # Compress while paging so memory holds one page + the gzip state
+        fieldnames = list(first.keys())
+        values = _row_values(fieldnames)
+        co = zlib.compressobj(6, zlib.DEFLATED, 31)
+        parts = []
+        buf = StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fieldnames)
+        writer.writerow(values(first))
+        for row in rows:
+            writer.writerow(values(row))
+            if buf.tell() > 64 * 1024:
+                parts.append(co.compress(buf.getvalue().encode()))
+                buf.seek(0)
+                buf.truncate()
+        parts.append(co.compress(buf.getvalue().encode()))
+        parts.append(co.flush())
+        data = b''.join(parts)
+
+        client = supabase_config.get_client()
+        if not client:
+            _set_export_job(job_id, status='error', error='Storage not configured')
+            return
+        path = f'{junction_id}/{job_id}.csv.gz'
+        client.storage.from_('exports').upload(
+            path, data, {'upsert': 'true', 'content-type': 'application/gzip'}
+        )
+        signed = client.storage.from_('exports').create_signed_url(
+            path, int(EXPORT_JOB_TTL))
+        url = signed.get('signedURL') or signed.get('signedUrl')
+        _set_export_job(job_id, status='done', download_url=url)
+
+    except Exception as e:
+        _set_export_job(job_id, status='error', error=str(e))
+
+
+@supabase_bp.route('/reports/<junction_id>/export', methods=['POST'])
+def export_report(junction_id):
+    """Queue a background CSV export; poll /reports/exports/<job_id>"""
+    report_type = request.args.get('type', default='daily')
+    days = request.args.get('days', default=30, type=int)
+
+    _prune_export_jobs()
+    _ensure_export_worker()
+
+    job_id = uuid.uuid4().hex
+    _set_export_job(job_id, status='queued')
+    try:
+        _export_q.put_nowait((job_id, junction_id, report_type, days))
+    except queue.Full:
+        with _export_jobs_lock:
+            _export_jobs.pop(job_id, None)
+        return jsonify({'error': 'Export queue full, retry later'}), 503
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+
+@supabase_bp.route('/reports/exports/<job_id>', methods=['GET'])
+def export_status(job_id):
+    """Poll a background export job"""
+    with _export_jobs_lock:
+        entry = _export_jobs.get(job_id)
+        job = dict(entry['job']) if entry else None
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+# =============================================
+# MAP DATA ENDPOINT
+# =============================================
+
+# Map dashboards poll every second or two, but the underlying "latest
+# traffic per camera" barely changes inside that window. Cache the
+# serialized response for a short TTL and hand out an ETag so repeat
+# pollers get 304s with no body bytes at all.
+MAP_DATA_TTL = 2.0
+_map_cache_lock = threading.Lock()
+_map_cache = (0.0, b'', '')  # (monotonic expiry, body bytes, etag)
+
+
+def _map_data_response(body, etag):
+    if request.headers.get('If-None-Match') == etag:
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype='application/json')
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'public, max-age=2'
+    return resp
+
+
+@supabase_bp.route('/map/data', methods=['GET'])
+def get_map_data():
+    """Get all junctions with their latest traffic data for map view"""
+    with _map_cache_lock:
+        expiry, body, etag = _map_cache
+    if time.monotonic() < expiry:
+        return _map_data_response(body, etag)
+
+    # Junction metadata is cached in-process; project only the fields the
+    # map renders - the full record roughly triples the wire bytes
+    junctions = junction_manager.get_all_junctions(
+        columns='id,name,location_name,latitude,longitude,status,inspector_name,'
+                'cameras(camera_index,name,source_type,is_active)'
+    )
+
+    # Fastest path: ingest write-throughs every row to Redis, so when all
+    # the per-camera keys are warm the map needs no database at all
+    pairs = [(j.get('id'), c.get('camera_index'))
+             for j in junctions for c in j.get('cameras', [])]
+    latest_by_camera = traffic_data_manager.get_latest_from_cache(pairs)
+
+    if latest_by_camera is None:
+        # Next best: the map_data() function returns the fully shaped
+        # payload in a single round trip
+        map_data = junction_manager.get_map_payload()
+        if map_data is not None:
+            return _finish_map_data(map_data)
+
+        # Last resort: one bulk query for every camera's latest row,
+        # then dict lookups - the per-camera fetch here used to be
+        # junctions x cameras round trips
+        latest_by_camera = traffic_data_manager.get_latest_traffic_data_bulk(
+            [j.get('id') for j in junctions]
+        )
+
+    map_data = []
+    for junction in junctions:
+        junction_data = {
+            'id': junction.get('id'),
+            'name': junction.get('name'),
+            'location_name': junction.get('location_name'),
+            'latitude': float(junction.get('latitude', 0)),
+            'longitude': float(junction.get('longitude', 0)),
+            'status': junction.get('status'),
+            'inspector_name': junction.get('inspector_name'),
+            'cameras': []
+        }
+        
+        cameras = junction.get('cameras', [])
+        for camera in cameras:
+            camera_index = camera.get('camera_index')
+            camera_data = {
+                'index': camera_index,
+                'name': camera.get('name'),
+                'source_type': camera.get('source_type'),
+                'is_active': camera.get('is_active', False),
+                'traffic': latest_by_camera.get((junction.get('id'), camera_index))
+            }
+            junction_data['cameras'].append(camera_data)
+        
+        map_data.append(junction_data)
+
+    return _finish_map_data(map_data)
+
+
+def _finish_map_data(map_data):
+    """Serialize, cache and answer a freshly built map payload"""
+    global _map_cache
+    payload = {'success': True, 'data': map_data}
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload).encode()
+    etag = hashlib.blake2b(body).hexdigest()[:16]
+    with _map_cache_lock:
+        _map_cache = (time.monotonic() + MAP_DATA_TTL, body, etag)
+    return _map_data_response(body, etag)
+
+
+# =============================================
+# AVATAR UPLOAD ENDPOINT
+# =============================================
+
+# Avatars render at a couple hundred pixels; 5 MB is already generous.
+# Enforced per-route because the app-wide MAX_CONTENT_LENGTH is sized
+# for video uploads (500 MB) and would let an avatar POST buffer that much.
+MAX_AVATAR_SIZE = 5 * 1024 * 1024
+
+
+def _sniff_image_ext(head: bytes) -> str:
+    """Identify an accepted image type from its magic bytes ('' if none)"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return ''
+
+
+@supabase_bp.route('/profile/avatar', methods=['POST'])
+def upload_avatar():
+    """Upload profile avatar to Supabase Storage"""
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    
+    # Reject oversized bodies from the declared length, before touching
+    # request.files triggers multipart parsing/buffering
+    if request.content_length and request.content_length > MAX_AVATAR_SIZE:
+        return jsonify({'error': 'File too large (max 5 MB)'}), 413
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+
+    # Re-check the real size for chunked bodies with no Content-Length
+    file.stream.seek(0, 2)
+    if file.stream.tell() > MAX_AVATAR_SIZE:
+        return jsonify({'error': 'File too large (max 5 MB)'}), 413
+    file.stream.seek(0)
+
+    # Validate by magic bytes, not the client-supplied filename
+    head = file.stream.read(16)
+    file.stream.seek(0)
+    ext = _sniff_image_ext(head)
+    if not ext:
+        return jsonify({'error': 'Invalid file type'}), 400
+
+    try:
+        client = supabase_config.get_client()
+        if not client:
+            return jsonify({'error': 'Storage not configured'}), 503
+
+        # Default: hand the spooled upload stream straight to the storage
+        # client - httpx streams file objects, so the image never gets
+        # duplicated into a Python bytes blob
+        data = file.stream
+        content_type = file.mimetype or f'image/{ext}'
+
+        # Downscale to the largest size the UI renders and re-encode as
+        # WebP - a phone photo shrinks 10-100x. On decode failure fall
+        # back to storing the validated original as-is.
+        if PIL_AVAILABLE:
+            try:
+                from io import BytesIO
+                img = Image.open(file.stream)
+                img.draft('RGB', (512, 512))  # JPEG: downscale during decode
+                img.thumbnail((256, 256))
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+                out = BytesIO()
+                img.save(out, 'WEBP', quality=80)
+                data = out.getvalue()
+                ext = 'webp'
+                content_type = 'image/webp'
+            except Exception:
+                file.stream.seek(0)
+
+        filename = f"avatars/{user_id}.{ext}"
+        result = client.storage.from_('avatars').upload(
+            filename,
+            data,
+            {'upsert': 'true', 'content-type': content_type}
+        )
+        
+        # The public URL is deterministic from the project URL, bucket
+        # and object path - build it locally instead of going back
+        # through the storage client
+        public_url = f"{supabase_config.url}/storage/v1/object/public/avatars/{filename}"
+        
+        # Update profile with avatar URL
+        profile_manager.update_profile(user_id, {'avatar_url': public_url})
+        
+        return jsonify({
+            'success': True,
+            'avatar_url': public_url
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Function to register blueprint with Flask app
+def register_supabase_routes(app):
+    """Register Supabase routes with Flask app"""
+    app.register_blueprint(supabase_bp)
+    print("Supabase API routes registered at /api/v1/")